@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: chart payload with and without level-of-detail downsampling.
+
+For growing histories of 5-min samples (about 0.5% flagged as anomalies),
+compares sending every point with downsample() to the default point budget.
+Reported per history: rows sent, Arrow payload (how Streamlit ships chart
+data to the browser) and server time to select + serialize the rows. A
+2-day zoom shows the detail a narrowed range gets back.
+
+    python bin/bench_charts.py --days 30 90 365 730
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from downsample import CHART_MAX_POINTS, downsample
+
+
+def make_series(days, seed=0):
+    """5-min CPU series in the shape of AnalysisResult.anom_df."""
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(end=pd.Timestamp.now(tz="UTC").floor("5min"), periods=days * 288, freq="5min")
+    hour = ts.hour.values + ts.minute.values / 60
+    y = 40 + 12 * np.sin(2 * np.pi * hour / 24) + rng.normal(0, 4, len(ts))
+    anomaly = np.where(rng.random(len(ts)) < 0.005, -1, 1)
+    y[anomaly == -1] += 40
+    return pd.DataFrame({"timestamp": ts, "y": y, "anomaly_score": rng.normal(0, 0.1, len(ts)),
+                         "anomaly": anomaly})
+
+
+def payload(df):
+    """Rows and Arrow IPC bytes for the line + anomaly-point layers."""
+    sink = pa.BufferOutputStream()
+    for frame in (df, df[df["anomaly"] == -1]):
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return len(df), sink.getvalue().size
+
+
+def measure(select, repeat):
+    """(rows, bytes, seconds) for select() + payload(); fastest of `repeat` runs."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows, size = payload(select())
+        times.append(time.perf_counter() - start)
+    return rows, size, min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 90, 365, 730])
+    parser.add_argument("--max-points", type=int, default=CHART_MAX_POINTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'days':>6} {'points':>9} {'view':<8} {'rows':>8} {'payload KB':>11} {'server ms':>10}")
+    for days in args.days:
+        df = make_series(days)
+        keep = df["anomaly"].to_numpy() == -1
+        end = df["timestamp"].iloc[-1]
+        views = {
+            "raw": lambda: df,
+            "lod": lambda: downsample(df, "timestamp", "y", args.max_points, keep),
+            "zoom 2d": lambda: downsample(df, "timestamp", "y", args.max_points, keep,
+                                          start=end - pd.Timedelta(days=2)),
+        }
+        for name, select in views.items():
+            rows, size, seconds = measure(select, args.repeat)
+            print(f"{days:>6} {len(df):>9,} {name:<8} {rows:>8,} {size / 1024:>11,.1f} {seconds * 1000:>10.1f}")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: prediction insert throughput (rows/s).
+
+  per-row (old)  - connect / insert / commit / close for every row
+  per-row        - db.insert_prediction on the persistent WAL connection
+  bulk           - db.insert_predictions_bulk (one transaction, executemany)
+
+    python bin/bench_db.py --rows 2000
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import db
+
+def make_records(n):
+    return [{
+        "host": f"host-{i:05d}",
+        "metric": "CPU Usage",
+        "status": "normal",
+        "message": "Forecast stays below threshold. 0 anomalies in the last 24h.",
+        "trend": "stable",
+        "breach_time": "n/a",
+        "predicted_value": 42.0,
+        "anomaly_detected": 0,
+        "explanation": "",
+        "recommendation": "",
+        "suggested_threshold": '{"day": 75, "night": 90}',
+        "metadata": "{}",
+    } for i in range(n)]
+
+
+def insert_per_row_old(record):
+    # The pre-pooling implementation, kept here as the baseline
+    conn = sqlite3.connect(db.db_path)
+    c = conn.cursor()
+    sql = f"INSERT INTO predictions ({', '.join(record.keys())}) VALUES ({', '.join(['?'] * len(record))})"
+    c.execute(sql, tuple(record.values()))
+    conn.commit()
+    conn.close()
+
+
+def fresh_db(tmp, name):
+    db.close_connections()
+    db.db_path = os.path.join(tmp, f"{name}.db")
+    db.get_connection()  # applies the schema migrations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    records = make_records(args.rows)
+    cases = [
+        ("per-row (old)", lambda: [insert_per_row_old(r) for r in records]),
+        ("per-row", lambda: [db.insert_prediction(r) for r in records]),
+        ("bulk", lambda: db.insert_predictions_bulk(records)),
+    ]
+
+    print(f"{'path':<14} {'rows':>7} {'secs':>8} {'rows/s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (name, run) in enumerate(cases):
+            fresh_db(tmp, f"case{i}")
+            start = time.perf_counter()
+            run()
+            secs = time.perf_counter() - start
+            print(f"{name:<14} {args.rows:>7} {secs:>8.3f} {args.rows / secs:>10,.0f}")
+        db.close_connections()
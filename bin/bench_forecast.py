@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Prophet vs. the NumPy seasonal forecaster (accuracy and speed).
+
+Each series is split into history and a hold-out tail; both engines forecast
+the hold-out through forecast_trend(), and the hourly forecast is scored
+against the actual hourly means (MAE / RMSE). Breach agreement compares the
+first threshold crossing each engine predicts inside the hold-out.
+
+Runs on the bundled mock CSVs and on generated series with trend, daily and
+weekly seasonality and noise.
+
+    python bin/bench_forecast.py --series 20 --days 60 --holdout-days 7
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "src"))
+
+from ingest import normalize_columns
+from predictive import FORECASTERS, forecast_trend
+
+
+def make_series(n_series, days, seed=0):
+    """Synthetic 5-min CPU series: linear growth + daily/weekly cycles + noise."""
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(end=pd.Timestamp.now().floor("5min"), periods=days * 288, freq="5min")
+    t = np.arange(len(ts)) / 288
+    hour = ts.hour.values + ts.minute.values / 60
+    weekend = (ts.dayofweek.values >= 5).astype(float)
+    out = []
+    for _ in range(n_series):
+        values = (
+            rng.uniform(15, 45)
+            + rng.uniform(-0.1, 0.4) * t
+            + rng.uniform(2, 12) * np.sin(2 * np.pi * (hour - 6) / 24)
+            - rng.uniform(0, 8) * weekend
+            + rng.normal(0, 3, len(ts))
+        )
+        out.append(pd.DataFrame({"timestamp": ts, "cpu_usage_percent": np.clip(values, 0, 100)}))
+    return out
+
+
+def mock_series():
+    out = []
+    for name in sorted(os.listdir(os.path.join(ROOT, "src", "mock"))):
+        df = normalize_columns(pd.read_csv(os.path.join(ROOT, "src", "mock", name)))
+        out.append(df[["timestamp", "value"]].rename(columns={"value": "cpu_usage_percent"})
+                   .sort_values("timestamp").reset_index(drop=True))
+    return out
+
+
+def evaluate(series, engine, holdout_hours, threshold_quantile):
+    """Returns (seconds, abs errors, squared errors, first_hit, threshold) for one series."""
+    cutoff = series["timestamp"].max() - pd.Timedelta(hours=holdout_hours)
+    train = series[series["timestamp"] <= cutoff]
+    actual = (series[series["timestamp"] > cutoff].set_index("timestamp")["cpu_usage_percent"]
+              .resample("h").mean().dropna())
+    threshold = float(np.quantile(series["cpu_usage_percent"], threshold_quantile))
+
+    start = time.perf_counter()
+    forecast, first_hit = forecast_trend(train, periods=holdout_hours + 1, threshold=threshold, engine=engine)
+    secs = time.perf_counter() - start
+
+    pred = forecast.set_index("ds")["yhat"].reindex(actual.index)
+    err = (pred - actual).dropna().to_numpy()
+    return secs, np.abs(err), err ** 2, first_hit
+
+
+def run(name, series_list, holdout_hours, threshold_quantile):
+    hits = {}
+    for engine in sorted(FORECASTERS):
+        secs, abs_err, sq_err, hits[engine] = [], [], [], []
+        for series in series_list:
+            s, a, q, hit = evaluate(series, engine, holdout_hours, threshold_quantile)
+            secs.append(s)
+            abs_err.append(a)
+            sq_err.append(q)
+            hits[engine].append(hit)
+        abs_err, sq_err = np.concatenate(abs_err), np.concatenate(sq_err)
+        print(f"{name:<10} {engine:<9} {len(series_list):>6} {np.mean(secs):>10.3f} {np.sum(secs):>10.2f} "
+              f"{abs_err.mean():>8.3f} {np.sqrt(sq_err.mean()):>8.3f}")
+
+    # breach agreement against prophet: both/neither breach, and timing gap when both do
+    base = hits.get("prophet")
+    for engine, found in hits.items():
+        if engine == "prophet" or base is None:
+            continue
+        same = sum((a is None) == (b is None) for a, b in zip(base, found))
+        gaps = [abs((a - b).total_seconds()) / 3600 for a, b in zip(base, found) if a is not None and b is not None]
+        gap = f"{np.median(gaps):.1f} h median gap" if gaps else "no common breaches"
+        print(f"{'':<10} {engine} vs prophet: breach agreement {same}/{len(base)}, {gap}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, default=20, help="Generated series")
+    parser.add_argument("--days", type=int, default=60, help="History length of generated series")
+    parser.add_argument("--holdout-days", type=float, default=7, help="Forecast horizon scored (generated data)")
+    parser.add_argument("--mock-holdout-hours", type=int, default=4, help="Horizon scored on the short mock CSVs")
+    parser.add_argument("--threshold-quantile", type=float, default=0.95,
+                        help="Breach threshold per series, as a quantile of its values")
+    args = parser.parse_args()
+
+    # Silence Prophet/cmdstanpy progress output
+    logging.getLogger("cmdstanpy").disabled = True
+    logging.getLogger("prophet").setLevel(logging.WARNING)
+
+    print(f"{'dataset':<10} {'engine':<9} {'series':>6} {'fit (s)':>10} {'total (s)':>10} {'MAE':>8} {'RMSE':>8}")
+    run("mock", mock_series(), args.mock_holdout_hours, args.threshold_quantile)
+    run("generated", make_series(args.series, args.days), int(args.holdout_days * 24), args.threshold_quantile)
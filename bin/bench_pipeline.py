@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the analysis pipeline, with regression checks.
+
+For each dataset size (HOSTSxDAYS of 5-min data from data_generator.py) the
+stages below are timed in order, each feeding the next:
+
+  load_data[csv]         parse the fleet CSV                        rows/s
+  load_data[parquet]     load each host's series from the store     series/s
+  detect_anomalies_iso   fit + score the isolation forest           series/s
+  forecast_trend[ENGINE] forecast + first breach                    series/s
+  build_payloads         trend + anomaly payload per host           series/s
+  call_ai                prompt -> stub Ollama -> streamed JSON     calls/s
+  analyze_fleet          the same prompts, concurrently (asyncio)   calls/s
+  parse_json_response    parse the stub's responses                 responses/s
+  insert_prediction      one row per call                           rows/s
+  insert_predictions_bulk  one transaction                          rows/s
+  fetch_predictions      full table                                 rows/s
+  fetch_predictions_page keyset pages of 50 through the table       rows/s
+
+Before the sizes, an import profile runs each of these in a fresh interpreter
+(size "imports"):
+
+  import[MODULE]         cold import of a pipeline or heavy third-party module
+  first_render[app]      one run of src/app.py after `import streamlit`, i.e.
+                         the dashboard's time to first render in a new server
+
+Their rows also list the slowest top-level imports (python -X importtime).
+
+The LLM is a local stub server speaking Ollama's streaming /api/generate, so
+call_ai exercises prompt rendering, HTTP streaming, early stop and parsing
+without a model. Per-series stages run on at most --max-series hosts.
+
+Each stage is run --repeat times (fastest wall time kept). Peak RSS is the
+process high-water mark during the stage (VmHWM, reset before each stage on
+Linux). Results are written as JSON; --compare flags stages that got slower
+or bigger than a baseline run by more than --tolerance and exits 1.
+
+    python bin/bench_pipeline.py --sizes 1x30 10x30 25x90 --output bench.json
+    python bin/bench_pipeline.py --compare bench.json                 # run again, compare
+    python bin/bench_pipeline.py --compare base.json --current new.json
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "src"))
+sys.path.append(os.path.join(ROOT, "bin"))
+
+# Keys of both prompts, so the same answer validates as a trend and an anomaly response
+STUB_ANSWER = {
+    "summary": "CPU is rising slowly; no breach expected within the horizon.",
+    "severity": "low",
+    "breach_time": None,
+    "cpu_at_breach": None,
+    "lead_time_days": None,
+    "action": "none",
+    "total_anomalies_last_24": 0,
+    "worst_cpu_pct_last_24h": 41.2,
+    "most_recent_anomaly_time": "2025-01-01T00:00:00+00:00",
+    "justification": "Forecast median stays below the threshold.",
+    "confidence": 0.8,
+}
+# Text a chatty model appends after the object; call_ai should stop before it
+STUB_TRAILER = "\nLet me know if you need anything else!"
+
+
+# --------------------------------------------------
+# 1) Stub LLM
+# --------------------------------------------------
+class StubOllama(BaseHTTPRequestHandler):
+    """
+    POST /api/generate: streams STUB_ANSWER as NDJSON chunks of
+    `token_chars` characters, `token_delay` seconds apart. Speaks HTTP/1.1
+    with chunked responses and keeps connections alive like Ollama does, so
+    clients that reuse pooled connections are exercised.
+    """
+    protocol_version = "HTTP/1.1"
+    token_chars = 4
+    token_delay = 0.0
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        text = json.dumps(STUB_ANSWER) + STUB_TRAILER
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        started = time.perf_counter_ns()
+        try:
+            for i in range(0, len(text), self.token_chars):
+                if self.token_delay:
+                    time.sleep(self.token_delay)
+                self._chunk(model=request.get("model"), response=text[i:i + self.token_chars], done=False)
+            self._chunk(model=request.get("model"), response="", done=True, done_reason="stop",
+                        prompt_eval_count=len(request.get("prompt", "")) // 4, prompt_eval_duration=0,
+                        eval_count=len(text) // self.token_chars,
+                        eval_duration=time.perf_counter_ns() - started, load_duration=0)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading after the closing brace
+            self.close_connection = True
+
+    def _chunk(self, **fields):
+        fields["created_at"] = pd.Timestamp.now(tz="UTC").isoformat()
+        line = json.dumps(fields).encode() + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(token_delay):
+    StubOllama.token_delay = token_delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --------------------------------------------------
+# 2) Measurement
+# --------------------------------------------------
+def _status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _reset_peak_rss():
+    # "5" resets VmHWM to the current RSS (Linux >= 4.0); elsewhere the peak is cumulative
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def measure(stage, size, items, unit, fn, repeat):
+    """
+    Run fn() `repeat` times; returns (result of the last run, JSON row).
+    """
+    _reset_peak_rss()
+    rss_start = _status_mb("VmRSS")
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    wall = min(times)
+    row = {
+        "stage": stage,
+        "size": size["name"],
+        "hosts": size["hosts"],
+        "days": size["days"],
+        "items": items,
+        "unit": unit,
+        "wall_s": round(wall, 4),
+        "throughput": round(items / wall, 2) if wall > 0 else None,
+        "rss_start_mb": round(rss_start, 1),
+        "peak_rss_mb": round(_status_mb("VmHWM"), 1),
+    }
+    print(f"{size['name']:<8} {stage:<26} {items:>8} {wall:>9.3f} {row['throughput'] or 0:>12,.1f} {unit:<12} "
+          f"{row['peak_rss_mb']:>8.1f}", flush=True)
+    return out, row
+
+
+# Cold imports timed by the import profile: what the dashboard needs for its
+# first render, then the heavy dependencies it should only load on first use
+IMPORT_MODULES = ("pandas", "streamlit", "db", "pipeline", "ai", "metric_store",
+                  "sklearn.ensemble", "prophet", "langchain_ollama", "altair")
+
+IMPORT_PROBE = """
+import sys, time, resource
+sys.path[:0] = {paths!r}
+{setup}
+sys.stderr.write("PROBE-START\\n")
+start = time.perf_counter()
+{body}
+wall = time.perf_counter() - start
+# VmHWM starts fresh at exec; ru_maxrss would include the parent's peak on Linux
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+for line in open("/proc/self/status") if sys.platform == "linux" else ():
+    if line.startswith("VmHWM:"):
+        peak = int(line.split()[1])
+print("PROBE", wall, peak / 1024)
+"""
+
+
+def _slowest_imports(stderr, top, module=None):
+    """
+    Slowest imports by cumulative time from -X importtime output: the
+    top-level ones, or with `module` the ones directly below it.
+    """
+    # nesting is shown by indentation: 1 space at the top level, 2 more per level
+    depths = (1, 3) if module else (1,)
+    skip = {module.rsplit(".", i)[0] for i in range(module.count(".") + 1)} if module else set()
+    entries = []
+    for line in stderr.split("PROBE-START", 1)[-1].splitlines():
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        if len(name) - len(name.lstrip()) in depths and name.strip() not in skip:
+            entries.append((name.strip(), int(parts[1]) / 1e6))
+    return [[name, round(seconds, 3)] for name, seconds in sorted(entries, key=lambda e: -e[1])[:top]]
+
+
+def profile_import(stage, setup, body, repeat, env, module=None, top=5):
+    """
+    Time `body` in a fresh interpreter (after `setup`) `repeat` times; the
+    fastest run is kept. Returns a row like measure()'s plus "slowest_imports"
+    (see _slowest_imports).
+    """
+    code = IMPORT_PROBE.format(paths=[os.path.join(ROOT, "src"), os.path.join(ROOT, "bin")],
+                               setup=setup, body=body)
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                              capture_output=True, text=True, env=env, cwd=ROOT)
+        probe = [line.split() for line in proc.stdout.splitlines() if line.startswith("PROBE ")]
+        if proc.returncode or not probe:
+            raise RuntimeError(f"{stage} failed:\n{proc.stderr[-2000:]}")
+        runs.append((float(probe[-1][1]), float(probe[-1][2]), proc.stderr))
+    wall, peak, stderr = min(runs)
+    row = {
+        "stage": stage,
+        "size": "imports",
+        "hosts": 0,
+        "days": 0,
+        "items": 1,
+        "unit": "runs/s",
+        "wall_s": round(wall, 4),
+        "throughput": round(1 / wall, 2) if wall > 0 else None,
+        "rss_start_mb": None,
+        "peak_rss_mb": round(peak, 1),
+        "slowest_imports": _slowest_imports(stderr, top, module),
+    }
+    slowest = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in row["slowest_imports"][:3])
+    print(f"{'imports':<8} {stage:<26} {1:>8} {wall:>9.3f} {row['throughput'] or 0:>12,.1f} {'runs/s':<12} "
+          f"{peak:>8.1f}  {slowest}", flush=True)
+    return row
+
+
+def run_imports(args, tmp):
+    """Import profile: cold imports and the dashboard's first render."""
+    tmp = os.path.join(tmp, "imports")
+    os.makedirs(tmp)
+    csv_path, *_ = make_dataset(tmp, 1, 7, args.seed)
+    env = dict(os.environ, DATA_PATH=csv_path, PREDICTIONS_DB=os.path.join(tmp, "predictions.db"),
+               MODEL_DIR=os.path.join(tmp, "models"), METRICS_PORT="0")
+    rows = [profile_import(f"import[{module}]", "", f"import {module}", args.repeat, env, module)
+            for module in IMPORT_MODULES]
+    # bare mode (no server): st.* calls run but render nothing
+    setup = "import runpy, logging, streamlit\nlogging.getLogger('streamlit').setLevel(logging.ERROR)"
+    body = f"runpy.run_path({os.path.join(ROOT, 'src', 'app.py')!r}, run_name='__main__')"
+    rows.append(profile_import("first_render[app]", setup, body, args.repeat, env))
+    return rows
+
+
+# --------------------------------------------------
+# 3) Pipeline
+# --------------------------------------------------
+def make_dataset(tmp, hosts, days, seed):
+    """Fleet CSV + Parquet store with the same values (data_generator layout)."""
+    from data_generator import METRIC, build_chunk, host_names, write_csv, write_parquet
+    from metric_store import MetricStore
+
+    gen = SimpleNamespace(interval=5, trend=[-0.02, 0.08], daily_amp=12.0, weekly_amp=6.0, noise=6.0,
+                          spikes=3, level_shifts=1, leaks=1)
+    ts = pd.date_range(end=pd.Timestamp.now().floor("5min"), periods=days * 288, freq="5min")
+    names = host_names(hosts)
+    values, _ = build_chunk(np.random.SeedSequence(seed), names, ts, gen)
+    csv_path = os.path.join(tmp, f"fleet_{hosts}x{days}.csv")
+    write_csv(csv_path, ts.strftime("%Y-%m-%d %H:%M:%S").values, names, values, first_id=1)
+    store_path = os.path.join(tmp, f"store_{hosts}x{days}")
+    write_parquet(MetricStore(store_path), ts, names, values)
+    return csv_path, store_path, list(names), METRIC, hosts * len(ts)
+
+
+def run_size(size, args, tmp):
+    import db
+    from ai import analyze_fleet, anomaly_prompt, call_ai, response_cache, trend_prompt
+    from analysis import AnalysisResult, build_anomaly_payload, build_trend_payload
+    from predictive import detect_anomalies_iso, forecast_summary
+    from utils import ai_to_prediction_record, load_data, parse_json_response
+
+    repeat = args.repeat
+    csv_path, store_path, hosts, metric, n_rows = make_dataset(tmp, size["hosts"], size["days"], args.seed)
+    hosts = hosts[:args.max_series]
+    rows = []
+
+    def stage(name, items, unit, fn):
+        out, row = measure(name, size, items, unit, fn, repeat)
+        rows.append(row)
+        return out
+
+    stage("load_data[csv]", n_rows, "rows/s", lambda: load_data(csv_path))
+    series = stage("load_data[parquet]", len(hosts), "series/s",
+                   lambda: [load_data(store_path, host, metric) for host in hosts])
+
+    anomalies = stage("detect_anomalies_iso", len(hosts), "series/s",
+                      lambda: [detect_anomalies_iso(df) for df in series])
+    for anom_df in anomalies:
+        anom_df["timestamp"] = pd.to_datetime(anom_df["timestamp"], utc=True)
+
+    forecasts = {}
+    for engine in args.engines:
+        forecasts = stage(f"forecast_trend[{engine}]", len(hosts), "series/s",
+                          lambda: [forecast_summary(df, threshold=args.threshold, engine=engine) for df in series])
+
+    results = [
+        AnalysisResult(host=host, metric=metric, data_hash="", threshold=args.threshold,
+                       cutoff_ts=df["timestamp"].max(), forecast_df=forecast_df,
+                       first_hit=summary["first_breach_ts"], anom_df=anom_df, summary=summary)
+        for host, df, (forecast_df, summary), anom_df in zip(hosts, series, forecasts, anomalies)
+    ]
+    payloads = stage("build_payloads", len(results), "series/s",
+                     lambda: [(build_trend_payload(r), build_anomaly_payload(r)) for r in results])
+
+    calls = [(trend_prompt, {"trend_payload": t}) for t, _ in payloads]
+    calls += [(anomaly_prompt, {"anomaly_payload": a}) for _, a in payloads]
+    calls = calls[:args.max_llm_calls]
+    raw = stage("call_ai", len(calls), "calls/s",
+                lambda: [call_ai(prompt, inputs, use_cache=False) for prompt, inputs in calls])
+
+    def fleet():
+        # call_ai above filled the response cache; every run must reach the stub, reusing
+        # the client's pooled connections. A failed call comes back as "".
+        response_cache.clear()
+        answers = [text for pair in analyze_fleet(pairs) for text in pair]
+        if not all(answers):
+            raise RuntimeError(f"analyze_fleet: {answers.count('')} of {len(answers)} calls failed")
+        return answers
+
+    pairs = payloads[:max(1, args.max_llm_calls // 2)]
+    stage("analyze_fleet", 2 * len(pairs), "calls/s", fleet)
+
+    responses = raw * max(1, args.parse_responses // max(len(raw), 1))
+    parsed = stage("parse_json_response", len(responses), "responses/s",
+                   lambda: [parse_json_response(text) for text in responses])
+
+    records = [
+        ai_to_prediction_record(host, metric, {"trends": parsed[i], "anomalies": parsed[-1 - i]})
+        for i, host in enumerate(hosts)
+    ]
+    records = (records * (args.db_rows // len(records) + 1))[:args.db_rows]
+
+    def fresh_db(name):
+        db.close_connections()
+        db.db_path = os.path.join(tmp, f"{name}_{size['name']}_{time.perf_counter_ns()}.db")
+        db.get_connection()  # applies the schema migrations
+
+    def per_row():
+        fresh_db("per_row")
+        for record in records:
+            db.insert_prediction(record)
+
+    def bulk():
+        fresh_db("bulk")
+        db.insert_predictions_bulk(records)
+
+    def pages():
+        cursor, total = None, 0
+        while True:
+            page, cursor = db.fetch_predictions_page(limit=50, before=cursor)
+            total += len(page)
+            if cursor is None:
+                return total
+
+    stage("insert_prediction", len(records), "rows/s", per_row)
+    stage("insert_predictions_bulk", len(records), "rows/s", bulk)
+    stage("fetch_predictions", len(records), "rows/s", db.fetch_predictions)
+    stage("fetch_predictions_page", len(records), "rows/s", pages)
+    db.close_connections()
+    return rows
+
+
+# --------------------------------------------------
+# 4) Compare
+# --------------------------------------------------
+def compare(baseline, current, tolerance, min_seconds, min_mb):
+    """
+    Rows of current that are slower (wall_s) or bigger (peak_rss_mb) than the
+    baseline row for the same size/stage by more than `tolerance` (relative)
+    and the absolute noise floor. Returns the number of regressions.
+    """
+    base = {(r["size"], r["stage"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"\n{'size':<8} {'stage':<26} {'base (s)':>9} {'now (s)':>9} {'change':>8} "
+          f"{'base MB':>8} {'now MB':>8} {'change':>8}")
+    for row in current["results"]:
+        old = base.get((row["size"], row["stage"]))
+        if old is None:
+            continue
+        flags = []
+        cells = []
+        for field, floor in (("wall_s", min_seconds), ("peak_rss_mb", min_mb)):
+            before, now = old[field], row[field]
+            change = (now - before) / before * 100 if before else 0.0
+            if now > before * (1 + tolerance) and now - before > floor:
+                flags.append(field)
+            cells.append(f"{before:>9.3f} {now:>9.3f} {change:>+7.1f}%" if field == "wall_s"
+                         else f"{before:>8.1f} {now:>8.1f} {change:>+7.1f}%")
+        regressions += bool(flags)
+        mark = f"  REGRESSION ({', '.join(flags)})" if flags else ""
+        print(f"{row['size']:<8} {row['stage']:<26} {' '.join(cells)}{mark}")
+    missing = sorted(set(base) - {(r["size"], r["stage"]) for r in current["results"]})
+    if missing:
+        print(f"Not in this run: {', '.join(f'{s} {st}' for s, st in missing)}")
+    print(f"\n{regressions} regression(s) at tolerance {tolerance:.0%}")
+    return regressions
+
+
+def parse_size(text):
+    hosts, _, days = text.lower().partition("x")
+    return {"name": text, "hosts": int(hosts), "days": int(days or 30)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1x30", "10x30", "25x90"],
+                        help="Datasets as HOSTSxDAYS, smallest first")
+    parser.add_argument("--engines", nargs="+", default=["seasonal"], help="Forecast engines to time")
+    parser.add_argument("--max-series", type=int, default=25, help="Hosts run through the per-series stages")
+    parser.add_argument("--max-llm-calls", type=int, default=50)
+    parser.add_argument("--parse-responses", type=int, default=1000, help="Responses parsed per size")
+    parser.add_argument("--db-rows", type=int, default=2000, help="Prediction rows inserted/fetched per size")
+    parser.add_argument("--threshold", type=float, default=80.0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest is kept")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="Stub LLM delay between tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-imports", action="store_true", help="Skip the import profile")
+    parser.add_argument("--output", default=None, help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", default=None, metavar="BASELINE", help="Baseline results JSON")
+    parser.add_argument("--current", default=None,
+                        help="With --compare: compare this results JSON instead of running")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative slowdown/growth flagged")
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="Ignore wall-time changes below this")
+    parser.add_argument("--min-mb", type=float, default=5.0, help="Ignore peak-RSS changes below this")
+    args = parser.parse_args(argv)
+
+    if args.current:
+        if not args.compare:
+            parser.error("--current needs --compare")
+        with open(args.compare) as f, open(args.current) as g:
+            return 1 if compare(json.load(f), json.load(g), args.tolerance, args.min_seconds, args.min_mb) else 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # must be set before ai.py builds its client and response cache
+        server = start_stub(args.token_delay_ms / 1000)
+        os.environ["AI_HOST"] = f"http://127.0.0.1:{server.server_address[1]}"
+        os.environ["AI_MODEL"] = "bench-stub"
+        os.environ["LLM_CACHE_PATH"] = os.path.join(tmp, "llm_cache.db")
+
+        # Silence per-call prompt logging and Prophet/cmdstanpy progress output
+        logging.disable(logging.INFO)
+        logging.getLogger("cmdstanpy").disabled = True
+
+        print(f"{'size':<8} {'stage':<26} {'items':>8} {'wall (s)':>9} {'throughput':>12} {'':<12} {'peak MB':>8}")
+        results = [] if args.skip_imports else run_imports(args, tmp)
+        for size in map(parse_size, args.sizes):
+            results.extend(run_size(size, args, tmp))
+        server.shutdown()
+
+    report = {
+        "meta": {
+            "created_at": pd.Timestamp.now(tz="UTC").isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            return 1 if compare(json.load(f), report, args.tolerance, args.min_seconds, args.min_mb) else 0
+    if not args.output:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
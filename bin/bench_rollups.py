@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark: resampling the raw history vs. reading rollups.
+
+Window (dashboard / streaming scheduler), per history length:
+  analysis   getting the 5-min and hourly means one analysis run needs:
+             resample() of the window vs. window.rollup() + mean_series()
+  ingest     appending one hour of samples (12 points) to the window,
+             without and with keeping its rollups current
+
+Metric store, for `--hosts` hosts x the longest history:
+  append     writing one hour of samples for one host, raw only vs. raw + rollups
+  daily p95  fleet-wide daily p95 over the whole history: raw read + groupby
+             vs. reading the 1d rollup
+
+    python bin/bench_rollups.py --days 30 90 365 --hosts 20
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from ingest import RollingWindow
+from rollups import mean_series
+
+
+class RawWindow(RollingWindow):
+    """The window without rollups (the ingest baseline)."""
+
+    def _update_rollups(self, *args):
+        pass
+
+
+def make_history(hosts, days, seed=0):
+    """Long-format 5-min CPU history (host, metric, timestamp, value)."""
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(end=pd.Timestamp.now().floor("5min"), periods=days * 288, freq="5min")
+    return pd.DataFrame({
+        "host": np.repeat([f"host-{i:02d}" for i in range(hosts)], len(ts)),
+        "metric": "CPU Usage",
+        "timestamp": np.tile(ts.values, hosts),
+        "value": rng.normal(40, 10, hosts * len(ts)),
+    })
+
+
+def next_hour(df, host):
+    """One hour of new samples for `host`, right after the end of `df`."""
+    ts = df["timestamp"].max() + pd.to_timedelta(np.arange(1, 13) * 5, unit="min")
+    return pd.DataFrame({"host": host, "metric": "CPU Usage", "timestamp": ts, "value": 50.0})
+
+
+def best(fn, repeat):
+    """Fastest of `repeat` runs, in ms."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def resample_means(frame):
+    series = frame.set_index("timestamp")["cpu_usage_percent"]
+    return series.resample("5min").mean(), series.resample("h").mean()
+
+
+def rollup_means(window, host, metric):
+    rollups = window.rollup(host, metric, ["5min", "1h"])
+    return mean_series(rollups, "5min"), mean_series(rollups, "1h")
+
+
+def run_window(days, repeat):
+    history = make_history(1, days)
+    host, metric = "host-00", "CPU Usage"
+    window = RollingWindow(capacity=days * 288)
+    window.ingest(history)
+    frame = window.frame(host, metric)
+    print(f"{days:>6} {'analysis':<10} {best(lambda: resample_means(frame), repeat):>12.2f} "
+          f"{best(lambda: rollup_means(window, host, metric), repeat):>12.2f}")
+
+    chunks = [next_hour(history, host)]
+    for _ in range(repeat - 1):
+        chunks.append(next_hour(chunks[-1], host))
+    plain = RawWindow(capacity=days * 288)
+    plain.ingest(history)
+    raw_feed, rollup_feed = iter(chunks), iter(chunks)
+    print(f"{days:>6} {'ingest':<10} {best(lambda: plain.ingest(next(raw_feed)), repeat):>12.2f} "
+          f"{best(lambda: window.ingest(next(rollup_feed)), repeat):>12.2f}")
+
+
+def run_store(hosts, days, repeat):
+    from metric_store import MetricStore
+
+    history = make_history(hosts, days)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MetricStore(tmp)
+        started = time.perf_counter()
+        for _, group in history.groupby("host", sort=False):
+            store.write(group)
+        print(f"\nstore: {hosts} hosts x {days} days, written with rollups in {time.perf_counter() - started:.1f}s")
+
+        appends = [next_hour(history, "host-00")]
+        for _ in range(2 * repeat - 1):
+            appends.append(next_hour(appends[-1], "host-00"))
+        raw_only, with_rollups = iter(appends[::2]), iter(appends[1::2])
+        print(f"{'':>6} {'append':<10} {best(lambda: store.write(next(raw_only), rollups=False), repeat):>12.2f} "
+              f"{best(lambda: store.write(next(with_rollups)), repeat):>12.2f}")
+
+        def raw_daily_p95():
+            raw = store.read()
+            return raw.groupby(["host", "metric", raw["timestamp"].dt.floor("D")], observed=True)["value"].quantile(0.95)
+
+        print(f"{'':>6} {'daily p95':<10} {best(raw_daily_p95, repeat):>12.2f} "
+              f"{best(lambda: store.rollups.read('1d')[['host', 'metric', 'timestamp', 'p95']], repeat):>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 90, 365])
+    parser.add_argument("--hosts", type=int, default=20, help="Hosts in the metric store part")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'days':>6} {'step':<10} {'raw (ms)':>12} {'rollups (ms)':>12}")
+    for days in args.days:
+        run_window(days, args.repeat)
+    run_store(args.hosts, max(args.days), args.repeat)
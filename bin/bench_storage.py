@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark: load time and peak RSS of the CSV path vs. the Parquet metric store.
+
+Writes N hosts x D days of 5-min data in the data_generator.py CSV layout and
+into a MetricStore, then loads one host's last `--query-days` in a fresh
+process for each path (so peak RSS is not polluted by the other run).
+
+    python bin/bench_storage.py --hosts 10 --days 365 --query-days 30
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+def make_history(n_hosts, days, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(end=pd.Timestamp.now().floor("5min"), periods=days * 288, freq="5min")
+    values = rng.normal(25, 8, (n_hosts, len(ts))).round(2)
+    return pd.DataFrame({
+        "host": np.repeat([f"host-{i:02d}" for i in range(n_hosts)], len(ts)),
+        "metric": "CPU Usage",
+        "timestamp": np.tile(ts.values, n_hosts),
+        "value": values.ravel(),
+    })
+
+
+def _peak_rss_mb():
+    # VmHWM is reset on exec, unlike ru_maxrss which carries over from the parent
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Both loaders avoid importing utils (and with it streamlit) so the baseline
+# RSS is just pandas/pyarrow and the peak reflects the load itself.
+def _load_csv(path, host, start, queue):
+    from ingest import normalize_columns
+    base = _peak_rss_mb()
+    t0 = time.perf_counter()
+    # CSV has no pushdown: parse everything, then filter (what load_data does for CSV)
+    df = normalize_columns(pd.read_csv(path))
+    df = df[(df["host"] == host) & (df["timestamp"] >= start)]
+    queue.put((time.perf_counter() - t0, len(df), base, _peak_rss_mb()))
+
+
+def _load_store(path, host, start, queue):
+    from metric_store import MetricStore
+    base = _peak_rss_mb()
+    t0 = time.perf_counter()
+    # what load_data does for a store directory
+    df = MetricStore(path).load_series(host, "CPU Usage", start=start)
+    queue.put((time.perf_counter() - t0, len(df), base, _peak_rss_mb()))
+
+
+def run_isolated(target, *args):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=target, args=(*args, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=10)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--query-days", type=int, default=30, help="Time range loaded for one host")
+    args = parser.parse_args()
+
+    from metric_store import MetricStore
+
+    history = make_history(args.hosts, args.days)
+    host = "host-00"
+    start = history["timestamp"].max() - pd.Timedelta(days=args.query_days)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "mock_zabbix_data.csv")
+        store_path = os.path.join(tmp, "metrics")
+        # Same layout as bin/data_generator.py output
+        (history.rename(columns={"timestamp": "Timestamp", "host": "Host", "value": "CPU Usage"})
+                .drop(columns="metric")
+                .to_csv(csv_path, index_label="ID", date_format="%Y-%m-%d %H:%M:%S"))
+        MetricStore(store_path).write(history, rollups=False)   # raw format only
+
+        store_bytes = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(store_path) for f in fs)
+        print(f"{len(history):,} rows, {args.hosts} hosts x {args.days} days")
+        print(f"size on disk: CSV {os.path.getsize(csv_path) / 1e6:.1f} MB, Parquet {store_bytes / 1e6:.1f} MB")
+        print(f"query: {host}, last {args.query_days} days\n")
+
+        print(f"{'path':<8} {'rows':>8} {'load (s)':>9} {'base RSS (MB)':>14} {'peak RSS (MB)':>14}")
+        for name, target, path in [("csv", _load_csv, csv_path), ("parquet", _load_store, store_path)]:
+            secs, rows, base, peak = run_isolated(target, path, host, start)
+            print(f"{name:<8} {rows:>8,} {secs:>9.3f} {base:>14.1f} {peak:>14.1f}")
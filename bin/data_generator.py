@@ -1,87 +1,204 @@
+#!/usr/bin/env python3
+"""
+Synthetic Zabbix CPU history for load tests and detector scoring.
+
+Every host gets its own series: baseline + linear trend + daily and weekly
+seasonality + Gaussian noise, with injected anomalies:
+
+  spike        a few points at 90-100%
+  level_shift  the series jumps by +10..25 points for 1-7 days
+  slow_leak    load ramps up by 15..40 points over 1-5 days, then resets
+
+Hosts are generated in chunks of NumPy arrays (no per-row Python), written as
+CSV (the original ID, Timestamp, Host, CPU Usage layout) or into a Parquet
+metric store (see src/metric_store.py), and every injected anomaly is listed
+in a ground-truth label file (host, metric, kind, start, end, magnitude).
+
+    python bin/data_generator.py                                  # 1 host, 1 year, data/mock_zabbix_data.csv
+    python bin/data_generator.py --hosts 1000 --format parquet    # data/metrics/ + data/metrics_labels.csv
+"""
 import os
-import csv
-import random
-from datetime import datetime, timedelta
-
-# Configurable parameters - Scale up to thousands of hosts
-hosts = ["host-01"]  # 1 host
-interval_minutes = 5
-days = 365  # Simulate for 1 year
-start_time = datetime.now() - timedelta(days=days)
-points_per_host = (24 * 60 // interval_minutes) * days
-rows_count = 0
-
-print(f"Generating data for {len(hosts)} hosts over {days} days...")
-print(f"Total data points: {len(hosts) * points_per_host:,}")
-
-# Function to inject anomalies
-def get_anomaly_indexes():
-    """Select random indexes for anomaly injection in the time series."""
-    indexes = random.sample(
-        range(50, points_per_host - 50), k=random.randint(2, 4)
-    )  # 2-4 anomalies per host
-    return set(indexes)
-
-
-# Function to generate monitoring data with anomalies
-def generate_row(timestamp, host, index, rows_count):
-    """Generate a row of monitoring data (with anomalies at specific indexes)."""
-    is_anomaly = index in host_anomalies[host]
-
-    if is_anomaly:
-        # Inject anomalies
-        cpu_usage = round(random.uniform(90, 100), 2)  # High CPU usage for anomaly
-        anomalies.append((timestamp.strftime("%Y-%m-%d %H:%M:%S"), host))
+import sys
+import time
+import argparse
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "src"))
+
+METRIC = "CPU Usage"
+
+
+def host_names(n_hosts):
+    width = max(2, len(str(n_hosts)))
+    return np.array([f"host-{i:0{width}d}" for i in range(1, n_hosts + 1)])
+
+
+def _windows(rng, n_hosts, count, n_points, min_len, max_len):
+    """(start, length) arrays of shape (n_hosts, count) for anomaly windows."""
+    length = rng.integers(min_len, max_len + 1, (n_hosts, count))
+    start = rng.integers(0, np.maximum(n_points - length, 1))
+    return start, length
+
+
+def generate_chunk(rng, n_hosts, ts, args):
+    """
+    Returns (values (n_hosts, T) float32, labels [(host_idx, kind, start_idx, end_idx, magnitude)]).
+    """
+    n_points = len(ts)
+    points_per_day = 24 * 60 // args.interval
+    t_days = np.arange(n_points) / points_per_day
+    hour = (ts.hour.values + ts.minute.values / 60)[None, :]
+    weekend = (ts.dayofweek.values >= 5)[None, :]
+
+    base = rng.uniform(10, 40, (n_hosts, 1))
+    slope = rng.uniform(*args.trend, (n_hosts, 1))
+    daily = rng.uniform(0, args.daily_amp, (n_hosts, 1))
+    peak_hour = rng.uniform(10, 16, (n_hosts, 1))
+    weekly = rng.uniform(0, args.weekly_amp, (n_hosts, 1))
+    noise = rng.uniform(0.5, 1.0, (n_hosts, 1)) * args.noise
+
+    values = (
+        base
+        + slope * t_days[None, :]
+        + daily * np.cos(2 * np.pi * (hour - peak_hour) / 24)
+        - weekly * weekend
+        + noise * rng.standard_normal((n_hosts, n_points))
+    )
+
+    labels = []
+    rows = np.arange(n_hosts)[:, None]
+    idx = np.arange(n_points)[None, None, :]
+
+    # spikes: short bursts to 90-100%
+    start, length = _windows(rng, n_hosts, args.spikes, n_points, 1, 3)
+    level = rng.uniform(90, 100, start.shape)
+    for k in range(3):
+        hit = k < length
+        pos = np.minimum(start + k, n_points - 1)
+        values[np.broadcast_to(rows, pos.shape)[hit], pos[hit]] = level[hit]
+    labels.append(("spike", start, length, level))
+
+    # level shifts: step up for 1-7 days
+    start, length = _windows(rng, n_hosts, args.level_shifts, n_points, points_per_day, 7 * points_per_day)
+    size = rng.uniform(10, 25, start.shape)
+    inside = (idx >= start[..., None]) & (idx < (start + length)[..., None])
+    values += (inside * size[..., None]).sum(axis=1)
+    labels.append(("level_shift", start, length, size))
+
+    # slow leaks: linear ramp over 1-5 days, reset at the end (e.g. a restart)
+    start, length = _windows(rng, n_hosts, args.leaks, n_points, points_per_day, 5 * points_per_day)
+    size = rng.uniform(15, 40, start.shape)
+    ramp = (idx - start[..., None]) / length[..., None]
+    values += (np.where((ramp >= 0) & (ramp < 1), ramp, 0.0) * size[..., None]).sum(axis=1)
+    labels.append(("slow_leak", start, length, size))
+
+    values = np.clip(values, 0, 100).round(2).astype(np.float32)
+    out = []
+    for kind, start, length, magnitude in labels:
+        host_idx = np.broadcast_to(rows, start.shape).ravel()
+        end = np.minimum(start + length, n_points).ravel() - 1
+        out.extend(zip(host_idx, [kind] * host_idx.size, start.ravel(), end, magnitude.ravel().round(2)))
+    return values, out
+
+
+def build_chunk(seed, chunk_hosts, ts, args, store_path=None):
+    """
+    Generate one chunk of hosts. With `store_path` the values are written to
+    the Parquet store right here (so pool workers only send labels back).
+    Returns (values or None, labels with host names and timestamps).
+    """
+    values, labels = generate_chunk(np.random.default_rng(seed), len(chunk_hosts), ts, args)
+    labels = [(chunk_hosts[h], METRIC, kind, ts[s], ts[e], m) for h, kind, s, e, m in labels]
+    if store_path is None:
+        return values, labels
+    from metric_store import MetricStore
+    write_parquet(MetricStore(store_path), ts, chunk_hosts, values)
+    return None, labels
+
+
+def write_csv(path, ts_text, hosts, values, first_id):
+    n_hosts, n_points = values.shape
+    pd.DataFrame({
+        "ID": np.arange(first_id, first_id + n_hosts * n_points),
+        "Timestamp": np.tile(ts_text, n_hosts),
+        "Host": np.repeat(hosts, n_points),
+        "CPU Usage": values.ravel(),
+    }).to_csv(path, mode="a", header=first_id == 1, index=False, float_format="%.2f")
+
+
+def write_parquet(store, ts, hosts, values):
+    n_hosts, n_points = values.shape
+    store.write(pd.DataFrame({
+        # categoricals keep the frame small; MetricStore dictionary-encodes them anyway
+        "host": pd.Categorical.from_codes(np.repeat(np.arange(n_hosts), n_points), hosts),
+        "metric": pd.Categorical.from_codes(np.zeros(n_hosts * n_points, dtype=np.int8), [METRIC]),
+        "timestamp": np.tile(ts.values, n_hosts),
+        "value": values.ravel(),
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=1)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--interval", type=int, default=5, help="Sample interval (minutes)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output", default=None,
+                        help="CSV file or Parquet store directory (default data/mock_zabbix_data.csv or data/metrics)")
+    parser.add_argument("--labels", default=None, help="Ground-truth label CSV (default <output>_labels.csv)")
+    parser.add_argument("--chunk-hosts", type=int, default=100, help="Hosts generated and written per chunk")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes generating/writing chunks in parallel (Parquet output)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--daily-amp", type=float, default=12.0, help="Max daily seasonality amplitude (points)")
+    parser.add_argument("--weekly-amp", type=float, default=6.0, help="Max weekend drop (points)")
+    parser.add_argument("--trend", type=float, nargs=2, default=[-0.02, 0.08], metavar=("MIN", "MAX"),
+                        help="Trend slope range (points per day)")
+    parser.add_argument("--noise", type=float, default=6.0, help="Max noise standard deviation")
+    parser.add_argument("--spikes", type=int, default=3, help="Spikes per host")
+    parser.add_argument("--level-shifts", type=int, default=1, help="Level shifts per host")
+    parser.add_argument("--leaks", type=int, default=1, help="Slow leaks per host")
+    args = parser.parse_args(argv)
+
+    data_dir = os.path.join(ROOT, "data")
+    output = args.output or os.path.join(data_dir, "mock_zabbix_data.csv" if args.format == "csv" else "metrics")
+    labels_path = args.labels or os.path.splitext(output.rstrip("/"))[0] + "_labels.csv"
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    end = pd.Timestamp.now().floor(f"{args.interval}min")
+    ts = pd.date_range(end=end, periods=args.days * 24 * 60 // args.interval, freq=f"{args.interval}min")
+    hosts = host_names(args.hosts)
+    print(f"Generating data for {args.hosts} hosts over {args.days} days...")
+    print(f"Total data points: {args.hosts * len(ts):,}")
+
+    started = time.perf_counter()
+    n_chunks = (args.hosts + args.chunk_hosts - 1) // args.chunk_hosts
+    seeds = np.random.SeedSequence(args.seed).spawn(n_chunks)
+    chunks = [hosts[lo:lo + args.chunk_hosts] for lo in range(0, args.hosts, args.chunk_hosts)]
+    labels = []
+    if args.format == "csv":
+        # one file, appended in host order
+        if os.path.exists(output):
+            os.remove(output)
+        ts_text = ts.strftime("%Y-%m-%d %H:%M:%S").values
+        for chunk, (seed, chunk_hosts) in enumerate(zip(seeds, chunks)):
+            values, chunk_labels = build_chunk(seed, chunk_hosts, ts, args)
+            write_csv(output, ts_text, chunk_hosts, values, first_id=chunk * args.chunk_hosts * len(ts) + 1)
+            labels.extend(chunk_labels)
     else:
-        # Normal behavior
-        cpu_usage = round(random.gauss(25, 8), 2)
-
-    return {
-        "ID": rows_count,
-        "Timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-        "Host": host,
-        "CPU Usage": cpu_usage,
-    }
-
-# Generate synthetic data and write to CSV
-def generate_data():
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(os.path.dirname(script_dir), "data")
-    os.makedirs(data_dir, exist_ok=True)
-    output_file = os.path.join(data_dir, "mock_zabbix_data.csv")
-    
-    with open(output_file, "w", newline="") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "ID",
-                "Timestamp",
-                "Host",
-                "CPU Usage",
-            ],
-        )
-        writer.writeheader()
-
-        total_points = len(hosts) * points_per_host
-        current_time = start_time
-        for i in range(total_points):
-            global rows_count
-            rows_count += 1
-            host = random.choice(hosts)
-            row = generate_row(current_time, host, i % points_per_host, rows_count)
-            writer.writerow(row)
-            current_time += timedelta(minutes=interval_minutes)
-
-    print("✅ Data saved: mock_zabbix_data.csv")
-    print("⚠️ Injected Anomalies:")
-    for ts, host in anomalies:
-        print(f"  - [{ts}] on {host}")
-
-
-# Initialize and generate anomalies for each host
-anomalies = []
-host_anomalies = {host: get_anomaly_indexes() for host in hosts}
-
-# Run data generation
+        with ProcessPoolExecutor(max_workers=min(args.workers, n_chunks)) as pool:
+            for _, chunk_labels in pool.map(build_chunk, seeds, chunks, repeat(ts), repeat(args), repeat(output)):
+                labels.extend(chunk_labels)
+
+    pd.DataFrame(labels, columns=["host", "metric", "kind", "start", "end", "magnitude"]).to_csv(labels_path, index=False)
+    print(f"✅ Data saved: {output} ({time.perf_counter() - started:.1f}s)")
+    print(f"⚠️ Injected anomalies: {len(labels):,}, labels in {labels_path}")
+
+
 if __name__ == "__main__":
-    generate_data()
+    main()
@@ -11,13 +11,16 @@ if ! command -v sqlite3 >/dev/null 2>&1; then
     exit 1
 fi
 
-# Initialize database with proper schema if it doesn't exist
+# Create the database or bring an existing one up to date.
+# Every statement is idempotent; PRAGMA user_version matches db.py's MIGRATIONS.
 if [ ! -f /db/predictions.db ]; then
     echo "📊 Creating new database with schema..."
-    
-    # Create the database with initial schema
-    sqlite3 /db/predictions.db <<EOF
--- Create predictions table
+else
+    echo "✅ Database already exists, applying schema migrations..."
+fi
+
+sqlite3 /db/predictions.db <<EOF
+-- Migration 1: predictions table
 CREATE TABLE IF NOT EXISTS predictions (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     host TEXT,
@@ -34,15 +37,20 @@ CREATE TABLE IF NOT EXISTS predictions (
     metadata TEXT,
     created_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
+
+-- Migration 2: indexes for filtered, keyset-paginated history queries
+CREATE INDEX IF NOT EXISTS idx_predictions_host_metric_created ON predictions (host, metric, created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_status ON predictions (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_created ON predictions (created_at);
+
+PRAGMA journal_mode=WAL;
+PRAGMA user_version = 2;
 EOF
-    if [ $? -eq 0 ]; then
-        echo "✅ Database schema created successfully"
-    else
-        echo "❌ Failed to create database schema"
-        exit 1
-    fi
+if [ $? -eq 0 ]; then
+    echo "✅ Database schema is up to date"
 else
-    echo "✅ Database already exists"
+    echo "❌ Failed to create database schema"
+    exit 1
 fi
 
 # Set proper permissions
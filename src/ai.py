@@ -1,13 +1,18 @@
 # src/ai.py
 
 import os
-import sys
-import streamlit as st
+import json
+import time
+import queue
+import asyncio
+import threading
+import contextlib
+from functools import lru_cache
 
 # ------------------
 # Logging Setup
 # ------------------
-from utils import get_logger
+from utils import JsonObjectStream, get_logger, missing_keys, parse_json_response
 
 logger = get_logger(__name__)
 
@@ -17,152 +22,484 @@ logger = get_logger(__name__)
 # LLM Setup: Local Ollama Only
 # ------------------
 from langchain.prompts import PromptTemplate
-from langchain_ollama import OllamaLLM
+from langchain_core.callbacks import BaseCallbackHandler
+
+from instrumentation import LLM_FIRST_TOKEN_SECONDS, log_sampled, record_ollama_stats, timed
+from llm_cache import get_response_cache
+from prompt_budget import compact_json, count_tokens, get_prompt_budget
 
 # Initialize local Ollama LLM
 ollama_url = os.getenv("AI_HOST", "http://localhost:11434")
 ollama_model = os.getenv("AI_MODEL", None)
 temperature = float(os.getenv("AI_TEMPERATURE", 0.2))
-try:
-    llm = OllamaLLM(model=ollama_model, base_url=ollama_url, temperature=temperature)
-except Exception as e:
-    st.error(f"⚠️ Failed to initialize Ollama LLM: {e}")
-    sys.exit(1)
+# Max in-flight requests (match OLLAMA_NUM_PARALLEL on the server) and per-request timeout
+ai_concurrency = int(os.getenv("AI_CONCURRENCY", 4))
+ai_timeout = float(os.getenv("AI_TIMEOUT", 120))
+# Keep the model (and its KV cache of the shared prompt prefix) loaded between calls
+keep_alive = os.getenv("AI_KEEP_ALIVE", "30m")
+num_ctx = int(os.getenv("AI_NUM_CTX", 4096))
+
+
+@lru_cache(maxsize=None)
+def get_llm():
+    """
+    The process-wide Ollama client, built on first use rather than at import
+    so the dashboard can render without loading langchain_ollama. Raises if
+    the client cannot be configured (e.g. AI_MODEL unset); the next call retries.
+    """
+    from langchain_ollama import OllamaLLM
+
+    try:
+        return OllamaLLM(model=ollama_model, base_url=ollama_url, temperature=temperature,
+                         keep_alive=keep_alive, num_ctx=num_ctx)
+    except Exception as e:
+        logger.error(f"Failed to initialize Ollama LLM: {e}")
+        raise
+
+
+# Response cache shared by every call_ai() in this process
+response_cache = get_response_cache()
+# Compact payload rendering + prompt-size budget (AI_PROMPT_BUDGET tokens)
+prompt_budget = get_prompt_budget()
+
+
+class OllamaStatsHandler(BaseCallbackHandler):
+    """
+    Records Ollama's prompt-eval/generation statistics (see
+    instrumentation.record_ollama_stats). They arrive on the final stream
+    message, so only streams read to the end report them.
+    """
+    run_inline = True
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                record_ollama_stats(generation.generation_info or {})
+
+
+llm_config = {"callbacks": [OllamaStatsHandler()]}
+# After the JSON closes, tokens read while waiting for Ollama's final (stats)
+# message; the first non-blank token is chatter and ends the stream right away
+STATS_GRACE_TOKENS = 3
 
 
 # ------------------
 # Wrapper to invoke LLM
 # ------------------
-def call_ai(prompt: PromptTemplate, inputs: dict) -> str:
+# Responses are streamed and scanned with JsonObjectStream: generation is
+# cut off as soon as the top-level JSON object closes, and `on_update`
+# receives the fields completed so far so the UI can fill in progressively.
+def call_ai(prompt: PromptTemplate, inputs: dict, use_cache: bool = True, on_update=None) -> str:
     """
     Invoke local Ollama or remote AI endpoint.
-    Returns raw LLM response string.
+    Returns raw LLM response string; identical payloads are served from
+    the response cache. Raises PromptTooLarge if the rendered prompt is
+    over the token budget.
     """
-    final_prompt = prompt.format(**inputs)
+    key = response_cache.key(ollama_model, temperature, prompt.template, inputs)
+    if use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            logger.info("LLM response served from cache")
+            return cached
+
+    final_prompt = prompt_budget.render(prompt, inputs)
+
+    # Log a sample of the final prompt strings sent to the LLM
+    log_sampled(logger, f"Final prompt string (~{prompt_budget.last_tokens} tokens)", final_prompt)
+
+    parser, chunks, seen = _new_parser(prompt), [], 0
+    with timed("llm_request"):
+        started = time.perf_counter()
+        stream = get_llm().stream(final_prompt, config=llm_config)
+        try:
+            for token in stream:
+                if not chunks:
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                chunks.append(token)
+                seen = _feed(parser, token, on_update, seen)
+                if parser.done:
+                    for _, token in zip(range(STATS_GRACE_TOKENS), stream):
+                        if token.strip():
+                            break
+                    break
+        finally:
+            # closing the stream drops the HTTP response, which stops Ollama generating
+            stream.close()
+    return _finish(prompt, key, parser, chunks)
 
-    # Log the final prompt string sent to the LLM
-    logger.info(f"Final prompt string:\n{final_prompt}")
 
-    # Chain formatting and LLM invocation
-    chain = (lambda x: final_prompt) | llm
+def _new_parser(prompt: PromptTemplate) -> JsonObjectStream:
+    return JsonObjectStream("[" if prompt.template in ARRAY_TEMPLATES else "{")
+
+
+def _feed(parser: JsonObjectStream, token: str, on_update, seen: int) -> int:
+    parser.feed(token)
+    if on_update is not None:
+        partial = parser.partial()
+        if len(partial) > seen:
+            on_update(partial)
+            return len(partial)
+    return seen
+
+
+def _finish(prompt: PromptTemplate, key: str, parser: JsonObjectStream, chunks: list) -> str:
+    if not parser.done:
+        return "".join(chunks)
+    response = parser.text
+    data = parser.partial()
+    expected = EXPECTED_KEYS.get(prompt.template, [])
+    missing = sorted({
+        key
+        for entry in (data if isinstance(data, list) else [data])
+        for key in (missing_keys(entry, expected) if isinstance(entry, dict) else expected)
+    })
+    if missing:
+        logger.warning(f"LLM response is missing keys: {missing}")
+    else:
+        response_cache.put(key, ollama_model, response)
+    return response
+
+
+# ------------------
+# Async wrappers: concurrent trend + anomaly calls, fleet fan-out
+# ------------------
+async def acall_ai(prompt: PromptTemplate, inputs: dict, semaphore: asyncio.Semaphore = None,
+                   timeout: float = None, use_cache: bool = True, on_update=None) -> str:
+    """
+    Async call_ai(): same cache and streaming, run under an optional
+    semaphore and a per-request timeout (raises asyncio.TimeoutError).
+    """
+    key = response_cache.key(ollama_model, temperature, prompt.template, inputs)
+    if use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            logger.info("LLM response served from cache")
+            return cached
+
+    final_prompt = prompt_budget.render(prompt, inputs)
+    log_sampled(logger, f"Final prompt string (~{prompt_budget.last_tokens} tokens)", final_prompt)
+
+    parser, chunks = _new_parser(prompt), []
+
+    async def consume():
+        seen, started = 0, time.perf_counter()
+        async with contextlib.aclosing(get_llm().astream(final_prompt, config=llm_config)) as stream:
+            async for token in stream:
+                if not chunks:
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                chunks.append(token)
+                seen = _feed(parser, token, on_update, seen)
+                if parser.done:
+                    grace = STATS_GRACE_TOKENS
+                    async for token in stream:
+                        grace -= 1
+                        if token.strip() or not grace:
+                            break
+                    break
+
+    async with semaphore or contextlib.nullcontext():
+        with timed("llm_request"):
+            await asyncio.wait_for(consume(), timeout or ai_timeout)
+    return _finish(prompt, key, parser, chunks)
+
+
+# One event loop for the whole process, run in a daemon thread: the cached
+# client's async HTTP connections are bound to the loop that opened them, so
+# every asyncio call must go through the same loop (a fresh asyncio.run per
+# call would find them tied to an already closed one).
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def _run(coro, calls: queue.SimpleQueue = None):
+    """
+    Run `coro` on the shared loop and wait for its result. Callbacks queued
+    on `calls` (see _relay) are invoked here, in the calling thread, so UI
+    updates stay on the thread that asked for them.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _event_loop())
+    if calls is None:
+        return future.result()
+    future.add_done_callback(lambda _: calls.put(None))
+    try:
+        while (call := calls.get()) is not None:
+            fn, arg = call
+            fn(arg)
+    except BaseException:
+        future.cancel()
+        raise
+    return future.result()
+
+
+def _relay(fn, calls: queue.SimpleQueue):
+    return None if fn is None else (lambda partial: calls.put((fn, partial)))
+
+
+async def _skip():
+    return None
+
+
+async def _analyze_pair(trend_payload: dict, anomaly_payload: dict, semaphore: asyncio.Semaphore = None,
+                        on_trend=None, on_anomaly=None):
+    # A None payload is not sent (e.g. already settled by the rule engine) and yields None
+    results = await asyncio.gather(
+        acall_ai(trend_prompt, {"trend_payload": trend_payload}, semaphore, on_update=on_trend)
+        if trend_payload is not None else _skip(),
+        acall_ai(anomaly_prompt, {"anomaly_payload": anomaly_payload}, semaphore, on_update=on_anomaly)
+        if anomaly_payload is not None else _skip(),
+        return_exceptions=True,
+    )
+    raw = []
+    for name, result in zip(("trend", "anomaly"), results):
+        if isinstance(result, BaseException):
+            logger.error(f"{name} analysis failed: {type(result).__name__}: {result}")
+            result = ""
+        raw.append(result)
+    return tuple(raw)
+
+
+def analyze_concurrently(trend_payload: dict, anomaly_payload: dict, on_trend=None, on_anomaly=None):
+    """
+    Run the trend and anomaly prompts at the same time.
+    Returns (raw_trend, raw_anomaly); a failed call yields "", a None payload None.
+    on_trend/on_anomaly receive the partially parsed objects while streaming.
+    """
+    calls = queue.SimpleQueue()
+    return _run(_analyze_pair(trend_payload, anomaly_payload, on_trend=_relay(on_trend, calls),
+                              on_anomaly=_relay(on_anomaly, calls)), calls)
+
+
+async def _analyze_fleet(items: list, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(
+        _analyze_pair(trend_payload, anomaly_payload, semaphore)
+        for trend_payload, anomaly_payload in items
+    ))
+
+
+def analyze_fleet(items: list, concurrency: int = None):
+    """
+    Fan out trend + anomaly prompts for many hosts.
+    items: [(trend_payload, anomaly_payload), ...]
+    Returns [(raw_trend, raw_anomaly), ...] in the same order.
+    """
+    return _run(_analyze_fleet(items, concurrency or ai_concurrency))
+
+
+# ------------------
+# Batched fleet prompts: N hosts per request
+# ------------------
+# Batches are packed by token count so prompt + expected answer fit in
+# num_ctx (and the prompt in the budget); entries whose answer is missing or
+# fails validation are retried with single-host calls.
+batch_max_hosts = int(os.getenv("AI_BATCH_SIZE", 16))
+# Expected answer size per host (tokens) reserved in the context window
+batch_output_tokens = int(os.getenv("AI_BATCH_OUTPUT_TOKENS", 160))
+
+
+def plan_batches(kind: str, entries: list) -> list:
+    """
+    Split [(key, payload), ...] into batches for BATCH_PROMPTS[kind].
+    """
+    prefix = count_tokens(BATCH_PROMPTS[kind].template)
+    input_limit = min(prompt_budget.max_tokens or num_ctx, num_ctx)
+    batches, batch, used_in, used_out = [], [], prefix, 0
+    for key, payload in entries:
+        size = count_tokens(compact_json({"host": key, **payload}, prompt_budget.precision)) + 1
+        fits = (
+            len(batch) < batch_max_hosts
+            and used_in + size <= input_limit
+            and used_in + size + used_out + batch_output_tokens <= num_ctx
+        )
+        if batch and not fits:
+            batches.append(batch)
+            batch, used_in, used_out = [], prefix, 0
+        batch.append((key, payload))
+        used_in += size
+        used_out += batch_output_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def validate_batch(raw: str, keys, expected_keys) -> dict:
+    """
+    Parse a batch answer into {host_key: object}, keeping only entries for
+    requested hosts that carry every expected key.
+    """
+    parser = JsonObjectStream("[")
+    parser.feed(raw or "")
+    try:
+        data = parser.result()
+    except json.JSONDecodeError:
+        logger.warning("Batch response is not a valid JSON array")
+        return {}
+    valid = {}
+    for entry in data if isinstance(data, list) else []:
+        if not isinstance(entry, dict) or entry.get("host") not in keys or missing_keys(entry, expected_keys):
+            continue
+        key = entry.pop("host")
+        entry["source"] = "llm_batch"
+        valid[key] = entry
+    return valid
+
+
+async def _analyze_batch(kind: str, batch: list, semaphore: asyncio.Semaphore) -> dict:
+    payloads = [{"host": key, **payload} for key, payload in batch]
+    raw = await acall_ai(BATCH_PROMPTS[kind], {"payloads": payloads}, semaphore)
+    keys = {key for key, _ in batch}
+    return validate_batch(raw, keys, TREND_KEYS if kind == "trends" else ANOMALY_KEYS)
+
+
+async def _analyze_fleet_batched(items: list, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    entries = {
+        "trends": [(key, trend) for key, trend, _ in items if trend is not None],
+        "anomalies": [(key, anomaly) for key, _, anomaly in items if anomaly is not None],
+    }
+    batches = [(kind, batch) for kind in entries for batch in plan_batches(kind, entries[kind])]
+    answers = await asyncio.gather(
+        *(_analyze_batch(kind, batch, semaphore) for kind, batch in batches),
+        return_exceptions=True,
+    )
+    parsed = {"trends": {}, "anomalies": {}}
+    for (kind, batch), answer in zip(batches, answers):
+        if isinstance(answer, BaseException):
+            logger.error(f"{kind} batch of {len(batch)} failed: {type(answer).__name__}: {answer}")
+            continue
+        parsed[kind].update(answer)
+
+    # Single-host fallback for whatever the batches did not settle
+    retry = [
+        (key,
+         trend if trend is not None and key not in parsed["trends"] else None,
+         anomaly if anomaly is not None and key not in parsed["anomalies"] else None)
+        for key, trend, anomaly in items
+    ]
+    retry = [item for item in retry if item[1] is not None or item[2] is not None]
+    if retry:
+        logger.info(f"{len(retry)} of {len(items)} hosts fall back to single-host calls")
+        raw = await asyncio.gather(*(_analyze_pair(trend, anomaly, semaphore) for _, trend, anomaly in retry))
+        for (key, _, _), (raw_trend, raw_anomaly) in zip(retry, raw):
+            if raw_trend is not None:
+                parsed["trends"][key] = parse_json_response(raw_trend)
+            if raw_anomaly is not None:
+                parsed["anomalies"][key] = parse_json_response(raw_anomaly)
+
+    return [(parsed["trends"].get(key), parsed["anomalies"].get(key)) for key, _, _ in items]
+
+
+def analyze_fleet_batched(items: list, concurrency: int = None):
+    """
+    Batched analyze_fleet(): packs many hosts into each trend/anomaly prompt.
+    items: [(key, trend_payload, anomaly_payload), ...] with unique keys (e.g. host)
+    Returns [(trends, anomalies), ...] as parsed dicts in the same order; None
+    where no payload was given, {} where both batch and fallback failed.
+    """
+    return _run(_analyze_fleet_batched(items, concurrency or ai_concurrency))
+
 
-    return chain.invoke(inputs)
 # ------------------
 # Prompt templates
 # ------------------
 
+# Static instructions and schema come first and the payload last, so every
+# call shares the same prefix (reused from Ollama's KV cache); payloads are
+# rendered by prompt_budget as minified JSON.
+TREND_INSTRUCTIONS = """You are an SRE capacity-planning assistant.
+Reply with valid JSON only (no markdown, no code fences); double-quote keys, strings and dates.
+
+Input fields:
+generated_at: ISO-8601 snapshot time
+threshold_percent: critical CPU level
+first_median_breach_expected: ISO-8601 or null
+days_until_breach: days from generated_at to breach, or null
+predicted_cpu_at_breach: median CPU at the breach hour, or null
+peak_cpu_next_30d: highest median in the forecast horizon
+median_cpu_next_24h: 24h forward median
+median_cpu_end_of_horizon: median at the last forecast point
+growth_rate_pct_per_day: positive = increasing load
+
+Output exactly this object, every key present:
+{{"summary": "<short sentence>",
+"severity": "none"|"low"|"moderate"|"high"|"critical",
+"breach_time": "<first_median_breach_expected or 'n/a'>",
+"cpu_at_breach": "<predicted_cpu_at_breach or 'n/a'>",
+"lead_time_days": "<days_until_breach or 'n/a'>",
+"action": "<one-sentence next step>",
+"justification": "<one sentence citing the key numbers>",
+"confidence": 0-100}}
+"""
+
+ANOMALY_INSTRUCTIONS = """You are an SRE anomaly-triage assistant.
+Reply with valid JSON only (no markdown, no comments); double-quote keys, strings and dates.
+
+Input fields (isolation forest; scores are negative for outliers, see score_sign/score_hint):
+total_anomalies_last_24h, total_anomalies_last_7d: counts
+most_recent_anomaly_time, most_recent_cpu_pct, most_recent_anomaly_score, most_recent_severity
+worst_anomaly_time_last_24h, worst_cpu_pct_last_24h, worst_anomaly_score_last_24h, worst_severity_last_24h
+severities: "none"|"mild"|"moderate"|"high"|"critical"
+
+Output exactly this object, every key present:
+{{"summary": "<short sentence>",
+"severity": "none"|"low"|"moderate"|"high"|"critical",
+"action": "<one concise step for on-call>",
+"total_anomalies_last_24": "<total_anomalies_last_24h>",
+"worst_cpu_pct_last_24h": "<worst_cpu_pct_last_24h>",
+"most_recent_anomaly_time": "<most_recent_anomaly_time>",
+"justification": "<one sentence citing the key numbers>",
+"confidence": 0-100}}
+"""
+
+# Batch mode: same prefix, N payloads in, one object per host out
+BATCH_INSTRUCTIONS = """
+The data is a JSON array of inputs, each with an extra "host" key.
+Reply with a JSON array holding one such object per input, in the same order,
+each with a "host" key copied from its input.
+"""
+
 trend_prompt = PromptTemplate(
     input_variables=["trend_payload"],
-    template = """
-You are an SRE capacity-planning assistant.
-ALWAYS reply with **valid JSON only** (no markdown, no code fences), double-quoted keys and strings and dates.
-
-# Data schema (read carefully)
-{{
-  "generated_at": ISO-8601       // when this snapshot was produced
-, "threshold_percent": int        // critical CPU level
-, "first_median_breach_expected": str|null // ISO-8601 timestamp or null
-, "days_until_breach": float|null // days between generated_at and breach
-, "predicted_cpu_at_breach": float|null // median CPU at that breach hour
-, "peak_cpu_next_30d": float      // highest median value in forecast horizon
-, "median_cpu_next_24h": float    // 24-h forward median
-, "median_cpu_end_of_horizon": float // median at the last forecast point
-, "growth_rate_pct_per_day": float   // +ve = increasing load
-}}
-
-# Data
-{trend_payload}
-
-# Produce EXACTLY this JSON object structure, dont miss any key:
-{{
-  "summary": "<short sentence summary>",
-  "severity": "none" | "low" | "moderate" | "high" | "critical",
-  "breach_time": "<copy first_median_breach_expected or 'n/a'>",
-  "cpu_at_breach": "<copy predicted_cpu_at_breach or 'n/a'>",
-  "lead_time_days": "<copy days_until_breach or 'n/a'>",
-  "action": "<one-sentence recommended next step>",
-  "justification": "<one sentence citing and reasoning the key numbers>",
-  "confidence": 0-100 (your subjective certainty)
-}}
-
-Only JSON — no additional text.
-"""
+    template=TREND_INSTRUCTIONS + "\nData:\n{trend_payload}\n",
 )
 
 anomaly_prompt = PromptTemplate(
     input_variables=["anomaly_payload"],
-    template = """
-You are an SRE **anomaly-triage assistant**.
-
-ALWAYS reply with **valid JSON ONLY** – no markdown, no comments, double-quoted keys and strings and dates.
-
-# Data schema you receive
-{{
-  "generated_at":                ISO-8601 timestamp of this snapshot
-, "anomaly_method":              "isolation_forest"
-, "score_sign":                  string  // tells you sign convention
-, "score_hint":                  string  // qualitative guide
-, "total_anomalies_last_24h":    int
-, "total_anomalies_last_7d":     int
-, "most_recent_anomaly_time":    ISO-8601
-, "most_recent_cpu_pct":         float   // CPU % at that moment
-, "most_recent_anomaly_score":   float   // negative ⇒ outlier
-, "most_recent_severity":        "none" | "mild" | "moderate" | "high" | "critical"
-, "worst_anomaly_time_last_24h": ISO-8601
-, "worst_cpu_pct_last_24h":      float
-, "worst_anomaly_score_last_24h":float
-, "worst_severity_last_24h":     "none" | "mild" | "moderate" | "high" | "critical"
-}}
-
-# Data
-{anomaly_payload}
-
-# Produce EXACTLY this JSON object structure, dont miss any key:
-{{
-  "summary":        "<short sentence summary>",
-  "severity":     "none" | "low" | "moderate" | "high" | "critical",
-  "action":         "<one concise step the on-call should take>",
-  "total_anomalies_last_24": "<copy total_anomalies_last_24h>",
-  "worst_cpu_pct_last_24h": "<copy worst_cpu_pct_last_24h>",
-  "most_recent_anomaly_time":"<copy most_recent_anomaly_time>",
-  "justification":  "<one sentence citing the key numbers>",
-  "confidence":     0-100 (your subjective certainty)
-}}
-
-ONLY JSON – no extra text.
-"""
+    template=ANOMALY_INSTRUCTIONS + "\nData:\n{anomaly_payload}\n",
 )
 
-threshold_prompt = PromptTemplate(
-    input_variables=["day_table", "night_table"],
-    template="""
-You must derive adaptive alert thresholds for cpu_pct for host 'web-01' using only the last 24 hours.
-
-Inputs
-• CSV with ts, cpu_pct.  
-• Business hours = 09:00-18:00 Asia/Hebron (UTC+3).  
-• Hard limit: cpu_pct 90 %.
-
-Requirements
-1. Split data into daytime (09-18) and off-hours.  
-2. For each period calculate:
-   – q95 + 1 σ  (cap at 90 %).  
-3. Output YAML config:
-
-   host: web-01
-   thresholds:
-     cpu_pct:
-       daytime:{day_table}
-       off_hours: {night_table}
-
-4. Count alerts that would have fired in the past 24 h with:
-   a) static hard limit 90 %   
-   b) your smart thresholds  
-   Present a 2-row comparison table and % reduction in off-hours alerts.
-
-5. Give two short recommendations for refining the thresholds after another day’s data arrives.
-
-Output
-• YAML snippet, comparison table, <100-word summary.
-"""
+batch_trend_prompt = PromptTemplate(
+    input_variables=["payloads"],
+    template=TREND_INSTRUCTIONS + BATCH_INSTRUCTIONS + "\nData:\n{payloads}\n",
 )
+
+batch_anomaly_prompt = PromptTemplate(
+    input_variables=["payloads"],
+    template=ANOMALY_INSTRUCTIONS + BATCH_INSTRUCTIONS + "\nData:\n{payloads}\n",
+)
+
+# Keys each prompt's JSON answer must contain
+TREND_KEYS = ["summary", "severity", "breach_time", "cpu_at_breach", "lead_time_days",
+              "action", "justification", "confidence"]
+ANOMALY_KEYS = ["summary", "severity", "action", "total_anomalies_last_24", "worst_cpu_pct_last_24h",
+                "most_recent_anomaly_time", "justification", "confidence"]
+EXPECTED_KEYS = {
+    trend_prompt.template: TREND_KEYS,
+    anomaly_prompt.template: ANOMALY_KEYS,
+    batch_trend_prompt.template: ["host"] + TREND_KEYS,
+    batch_anomaly_prompt.template: ["host"] + ANOMALY_KEYS,
+}
+# Batch templates are answered with a JSON array
+ARRAY_TEMPLATES = {batch_trend_prompt.template, batch_anomaly_prompt.template}
+BATCH_PROMPTS = {"trends": batch_trend_prompt, "anomalies": batch_anomaly_prompt}
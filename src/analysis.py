@@ -0,0 +1,165 @@
+# src/analysis.py
+
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from breach import summarize_forecast
+from instrumentation import timed
+from predictive import detect_anomalies_iso, forecast_summary
+
+
+# --------------------------------------------------
+# 1) Analysis Result
+# --------------------------------------------------
+@dataclass
+class AnalysisResult:
+    """
+    One forecast + one anomaly pass for a host/metric/data version.
+    Both the charts and the LLM payload builders read from this object.
+    """
+    host: str
+    metric: str
+    data_hash: str
+    threshold: float
+    cutoff_ts: pd.Timestamp
+    forecast_df: pd.DataFrame
+    first_hit: Optional[pd.Timestamp]
+    anom_df: pd.DataFrame
+    # breach.summarize_forecast() of forecast_df, computed with first_hit
+    summary: Optional[dict] = None
+
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """
+    Content hash of a metric frame (values + index), used as the cache key.
+    """
+    digest = hashlib.sha1()
+    digest.update(",".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def run_analysis(df: pd.DataFrame, host: str, metric: str, threshold: float,
+                 data_hash: Optional[str] = None, prophet_store=None,
+                 detector_registry=None, engine: Optional[str] = None,
+                 timings: Optional[dict] = None, rollups: Optional[dict] = None) -> AnalysisResult:
+    """
+    Fit the trend forecast and the anomaly detector exactly once.
+    Pass a ProphetStore to warm-start the forecast from its previous fit,
+    and a DetectorRegistry to reuse a stored anomaly detector.
+    `engine` selects the forecaster (see predictive.FORECASTERS).
+    With the series' `rollups` (see rollups.py) both read their resolution
+    from them instead of resampling `df`.
+    Fit times are added to `timings` as "forecast" and "anomaly".
+    """
+    with timed("forecast", timings):
+        forecast_df, summary = forecast_summary(
+            df, threshold=threshold, host=host, metric=metric, store=prophet_store, engine=engine,
+            rollups=rollups,
+        )
+    with timed("anomaly", timings):
+        anom_df = detect_anomalies_iso(df, host=host, metric=metric, registry=detector_registry, rollups=rollups)
+        anom_df["timestamp"] = pd.to_datetime(anom_df["timestamp"], utc=True)
+
+    return AnalysisResult(
+        host=host,
+        metric=metric,
+        data_hash=data_hash or frame_hash(df),
+        threshold=threshold,
+        cutoff_ts=df["timestamp"].max(),
+        forecast_df=forecast_df,
+        first_hit=summary["first_breach_ts"],
+        anom_df=anom_df,
+        summary=summary,
+    )
+
+
+# --------------------------------------------------
+# 2) LLM Payload Builders
+# --------------------------------------------------
+def build_trend_payload(result: AnalysisResult) -> dict:
+    first_hit = result.first_hit
+    summary = result.summary
+    if summary is None:
+        summary = summarize_forecast(result.forecast_df, result.cutoff_ts, result.threshold)
+
+    now = pd.Timestamp.now(tz=first_hit.tz if first_hit is not None else None)
+
+    cpu_at_breach = None
+    days_until_breach = None
+
+    if first_hit is not None:
+        cpu_at_breach = summary["value_at_breach"]
+        days_until_breach = round((first_hit - now).total_seconds() / 86400, 1)
+
+    return {
+        "generated_at": now.isoformat(),
+        "threshold_percent": result.threshold,
+        "first_median_breach_expected": first_hit.isoformat() if first_hit else None,
+        "days_until_breach": days_until_breach,
+        "predicted_cpu_at_breach": cpu_at_breach,
+        "peak_cpu_next_30d": summary["peak"],
+        "median_cpu_next_24h": round(summary["median_24h"], 1),
+        "median_cpu_end_of_horizon": round(summary["end_value"], 1),
+        "growth_rate_pct_per_day": round(summary["growth_per_day"], 2),
+    }
+
+
+def build_anomaly_payload(result: AnalysisResult) -> dict:
+    anom_df = result.anom_df
+
+    now = datetime.now(timezone.utc)
+    last_24h = anom_df["timestamp"] >= now - timedelta(hours=24)
+    last_7d  = anom_df["timestamp"] >= now - timedelta(days=7)
+
+    # newest outlier (if any) – fall back to newest point
+    try:
+        recent = anom_df[anom_df["anomaly"] == -1].iloc[-1]
+    except IndexError:
+        recent = anom_df.iloc[-1]
+
+    # worst (most negative) score in the past 24 h
+    worst24 = (
+        anom_df[last_24h]
+        .sort_values("anomaly_score")
+        .iloc[0]
+        if (last_24h & (anom_df["anomaly"] == -1)).any()
+        else recent
+    )
+
+    return {
+        # ── metadata ──────────────────────────────────────────────
+        "generated_at": now.isoformat(timespec="seconds"),
+        "anomaly_method": "isolation_forest",
+        "score_sign": "negative = outlier, positive = normal",
+        "score_hint": "≈0 borderline, ≤-0.30 strong anomaly",
+
+        # ── aggregate counts ─────────────────────────────────────
+        "total_anomalies_last_24h": int((last_24h & (anom_df["anomaly"] == -1)).sum()),
+        "total_anomalies_last_7d":  int((last_7d  & (anom_df["anomaly"] == -1)).sum()),
+
+        # ── most-recent anomaly (may be mild) ────────────────────
+        "most_recent_anomaly_time": recent["timestamp"].isoformat(),
+        "most_recent_cpu_pct":      float(np.round(recent["y"], 3)),
+        "most_recent_anomaly_score":float(np.round(recent["anomaly_score"], 4)),
+        "most_recent_severity":     _anom_severity(recent["anomaly_score"]),
+
+        # ── strongest anomaly in the last 24 h ───────────────────
+        "worst_anomaly_time_last_24h": worst24["timestamp"].isoformat(),
+        "worst_cpu_pct_last_24h":      float(np.round(worst24["y"], 3)),
+        "worst_anomaly_score_last_24h":float(np.round(worst24["anomaly_score"], 4)),
+        "worst_severity_last_24h":     _anom_severity(worst24["anomaly_score"]),
+    }
+
+
+def _anom_severity(score: float) -> str:
+    if score >= 0:         return "none"
+    if score > -0.05:      return "mild"
+    if score > -0.15:      return "moderate"
+    if score > -0.30:      return "high"
+    return "critical"
@@ -2,17 +2,24 @@
 # Description: A Streamlit dashboard that uses a local Ollama LLM to analyze Zabbix monitoring data.
 # It provides insights on trends, predicts thresholds, and detects anomalies in system metrics.
 
-import numpy as np
+import os
 import pandas as pd
-import altair as alt
 import streamlit as st
-from datetime import datetime, timezone, timedelta
 
-# Import AI functions and prompts
-from ai import call_ai, trend_prompt, anomaly_prompt
-from predictive import detect_anomalies_iso, forecast_trend
-from db import fetch_predictions, insert_prediction
-from utils import ai_to_prediction_record, load_data, parse_json_response
+# Heavy dependencies (prophet, sklearn, langchain, altair) are imported on
+# first use, not here, so the first render does not wait for them
+from analysis import frame_hash, run_analysis
+from db import fetch_predictions_page, insert_prediction
+from downsample import crossing_rows, downsample
+from ingest import RollingWindow, normalize_columns, open_source
+from instrumentation import REGISTRY, start_metrics_server
+from llm_cache import get_response_cache
+from model_store import DetectorRegistry, ProphetStore
+from pipeline import analyze_with_ai, series_thresholds
+from predictive import FORECAST_ENGINE, FORECASTERS
+from prompt_budget import get_prompt_budget
+from thresholds import HARD_LIMIT
+from utils import ai_to_prediction_record
 
 # ------------------
 # Insights Functions
@@ -20,126 +27,180 @@ from utils import ai_to_prediction_record, load_data, parse_json_response
 
 THRESHOLD = 63  # Example threshold, can be dynamic
 
-def analyze_trends(df: pd.DataFrame):
-    forecast_df, first_hit = forecast_trend(df,threshold=THRESHOLD)
-    cutoff_ts = df["timestamp"].max()
-
-    now = pd.Timestamp.now(tz=first_hit.tz)
-
-    cpu_at_breach = None
-    days_until_breach = None
-
-    if first_hit is not None:
-        breach_row = forecast_df.loc[forecast_df["ds"] == first_hit].iloc[0]
-        cpu_at_breach = float(breach_row["yhat"])
-        days_until_breach = round((first_hit - now).total_seconds() / 86400, 1)
-
-    future_mask = forecast_df["ds"] > df["timestamp"].max()
-    peak_cpu_future = float(forecast_df.loc[future_mask, "yhat"].max())
-
-
-    trend_payload = {
-        "generated_at": now.isoformat(),
-        "threshold_percent": THRESHOLD,
-        "first_median_breach_expected": first_hit.isoformat() if first_hit else None,
-        "days_until_breach": days_until_breach,
-        "predicted_cpu_at_breach": cpu_at_breach, 
-        "peak_cpu_next_30d": peak_cpu_future,
-        "median_cpu_next_24h": round(forecast_df.query("ds > @cutoff_ts").head(24)["yhat"].mean(), 1),
-        "median_cpu_end_of_horizon": round(forecast_df.iloc[-1]["yhat"], 1),
-        "growth_rate_pct_per_day": round(
-            (forecast_df.iloc[-1]["trend"] - forecast_df.iloc[0]["trend"])
-            / len(forecast_df["trend"].dropna().unique().tolist()) * 100, 2
-        ),
-    }
-    
-    raw = call_ai(trend_prompt,{"trend_payload":trend_payload})
-    return parse_json_response(raw)
+@st.cache_resource
+def get_prophet_store():
+    return ProphetStore()
+
+
+@st.cache_resource
+def get_detector_registry():
+    return DetectorRegistry()
+
+
+# One model fit per host/metric/data version; reruns with unchanged data hit the cache.
+# Held as a shared resource (not pickled and copied on every rerun); callers only read it.
+# The leading underscores keep Streamlit from hashing the frame and its rollups.
+@st.cache_resource(show_spinner="Fitting forecast and anomaly models...", max_entries=32)
+def get_analysis(data_hash: str, host: str, metric: str, threshold: float, engine: str, _df: pd.DataFrame,
+                 _rollups: dict = None):
+    return run_analysis(_df, host, metric, threshold, data_hash=data_hash, engine=engine,
+                        prophet_store=get_prophet_store(), detector_registry=get_detector_registry(),
+                        rollups=_rollups)
+
+
+# Prometheus /metrics endpoint (METRICS_PORT), started once per server process
+@st.cache_resource
+def get_metrics_server():
+    return start_metrics_server()
 
 
-def detect_anomalies(df: pd.DataFrame):
-    anom_df = detect_anomalies_iso(df)
-    anom_df["timestamp"] = pd.to_datetime(anom_df["timestamp"], utc=True)
+# Rolling in-memory window fed by a streaming source; each rerun only reads new samples
+@st.cache_resource
+def get_stream(location: str):
+    return RollingWindow(), open_source(location)
 
-    now = datetime.now(timezone.utc)
-    last_24h = anom_df["timestamp"] >= now - timedelta(hours=24)
-    last_7d  = anom_df["timestamp"] >= now - timedelta(days=7)
 
-    # newest outlier (if any) – fall back to newest point
+def _fmt_number(value) -> str:
+    # Rule/LLM fields may be "n/a" instead of a number
     try:
-        recent = anom_df[anom_df["anomaly"] == -1].iloc[-1]
-    except IndexError:
-        recent = anom_df.iloc[-1]
-
-    # worst (most negative) score in the past 24 h
-    worst24 = (
-        anom_df[last_24h]
-        .sort_values("anomaly_score")
-        .iloc[0]
-        if (last_24h & (anom_df["anomaly"] == -1)).any()
-        else recent
+        return f"{float(value):.2f}"
+    except (TypeError, ValueError):
+        return "N/A"
+
+
+# Summary cards: (metric label, field) per analysis kind
+SUMMARY_METRICS = {
+    "trends": [("Severity", "severity"), ("Lead Time (days)", "lead_time_days"),
+               ("CPU at Breach (%)", "cpu_at_breach"), ("Confidence (%)", "confidence")],
+    "anomalies": [("Severity", "severity"), ("Total Anomalies (24h)", "total_anomalies_last_24"),
+                  ("Worst CPU (%)", "worst_cpu_pct_last_24h"), ("Confidence (%)", "confidence")],
+}
+NUMERIC_FIELDS = {"cpu_at_breach", "confidence", "worst_cpu_pct_last_24h"}
+
+
+def render_summary(slot, kind: str, data: dict):
+    """
+    (Re)draw one summary card into an st.empty() slot; fields that have not
+    streamed in yet show as "…".
+    """
+    if not data:
+        return
+    with slot.container():
+        cols = st.columns(4)
+        for col, (label, field) in zip(cols, SUMMARY_METRICS[kind]):
+            value = data.get(field)
+            if value is None:
+                value = "…"
+            elif field in NUMERIC_FIELDS:
+                value = _fmt_number(value)
+            col.metric(label, value)
+        st.info(data.get("summary", "…"))
+        with st.expander(f"Explanation and Recommendation"):
+            st.markdown(f"""
+            <div style="background: linear-gradient(90deg, #e0eafc 0%, #cfdef3 100%);
+                        border-radius: 12px; padding: 1.2em 1.5em; margin-bottom: 1em; box-shadow: 0 2px 8px rgba(0,0,0,0.04);">
+                <h4 style="color:#2b5876; margin-top:0;">Explanation</h4>
+                <p style="font-size:1.05em; color:#333;">{data.get("justification", "No explanation available.")}</p>
+                <h4 style="color:#2b5876; margin-bottom:0;">Recommendation</h4>
+                <p style="font-size:1.05em; color:#333;">{data.get("action", "No recommendation available.")}</p>
+            </div>
+            """, unsafe_allow_html=True)
+
+
+def zoom_range(key: str, ts: pd.Series):
+    """
+    Time-range slider over `ts`; returns (start, end) in the series' timezone.
+    Narrowing it redraws the chart with finer detail (see downsample.py).
+    """
+    tz = ts.dt.tz
+    lo, hi = (t.tz_convert(None) if tz else t for t in (ts.min(), ts.max()))
+    start, end = st.slider("Zoom", min_value=lo.to_pydatetime(), max_value=hi.to_pydatetime(),
+                           value=(lo.to_pydatetime(), hi.to_pydatetime()), format="YYYY-MM-DD HH:mm", key=key)
+    return tuple(pd.Timestamp(t, tz="UTC").tz_convert(tz) if tz else pd.Timestamp(t) for t in (start, end))
+
+
+# Charts are fragments: moving a zoom slider reruns only the chart, not the analysis
+@st.fragment
+def forecast_chart(result):
+    forecast_df = result.forecast_df
+    start, end = zoom_range(f"forecast_zoom_{result.data_hash}", forecast_df["ds"])
+    view = downsample(forecast_df, "ds", ["yhat", "trend"], start=start, end=end,
+                      keep=crossing_rows(forecast_df["ds"], result.first_hit))
+    st.caption(f"Forecasted CPU usage and trend ({len(view):,} of {len(forecast_df):,} points)")
+    st.line_chart(
+        view.set_index("ds")[["yhat", "trend"]],
+        use_container_width=True,
+        x_label="Timestamp",
+        y_label="CPU Usage (%)"
     )
 
-    anomaly_payload = {
-        # ── metadata ──────────────────────────────────────────────
-        "generated_at": now.isoformat(timespec="seconds"),
-        "anomaly_method": "isolation_forest",
-        "score_sign": "negative = outlier, positive = normal",
-        "score_hint": "≈0 borderline, ≤-0.30 strong anomaly",
-
-        # ── aggregate counts ─────────────────────────────────────
-        "total_anomalies_last_24h": int((last_24h & (anom_df["anomaly"] == -1)).sum()),
-        "total_anomalies_last_7d":  int((last_7d  & (anom_df["anomaly"] == -1)).sum()),
-
-        # ── most-recent anomaly (may be mild) ────────────────────
-        "most_recent_anomaly_time": recent["timestamp"].isoformat(),
-        "most_recent_cpu_pct":      float(np.round(recent["y"], 3)),
-        "most_recent_anomaly_score":float(np.round(recent["anomaly_score"], 4)),
-        "most_recent_severity":     _anom_severity(recent["anomaly_score"]),
-
-        # ── strongest anomaly in the last 24 h ───────────────────
-        "worst_anomaly_time_last_24h": worst24["timestamp"].isoformat(),
-        "worst_cpu_pct_last_24h":      float(np.round(worst24["y"], 3)),
-        "worst_anomaly_score_last_24h":float(np.round(worst24["anomaly_score"], 4)),
-        "worst_severity_last_24h":     _anom_severity(worst24["anomaly_score"]),
-    }
-
-    raw = call_ai(anomaly_prompt,{"anomaly_payload":anomaly_payload})
 
-    return parse_json_response(raw)
+@st.fragment
+def anomaly_chart(result):
+    import altair as alt
 
-def _anom_severity(score: float) -> str:
-    if score >= 0:         return "none"
-    if score > -0.05:      return "mild"
-    if score > -0.15:      return "moderate"
-    if score > -0.30:      return "high"
-    return "critical"
+    cpu_5 = result.anom_df
+    start, end = zoom_range(f"anomaly_zoom_{result.data_hash}", cpu_5["timestamp"])
+    view = downsample(cpu_5, "timestamp", "y", start=start, end=end, keep=cpu_5["anomaly"].to_numpy() == -1)
+    st.caption(f"Detected anomalies (red dots) in CPU usage ({len(view):,} of {len(cpu_5):,} points)")
+    base = alt.Chart(view).mark_line().encode(
+        x=alt.X('timestamp:T', title='Timestamp'),
+        y=alt.Y('y:Q', title='CPU Usage (%)'),
+        tooltip=['timestamp', 'y']
+    )
+    anom_points = alt.Chart(view[view['anomaly'] == -1]).mark_point(color='red', size=60).encode(
+        x=alt.X('timestamp:T', title='Timestamp'),
+        y=alt.Y('y:Q', title='CPU Usage (%)'),
+        tooltip=['timestamp', 'y', 'anomaly_score']
+    )
+    st.altair_chart((base + anom_points).properties(title="CPU Usage & Anomalies"), use_container_width=True)
 
 
 # ------------------
 # Streamlit UI
 # ------------------
-DATA_PATH = 'mock/zabbix_cpu_data.csv'
+DATA_PATH = os.getenv("DATA_PATH", 'mock/zabbix_cpu_data.csv')
 
 st.set_page_config(page_title="Predictive Monitoring Dashboard", layout="wide")
 st.title("📊 Predictive Monitoring using Zabbix Data")
+get_metrics_server()
 
 # Load data
 uploaded = st.sidebar.file_uploader("Upload Zabbix CSV", type=['csv'])
 if uploaded:
-    data = load_data(uploaded)
+    window = RollingWindow()
+    window.ingest(normalize_columns(pd.read_csv(uploaded)))
 else:
     st.sidebar.info(f"Using default mock data: {DATA_PATH}")
-    data = load_data(DATA_PATH)
+    window, source = get_stream(DATA_PATH)
+    window.poll(source)
 
 # Filter data for selected host and metric
 st.sidebar.markdown("### Select Host and Metric")
-host = st.sidebar.selectbox("Host", ["host-01"])
-metric = st.sidebar.selectbox("Metric", ["CPU Usage"])
+series = window.series()
+host = st.sidebar.selectbox("Host", sorted({h for h, _ in series}))
+metric = st.sidebar.selectbox("Metric", sorted({m for h, m in series if h == host}))
+data = window.frame(host, metric)
+engines = sorted(FORECASTERS)
+engine = st.sidebar.selectbox("Forecast engine", engines, index=engines.index(FORECAST_ENGINE),
+                              help="prophet: full model; seasonal: fast NumPy trend + seasonal profile")
 
 # Add analysis button
 run_analyze = st.sidebar.button("Analyze", use_container_width=True)
 
+cache_stats = get_response_cache().stats()
+st.sidebar.caption(
+    f"LLM cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, {cache_stats['entries']} entries"
+)
+prompt_stats = get_prompt_budget().stats()
+st.sidebar.caption(
+    f"Prompt size: last ~{prompt_stats['last_tokens']} / avg ~{prompt_stats['avg_tokens']} tokens "
+    f"(budget {prompt_stats['budget']})"
+)
+
+# Filled in at the end of the run, so it includes this run's measurements
+diagnostics_panel = st.sidebar.expander("Diagnostics")
+
 # Display data overview
 st.subheader("Latest Readings (last 5)")
 st.dataframe(
@@ -152,97 +213,128 @@ st.dataframe(
     }
 )
 
+# Newest saved prediction (kept current by src/scheduler.py); one indexed query, no model fits
+latest, _ = fetch_predictions_page(host=host, metric=metric, limit=1)
+st.subheader("Latest Prediction")
+if latest.empty:
+    st.caption("No prediction saved for this host/metric yet. Run the scheduler or press Analyze.")
+else:
+    row = latest.iloc[0]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Status", row["Status"])
+    col2.metric("Trend", row["Trend"])
+    col3.metric("Breach Time", row["Breach Time"])
+    col4.metric("Predicted Value (%)", _fmt_number(row["Predicted Value"]))
+    st.info(row["Message"])
+    st.caption(f"Saved {row['Created At']} UTC")
+
 # Only run analysis if button pressed
 trends = None
 anomalies = None
+thresholds = None
 if run_analyze:
+    result = get_analysis(frame_hash(data), host, metric, THRESHOLD, engine, data, window.rollup(host, metric))
+
     # Trend Analysis
     st.markdown("---")
     st.subheader("Trend Analysis")
     # --- Forecast chart ---
-    forecast_df, first_hit = forecast_trend(data, threshold=THRESHOLD)
-    st.caption("Forecasted CPU usage and trend")
-    st.line_chart(
-        forecast_df.set_index("ds")[["yhat", "trend"]],
-        use_container_width=True,
-        x_label="Timestamp",
-        y_label="CPU Usage (%)"
-    )
-    # --- Send to AI ---
-    with st.spinner("🤖 Analyzing trends via AI..."):
-        trends = analyze_trends(data)
-        st.markdown("### Trend Analysis Summary")
-        if trends:
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Severity", trends.get("severity", "N/A"))
-            col2.metric("Lead Time (days)", trends.get("lead_time_days", "N/A"))
-            col3.metric("CPU at Breach (%)", f"{float(trends.get('cpu_at_breach', 0)):.2f}")
-            col4.metric("Confidence (%)", f"{float(trends.get('confidence', 0)):.2f}")
-            st.info(trends.get("summary", ""))
-            with st.expander(f"Explanation and Recommendation"):
-                st.markdown(f"""
-                <div style="background: linear-gradient(90deg, #e0eafc 0%, #cfdef3 100%);
-                            border-radius: 12px; padding: 1.2em 1.5em; margin-bottom: 1em; box-shadow: 0 2px 8px rgba(0,0,0,0.04);">
-                    <h4 style="color:#2b5876; margin-top:0;">Explanation</h4>
-                    <p style="font-size:1.05em; color:#333;">{trends.get("justification", "No explanation available.")}</p>
-                    <h4 style="color:#2b5876; margin-bottom:0;">Recommendation</h4>
-                    <p style="font-size:1.05em; color:#333;">{trends.get("action", "No recommendation available.")}</p>
-                </div>
-                """, unsafe_allow_html=True)
-
+    forecast_chart(result)
+    # --- AI summary ---
+    st.markdown("### Trend Analysis Summary")
+    slots = {"trends": st.empty()}
 
     # Anomaly Detection
     st.markdown("---")
     st.subheader("Anomaly Detection")
     # --- Anomaly chart ---
-    cpu_5 = detect_anomalies_iso(data)
-    st.caption("Detected anomalies (red dots) in CPU usage")
-    base = alt.Chart(cpu_5).mark_line().encode(
-        x=alt.X('timestamp:T', title='Timestamp'),
-        y=alt.Y('y:Q', title='CPU Usage (%)'),
-        tooltip=['timestamp', 'y']
-    )
-    anom_points = alt.Chart(cpu_5[cpu_5['anomaly'] == -1]).mark_point(color='red', size=60).encode(
-        x=alt.X('timestamp:T', title='Timestamp'),
-        y=alt.Y('y:Q', title='CPU Usage (%)'),
-        tooltip=['timestamp', 'y', 'anomaly_score']
-    )
-    st.altair_chart((base + anom_points).properties(title="CPU Usage & Anomalies"), use_container_width=True)
-    # --- Send to AI ---
-    with st.spinner("🤖 Analyzing anomalies via AI..."):
-        anomalies = detect_anomalies(data)
-        st.markdown("### Anomaly Detection Summary")
-        if anomalies:
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Severity", anomalies.get("severity", "N/A"))
-            col2.metric("Total Anomalies (24h)", anomalies.get("total_anomalies_last_24", "N/A"))
-            col3.metric("Worst CPU (%)", f"{float(anomalies.get('worst_cpu_pct_last_24h', 0)):.2f}")
-            col4.metric("Confidence (%)", f"{float(anomalies.get('confidence', 0)):.2f}")
-            st.info(anomalies.get("summary", ""))
-            with st.expander(f"Explanation and Recommendation"):
-                st.markdown(f"""
-                <div style="background: linear-gradient(90deg, #e0eafc 0%, #cfdef3 100%);
-                            border-radius: 12px; padding: 1.2em 1.5em; margin-bottom: 1em; box-shadow: 0 2px 8px rgba(0,0,0,0.04);">
-                    <h4 style="color:#2b5876; margin-top:0;">Explanation</h4>
-                    <p style="font-size:1.05em; color:#333;">{anomalies.get("justification", "No explanation available.")}</p>
-                    <h4 style="color:#2b5876; margin-bottom:0;">Recommendation</h4>
-                    <p style="font-size:1.05em; color:#333;">{anomalies.get("action", "No recommendation available.")}</p>
-                </div>
-                """, unsafe_allow_html=True)
+    anomaly_chart(result)
+    # --- AI summary ---
+    st.markdown("### Anomaly Detection Summary")
+    slots["anomalies"] = st.empty()
+
+    # Both cards fill in as the (streamed) answers arrive
+    with st.spinner("🤖 Analyzing trends and anomalies via AI..."):
+        trends, anomalies = analyze_with_ai(result, show=lambda kind, data: render_summary(slots[kind], kind, data))
+
+    # Adaptive Thresholds (computed, no LLM)
+    st.markdown("---")
+    st.subheader("Adaptive Thresholds")
+    thresholds = series_thresholds(data, host, metric)
+    if thresholds:
+        alerts = thresholds["alerts"]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Business Hours (%)", thresholds["day"])
+        col2.metric("Off-Hours (%)", thresholds["night"])
+        col3.metric("Off-Hours Alert Reduction (%)", alerts["off_hours_reduction_pct"])
+        st.caption(f"q95 + 1σ of the last {alerts['window_hours']}h per period, capped at {HARD_LIMIT:.0f}%; "
+                   f"alerts backtested over the last {alerts['windows']} windows")
+        st.dataframe(
+            pd.DataFrame(
+                [[alerts["static"]["day"], alerts["static"]["night"]],
+                 [alerts["adaptive"]["day"], alerts["adaptive"]["night"]]],
+                index=[f"Static {HARD_LIMIT:.0f}%", "Adaptive"],
+                columns=["Business hours", "Off-hours"],
+            )
+        )
 
 # Insert AI results into prediction record
 if trends or anomalies:
     with st.spinner("💾 Saving prediction record to database..."):
-        prediction_record = ai_to_prediction_record(host, metric, {"trends": trends, "anomalies": anomalies})
+        prediction_record = ai_to_prediction_record(
+            host, metric, {"trends": trends, "anomalies": anomalies, "thresholds": thresholds}
+        )
         insert_prediction(prediction_record)
 
-# Display saved predictions as a table via fetch_predictions function
-saved_predictions = fetch_predictions()
-if not saved_predictions.empty:
-    st.markdown("---")
-    st.markdown("### Predictions History")
-    with st.expander("Show Predictions History", expanded=True):
+# Display saved predictions one page at a time (keyset pagination)
+HISTORY_PAGE_SIZE = 25
+st.session_state.setdefault("history_cursors", [None])
+
+def _reset_history_pages():
+    st.session_state.history_cursors = [None]
+
+st.markdown("---")
+st.markdown("### Predictions History")
+with st.expander("Show Predictions History", expanded=True):
+    f1, f2 = st.columns(2)
+    history_scope = f1.selectbox("Show", ["All hosts", f"{host} / {metric}"], key="history_scope",
+                                 on_change=_reset_history_pages)
+    history_status = f2.selectbox("Status", ["All", "alert", "normal"], key="history_status",
+                                  on_change=_reset_history_pages)
+    only_selected = history_scope != "All hosts"
+    saved_predictions, next_cursor = fetch_predictions_page(
+        host=host if only_selected else None,
+        metric=metric if only_selected else None,
+        status=None if history_status == "All" else history_status,
+        limit=HISTORY_PAGE_SIZE,
+        before=st.session_state.history_cursors[-1],
+    )
+    if saved_predictions.empty:
+        st.caption("No predictions saved yet.")
+    else:
         st.dataframe(saved_predictions, hide_index=True)
+    p1, p2, p3 = st.columns([1, 1, 4])
+    page_no = len(st.session_state.history_cursors)
+    p1.button("← Newer", disabled=page_no == 1, key="history_prev",
+              on_click=lambda: st.session_state.history_cursors.pop())
+    p2.button("Older →", disabled=next_cursor is None, key="history_next",
+              on_click=lambda: st.session_state.history_cursors.append(next_cursor))
+    p3.caption(f"Page {page_no}")
+
+# Timing histograms of this server process (same data as /metrics)
+with diagnostics_panel:
+    diagnostics = pd.DataFrame(REGISTRY.rows())
+    if diagnostics.empty:
+        st.caption("No measurements yet. Press Analyze.")
+    else:
+        st.dataframe(
+            diagnostics.fillna("").round(4),
+            hide_index=True,
+            column_config={"metric": "Metric", "stage": "Stage", "count": "Count",
+                           "mean": "Mean", "p50": "p50", "p95": "p95", "max": "Max"},
+        )
+        st.caption("Seconds, except *_tokens (tokens) and *_per_second (tokens/s). "
+                   "Ollama stats only cover answers read to the end.")
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,205 @@
+# src/batch.py
+# Headless fleet-wide analysis: one forecast + anomaly pass per host/metric,
+# fanned out over a process pool.  Run from cron with e.g.
+#   python src/batch.py --input data/fleet.csv --workers 8
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from analysis import build_anomaly_payload, build_trend_payload, run_analysis
+from db import insert_predictions_bulk
+from ingest import normalize_columns
+from metric_store import MetricStore
+from model_store import DetectorRegistry, ProphetStore
+from predictive import FORECASTERS
+from rules import triage
+from thresholds import suggested_thresholds, threshold_report
+from utils import ai_to_prediction_record, get_logger
+
+logger = get_logger(__name__)
+
+# Long-format input columns
+LONG_COLUMNS = ["host", "metric", "timestamp", "value"]
+
+DEFAULT_THRESHOLD = 63
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Prediction rows are written in one transaction per this many results
+FLUSH_EVERY = 100
+
+
+# --------------------------------------------------
+# 1) Grouping
+# --------------------------------------------------
+def split_groups(df: pd.DataFrame):
+    """
+    Split a long-format frame (host, metric, timestamp, value) into
+    per-series frames shaped like load_data() output.
+    Yields (host, metric, series_df).
+    """
+    missing = set(LONG_COLUMNS) - set(df.columns)
+    if missing:
+        raise ValueError(f"Input frame is missing columns: {sorted(missing)}")
+
+    for (host, metric), group in df.groupby(["host", "metric"], sort=False, observed=True):
+        series = (
+            group[["timestamp", "value"]]
+            .rename(columns={"value": "cpu_usage_percent"})
+            .sort_values("timestamp")
+            .reset_index(drop=True)
+        )
+        yield host, metric, series
+
+
+# --------------------------------------------------
+# 2) Worker
+# --------------------------------------------------
+def analyze_group(host: str, metric: str, series: pd.DataFrame, threshold: float,
+                  model_dir: str = None, window_days: int = None, engine: str = None) -> dict:
+    """
+    Runs in a worker process. Only the small payload dicts travel back
+    to the parent, never the full forecast frames.
+    """
+    try:
+        store = ProphetStore(model_dir, window_days=window_days)
+        registry = DetectorRegistry(model_dir)
+        result = run_analysis(series, host, metric, threshold,
+                              prophet_store=store, detector_registry=registry, engine=engine)
+        return {
+            "host": host,
+            "metric": metric,
+            "trend_payload": build_trend_payload(result),
+            "anomaly_payload": build_anomaly_payload(result),
+            "error": None,
+        }
+    except Exception as e:
+        return {"host": host, "metric": metric, "error": f"{type(e).__name__}: {e}"}
+
+
+def run_batch(df: pd.DataFrame, workers: int = DEFAULT_WORKERS, threshold: float = DEFAULT_THRESHOLD,
+              model_dir: str = None, window_days: int = None, engine: str = None):
+    """
+    Analyze every host/metric group in df on a process pool.
+    Yields each group's result as soon as it finishes.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(analyze_group, host, metric, series, threshold, model_dir, window_days, engine)
+            for host, metric, series in split_groups(df)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+# --------------------------------------------------
+# 3) Prediction Records
+# --------------------------------------------------
+def results_to_records(results: list, use_ai: bool = False, batched: bool = False, thresholds: dict = None) -> list:
+    """
+    Prediction records for finished groups. The rule engine settles most
+    of them; with use_ai, escalated cases go to the LLM, fanned out
+    concurrently (bounded by AI_CONCURRENCY). With batched, several hosts
+    share each prompt (see ai.analyze_fleet_batched). `thresholds` maps
+    (host, metric) to the computed suggested_threshold.
+    """
+    thresholds = thresholds or {}
+    triaged = [triage(r["trend_payload"], r["anomaly_payload"]) for r in results]
+    insights = [found for found, _ in triaged]
+
+    if use_ai:
+        escalated = [
+            (i, r["trend_payload"] if esc["trends"] else None, r["anomaly_payload"] if esc["anomalies"] else None)
+            for i, (r, (_, esc)) in enumerate(zip(results, triaged))
+            if any(esc.values())
+        ]
+        if escalated and batched:
+            from ai import analyze_fleet_batched
+
+            items = [(f"{results[i]['host']}/{results[i]['metric']}", trend, anomaly) for i, trend, anomaly in escalated]
+            for (i, _, _), (trends, anomalies) in zip(escalated, analyze_fleet_batched(items)):
+                # a failed answer ({}) keeps the rule result
+                if trends:
+                    insights[i]["trends"] = trends
+                if anomalies:
+                    insights[i]["anomalies"] = anomalies
+        elif escalated:
+            # Imported lazily so rule-only runs never touch the LLM client
+            from ai import analyze_fleet
+            from utils import parse_json_response
+
+            raw = analyze_fleet([(trend, anomaly) for _, trend, anomaly in escalated])
+            for (i, _, _), (raw_trend, raw_anomaly) in zip(escalated, raw):
+                # a failed or unparseable answer ("" -> {}) keeps the rule result
+                trends = parse_json_response(raw_trend) if raw_trend is not None else None
+                anomalies = parse_json_response(raw_anomaly) if raw_anomaly is not None else None
+                if trends:
+                    insights[i]["trends"] = trends
+                if anomalies:
+                    insights[i]["anomalies"] = anomalies
+        if escalated:
+            logger.info(f"{len(escalated)} of {len(results)} results escalated to the LLM")
+
+    return [
+        ai_to_prediction_record(r["host"], r["metric"],
+                                {**data, "thresholds": thresholds.get((r["host"], r["metric"]))})
+        for r, data in zip(results, insights)
+    ]
+
+
+# --------------------------------------------------
+# 4) CLI
+# --------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch trend + anomaly analysis for many hosts/metrics.")
+    parser.add_argument("--input", required=True,
+                        help="CSV (host, metric, timestamp, value; Zabbix/generator column names and a "
+                             "missing host/metric column are accepted) or a Parquet metric store directory")
+    parser.add_argument("--hosts", nargs="+", default=None, help="Only analyze these hosts (metric store input)")
+    parser.add_argument("--start", default=None, help="Only read history from this time on (metric store input)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Process pool size")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Critical value for breach forecast")
+    parser.add_argument("--model-dir", default=None, help="Where warm-start and detector model state is kept")
+    parser.add_argument("--window-days", type=int, default=None, help="Rolling forecast history window (0 = all)")
+    parser.add_argument("--engine", choices=sorted(FORECASTERS), default=None,
+                        help="Forecast engine (default: FORECAST_ENGINE env, prophet)")
+    parser.add_argument("--ai", action="store_true", help="Send ambiguous or severe results to the LLM before saving")
+    parser.add_argument("--ai-batch", action="store_true", help="With --ai, pack several hosts into each LLM prompt")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.input):
+        df = MetricStore(args.input).read(hosts=args.hosts, start=args.start)
+    else:
+        # same schema mapping as the dashboard: Zabbix/generator column names, default host/metric
+        df = normalize_columns(pd.read_csv(args.input))
+    logger.info(f"Loaded {len(df):,} rows, {df.groupby(['host', 'metric']).ngroups} series")
+
+    # Adaptive day/night thresholds for the whole fleet in one pass
+    thresholds = suggested_thresholds(threshold_report(df))
+
+    done, failed = 0, 0
+    pending = []
+    for result in run_batch(df, workers=args.workers, threshold=args.threshold,
+                            model_dir=args.model_dir, window_days=args.window_days, engine=args.engine):
+        if result["error"]:
+            failed += 1
+            logger.error(f"{result['host']}/{result['metric']} failed: {result['error']}")
+            continue
+        pending.append(result)
+        done += 1
+        logger.info(f"{result['host']}/{result['metric']} done ({done + failed} finished)")
+        if len(pending) >= FLUSH_EVERY:
+            insert_predictions_bulk(results_to_records(pending, use_ai=args.ai, batched=args.ai_batch,
+                                                       thresholds=thresholds))
+            pending.clear()
+    insert_predictions_bulk(results_to_records(pending, use_ai=args.ai, batched=args.ai_batch,
+                                               thresholds=thresholds))
+
+    logger.info(f"Batch complete: {done} saved, {failed} failed")
+    return 1 if failed and not done else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
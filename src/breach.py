@@ -0,0 +1,170 @@
+# src/breach.py
+# Vectorized threshold-breach search and forecast summaries.
+#
+# Forecasts are stacked into (series, time) arrays; stack_forecasts pads
+# shorter histories at the front with NaT/NaN so every row ends at its own
+# horizon. breach_summary then finds the first crossing for every series x
+# threshold, plus the statistics the trend payload needs, with a handful of
+# array operations instead of repeated DataFrame filters.
+#
+# Thresholds may differ by time of day: with `night_thresholds`, hours inside
+# BUSINESS_HOURS use the day value and all others the night value (the same
+# day/night split as suggested_threshold in prediction records).
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Local business hours [start, end) used for day/night thresholds
+BUSINESS_HOURS = (9, 18)
+# Business-hours timezone; unset means timestamps are already local time
+BUSINESS_TZ = os.getenv("BUSINESS_TZ") or None
+# Forecast points (hours) summarized by the "next 24h" median
+HORIZON_24H = 24
+
+
+def stack_forecasts(frames: list):
+    """
+    (ds, yhat, trend) arrays of shape (series, time) from forecast frames.
+    """
+    width = max(len(f) for f in frames)
+    ds = np.full((len(frames), width), np.datetime64("NaT"), dtype="datetime64[ns]")
+    yhat = np.full((len(frames), width), np.nan)
+    trend = np.full((len(frames), width), np.nan)
+    for i, f in enumerate(frames):
+        ds[i, width - len(f):] = f["ds"].to_numpy(dtype="datetime64[ns]")
+        yhat[i, width - len(f):] = f["yhat"].to_numpy(dtype=np.float64)
+        trend[i, width - len(f):] = f["trend"].to_numpy(dtype=np.float64)
+    return ds, yhat, trend
+
+
+def day_mask(ds, business_hours=BUSINESS_HOURS, tz: str = None) -> np.ndarray:
+    """
+    True where a timestamp falls in business hours. Timezone-aware
+    timestamps (a pandas Series/Index) are converted to `tz`, or keep their
+    own zone without it; naive ones are taken as UTC when `tz` is given and
+    as local time otherwise.
+    """
+    if isinstance(ds, (pd.Series, pd.Index)):
+        flat = pd.DatetimeIndex(ds)
+    else:
+        flat = pd.DatetimeIndex(np.asarray(ds, dtype="datetime64[ns]").ravel())
+    if tz is not None:
+        flat = (flat if flat.tz is not None else flat.tz_localize("UTC")).tz_convert(tz)
+    hour = np.asarray(flat.hour, dtype=float)   # NaN for NaT
+    start, end = business_hours
+    return ((hour >= start) & (hour < end)).reshape(np.shape(ds))
+
+
+def _as_thresholds(values, n_series: int) -> np.ndarray:
+    # scalar -> (S, 1); 1-D of K values -> same K thresholds for every series; 2-D -> (S, K)
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 0:
+        values = values.reshape(1, 1)
+    elif values.ndim == 1:
+        values = values[None, :]
+    return np.broadcast_to(values, (n_series, values.shape[1]))
+
+
+def breach_summary(ds, yhat, trend, cutoff, thresholds, night_thresholds=None,
+                   business_hours=BUSINESS_HOURS, tz: str = None) -> dict:
+    """
+    Breach search and summary for S series over a T-point horizon.
+
+    ds: (T,) or (S, T) datetime64; yhat/trend: (S, T) or (T,) for one series.
+    cutoff: last observed timestamp, scalar or (S,); only ds > cutoff is searched.
+    thresholds: scalar, (K,) shared by all series, or (S, K); night_thresholds
+    the same shape, applied outside business hours.
+
+    Returns a dict of arrays:
+      first_breach_idx (S, K), -1 when there is no breach
+      first_breach_ts (S, K), NaT when there is no breach
+      value_at_breach (S, K), NaN when there is no breach
+      peak, median_24h, end_value, growth_per_day (S,)
+    """
+    yhat = np.atleast_2d(np.asarray(yhat, dtype=np.float64))
+    trend = np.atleast_2d(np.asarray(trend, dtype=np.float64))
+    n_series, width = yhat.shape
+    ds = np.broadcast_to(np.asarray(ds, dtype="datetime64[ns]"), (n_series, width))
+    cutoff = np.asarray(cutoff, dtype="datetime64[ns]").reshape(-1, 1)
+    future = ds > cutoff                                          # NaT compares False
+
+    day = _as_thresholds(thresholds, n_series)
+    if night_thresholds is None:
+        limit = day[:, :, None]
+    else:
+        night = _as_thresholds(night_thresholds, n_series)
+        limit = np.where(day_mask(ds, business_hours, tz)[:, None, :], day[:, :, None], night[:, :, None])
+
+    # first crossing per series x threshold
+    crossed = future[:, None, :] & (yhat[:, None, :] >= limit)
+    has_breach = crossed.any(axis=2)
+    first = np.where(has_breach, crossed.argmax(axis=2), -1)
+    safe = np.maximum(first, 0)
+    rows = np.arange(n_series)[:, None]
+    first_ts = np.where(has_breach, ds[rows, safe], np.datetime64("NaT"))
+    at_breach = np.where(has_breach, yhat[rows, safe], np.nan)
+
+    # future statistics
+    future_yhat = np.where(future, yhat, np.nan)
+    has_future = future.any(axis=1)
+    start = future.argmax(axis=1)
+    window = start[:, None] + np.arange(HORIZON_24H)
+    in_range = (window < width) & has_future[:, None]
+    next_24h = np.where(in_range, yhat[rows, np.minimum(window, width - 1)], np.nan)
+
+    # trend growth per day between the first and last valid points
+    valid = ~np.isnan(trend) & ~np.isnat(ds)
+    first_valid = valid.argmax(axis=1)
+    last_valid = width - 1 - valid[:, ::-1].argmax(axis=1)
+    span_days = (ds[rows[:, 0], last_valid] - ds[rows[:, 0], first_valid]) / np.timedelta64(1, "D")
+    rise = trend[rows[:, 0], last_valid] - trend[rows[:, 0], first_valid]
+
+    with warnings.catch_warnings():
+        # all-NaN rows (series without a future part) and zero spans
+        warnings.simplefilter("ignore", RuntimeWarning)
+        peak = np.nanmax(future_yhat, axis=1)
+        median_24h = np.nanmedian(next_24h, axis=1)
+        growth = np.where(span_days > 0, rise / span_days, 0.0)
+
+    return {
+        "first_breach_idx": first,
+        "first_breach_ts": first_ts,
+        "value_at_breach": at_breach,
+        "peak": peak,
+        "median_24h": median_24h,
+        "end_value": yhat[:, -1],
+        "growth_per_day": growth,
+    }
+
+
+def summarize_forecast(forecast_df: pd.DataFrame, cutoff, threshold, night_threshold=None, tz: str = None) -> dict:
+    """
+    breach_summary() for one forecast frame and one threshold, as scalars
+    (first_breach_ts is a pd.Timestamp or None).
+    """
+    cutoff = pd.Timestamp(cutoff)
+    if cutoff.tz is not None:
+        cutoff = cutoff.tz_convert("UTC").tz_localize(None)
+    summary = breach_summary(
+        forecast_df["ds"].to_numpy(dtype="datetime64[ns]"),
+        forecast_df["yhat"].to_numpy(),
+        forecast_df["trend"].to_numpy(),
+        cutoff.to_datetime64(),
+        threshold,
+        night_threshold,
+        tz=tz,
+    )
+    first_ts = summary["first_breach_ts"][0, 0]
+    return {
+        "first_breach_idx": int(summary["first_breach_idx"][0, 0]),
+        "first_breach_ts": None if np.isnat(first_ts) else pd.Timestamp(first_ts),
+        "value_at_breach": float(summary["value_at_breach"][0, 0]),
+        "peak": float(summary["peak"][0]),
+        "median_24h": float(summary["median_24h"][0]),
+        "end_value": float(summary["end_value"][0]),
+        "growth_per_day": float(summary["growth_per_day"][0]),
+    }
+
@@ -1,9 +1,15 @@
 # src/db.py
 
 import os
+import atexit
 import sqlite3
+import threading
+from functools import lru_cache
+
 import pandas as pd
 
+from instrumentation import timed
+
 
 # Prediction table columns
 prediction_columns = {
@@ -23,34 +29,179 @@ prediction_columns = {
     "created_at": "Created At"
 }
 
-# Get the absolute path to the database file
-db_path = os.path.join(os.path.dirname(__file__), 'db', 'predictions.db')
+# Get the absolute path to the database file (PREDICTIONS_DB overrides it)
+db_path = os.getenv("PREDICTIONS_DB", os.path.join(os.path.dirname(__file__), 'db', 'predictions.db'))
+
+
+# Schema migrations, applied in order; PRAGMA user_version records how many ran.
+# Keep in sync with init-db.sh.
+MIGRATIONS = [
+    # 1: predictions table
+    """
+    CREATE TABLE IF NOT EXISTS predictions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        host TEXT,
+        metric TEXT,
+        status TEXT,
+        message TEXT,
+        trend TEXT,
+        breach_time TEXT,
+        predicted_value REAL,
+        anomaly_detected INTEGER,
+        explanation TEXT,
+        recommendation TEXT,
+        suggested_threshold TEXT,
+        metadata TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    # 2: indexes for filtered, keyset-paginated history queries
+    """
+    CREATE INDEX IF NOT EXISTS idx_predictions_host_metric_created ON predictions (host, metric, created_at);
+    CREATE INDEX IF NOT EXISTS idx_predictions_status ON predictions (status, created_at);
+    CREATE INDEX IF NOT EXISTS idx_predictions_created ON predictions (created_at);
+    """,
+]
+
+# Connection settings applied once per connection
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",       # readers don't block the writer
+    "PRAGMA synchronous=NORMAL",     # fsync at checkpoints only (safe with WAL)
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",      # ~16 MB page cache
+    "PRAGMA busy_timeout=5000",
+]
+
+# One persistent connection for the whole process, shared by every thread
+# (Streamlit runs each rerun on a new thread); _lock serializes its use.
+_conn = None
+_conn_path = None
+_lock = threading.RLock()
+
+
+# Function to get the process-wide persistent, tuned connection.
+# Hold _lock while using it from code that may run on several threads.
+def get_connection() -> sqlite3.Connection:
+    global _conn, _conn_path
+    with _lock:
+        if _conn is None or _conn_path != db_path:
+            close_connections()
+            conn = sqlite3.connect(db_path, timeout=5.0, cached_statements=256, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            init_db(conn)
+            _conn, _conn_path = conn, db_path
+        return _conn
+
+
+# Function to bring the schema up to date (idempotent)
+def init_db(conn: sqlite3.Connection):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.executescript(script)
+        conn.execute(f"PRAGMA user_version = {number}")
+
+
+# Function to close the shared connection (reopened on the next use)
+@atexit.register
+def close_connections():
+    global _conn, _conn_path
+    with _lock:
+        if _conn is not None:
+            try:
+                _conn.close()
+            except sqlite3.Error:
+                pass
+        _conn, _conn_path = None, None
+
+
+# Same column list -> same SQL string, so sqlite3's per-connection
+# statement cache reuses the prepared statement
+@lru_cache(maxsize=32)
+def _insert_sql(keys: tuple) -> str:
+    return f"INSERT INTO predictions ({', '.join(keys)}) VALUES ({', '.join(['?'] * len(keys))})"
 
 
 # Function to insert a new prediction using a parsed dictionary
+@timed("db_write")
 def insert_prediction(parsed_prediction: dict):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
     # Extract additional fields from parsed_prediction dict
-    keys = parsed_prediction.keys()
-    values = parsed_prediction.values()
-    sql = f"INSERT INTO predictions ({', '.join(keys)}) VALUES ({', '.join(['?'] * len(values))})"
-    c.execute(sql, tuple(values))
-    prediction_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    return prediction_id
+    keys = tuple(parsed_prediction.keys())
+    with _lock:
+        conn = get_connection()
+        with conn:
+            c = conn.execute(_insert_sql(keys), tuple(parsed_prediction.values()))
+        return c.lastrowid
+
+# Function to insert many predictions in a single transaction
+@timed("db_write")
+def insert_predictions_bulk(parsed_predictions: list) -> int:
+    if not parsed_predictions:
+        return 0
+    # Group by column set so each group is one executemany on one prepared statement
+    groups = {}
+    for record in parsed_predictions:
+        groups.setdefault(tuple(record.keys()), []).append(tuple(record.values()))
+    with _lock:
+        conn = get_connection()
+        with conn:
+            for keys, rows in groups.items():
+                conn.executemany(_insert_sql(keys), rows)
+    return len(parsed_predictions)
 
 # Function to fetch all stored predictions
 def fetch_predictions():
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
     # Get columns in correct order
     col_names = list(prediction_columns.keys())
     sql = f"SELECT {', '.join(col_names)} FROM predictions ORDER BY created_at DESC"
-    c.execute(sql)
-    rows = c.fetchall()
-    conn.close()
+    with _lock:
+        rows = get_connection().execute(sql).fetchall()
     df = pd.DataFrame(rows, columns=[prediction_columns[k] for k in col_names])
     return df
 
+# Function to fetch one page of predictions, newest first.
+# Keyset pagination: pass the returned cursor as `before` to get the next page.
+def fetch_predictions_page(host: str = None, metric: str = None, status: str = None,
+                           start=None, end=None, limit: int = 50, before: tuple = None):
+    conditions, params = [], []
+    if host is not None:
+        conditions.append("host = ?")
+        params.append(host)
+    if metric is not None:
+        conditions.append("metric = ?")
+        params.append(metric)
+    if status is not None:
+        conditions.append("status = ?")
+        params.append(status)
+    if start is not None:
+        conditions.append("created_at >= ?")
+        params.append(_sql_time(start))
+    if end is not None:
+        conditions.append("created_at <= ?")
+        params.append(_sql_time(end))
+    if before is not None:
+        conditions.append("(created_at < ? OR (created_at = ? AND id < ?))")
+        params.extend([before[0], before[0], before[1]])
+
+    col_names = list(prediction_columns.keys())
+    sql = f"SELECT {', '.join(col_names)} FROM predictions"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    params.append(limit + 1)  # one extra row tells us whether another page exists
+
+    with _lock:
+        rows = get_connection().execute(sql, params).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    # cursor = (created_at, id) of the last row on this page
+    next_cursor = (rows[-1][-1], rows[-1][0]) if has_more else None
+    df = pd.DataFrame(rows, columns=[prediction_columns[k] for k in col_names])
+    return df, next_cursor
+
+# created_at is stored as SQLite CURRENT_TIMESTAMP text (UTC, 'YYYY-MM-DD HH:MM:SS')
+def _sql_time(value) -> str:
+    ts = pd.Timestamp(value)
+    if ts.tz is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.strftime("%Y-%m-%d %H:%M:%S")
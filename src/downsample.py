@@ -0,0 +1,84 @@
+# src/downsample.py
+# Level-of-detail (LOD) downsampling for charts.
+#
+# A year of 5-min samples is ~105k points, but a chart is only ~1-2k pixels
+# wide. min_max_indices splits the visible time range into equal-width buckets
+# and keeps the lowest and highest point of each (plus the first and last), so
+# spikes and dips survive where averaging would flatten them. downsample()
+# applies that per column to the rows inside a [start, end] zoom range and
+# always keeps rows flagged in `keep` (anomalies, the breach crossing).
+# Zooming in narrows the range: the same point budget then covers a shorter
+# window, down to the raw samples, so payload size stays flat as history grows.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Points per chart line (one min and one max per bucket): about 2x a wide chart's pixel width
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", 2000))
+
+
+def min_max_indices(x: np.ndarray, y: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    Sorted positions of the min and max of `y` in each of `buckets`
+    equal-width ranges of `x` (numeric, ascending), plus the first and last
+    point. NaN values are skipped; with few points all valid ones are returned.
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= 2 * buckets:
+        return valid
+    xv = np.asarray(x, dtype=np.float64)[valid]
+    yv = y[valid]
+    span = (xv[-1] - xv[0]) or 1.0
+    bucket = np.minimum(((xv - xv[0]) / span * buckets).astype(np.int64), buckets - 1)
+    # x is sorted, so each bucket is a contiguous run: reduce per run, no sort needed
+    starts = np.r_[0, np.flatnonzero(np.diff(bucket)) + 1]
+    counts = np.diff(np.r_[starts, len(yv)])
+    picks = [[0, len(yv) - 1]]
+    for reduce in (np.minimum, np.maximum):
+        hits = np.flatnonzero(yv == np.repeat(reduce.reduceat(yv, starts), counts))
+        # first hit per bucket (ties keep the earliest point)
+        picks.append(hits[np.r_[True, np.diff(bucket[hits]) > 0]])
+    return valid[np.unique(np.concatenate(picks))]
+
+
+def crossing_rows(ds: pd.Series, at) -> np.ndarray:
+    """
+    Boolean mask of the row at timestamp `at` and the row before it, i.e.
+    the segment where a forecast crosses its threshold (all False if `at` is None).
+    """
+    mask = np.zeros(len(ds), dtype=bool)
+    if at is None or pd.isna(at):
+        return mask
+    hit = np.flatnonzero((ds == at).to_numpy())
+    if len(hit):
+        mask[max(hit[0] - 1, 0):hit[0] + 1] = True
+    return mask
+
+
+def downsample(df: pd.DataFrame, x: str, y, max_points: int = None, keep=None,
+               start=None, end=None) -> pd.DataFrame:
+    """
+    Rows of `df` (sorted by the datetime column `x`) to draw for the
+    [start, end] range (None = open ended): at most about `max_points` per
+    column in `y` (a column name or list), plus every in-range row where the
+    boolean array `keep` is True. Rows keep their original order.
+    """
+    max_points = max_points or CHART_MAX_POINTS
+    columns = [y] if isinstance(y, str) else list(y)
+    ts = pd.DatetimeIndex(df[x])
+    in_range = np.ones(len(df), dtype=bool)
+    if start is not None:
+        in_range &= ts >= start
+    if end is not None:
+        in_range &= ts <= end
+    rows = np.flatnonzero(in_range)
+
+    buckets = max(1, max_points // (2 * len(columns)))
+    x_ns = ts.asi8[rows]
+    picks = [min_max_indices(x_ns, df[col].to_numpy(dtype=np.float64)[rows], buckets) for col in columns]
+    selected = rows[np.unique(np.concatenate(picks))]
+    if keep is not None:
+        selected = np.union1d(selected, np.flatnonzero(np.asarray(keep, dtype=bool) & in_range))
+    return df.iloc[selected]
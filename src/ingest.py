@@ -0,0 +1,321 @@
+# src/ingest.py
+# Streaming ingestion of Zabbix samples into a bounded, rolling in-memory window.
+#
+# Sources yield normalized chunks (host, metric, timestamp, value); RollingWindow
+# keeps a fixed-size ring buffer per host/metric so memory stays bounded no
+# matter how long the history grows, plus that window's 5-min/hourly/daily
+# rollups (rollups.py), updated as each chunk arrives.
+
+import io
+import json
+import os
+import urllib.parse
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from rollups import SeriesRollup
+
+# Default series identity for single-series inputs (matches the app's selectors)
+DEFAULT_HOST = "host-01"
+DEFAULT_METRIC = "CPU Usage"
+
+# Default ring size: 90 days of 5-min samples per host/metric
+WINDOW_POINTS = int(os.getenv("WINDOW_POINTS", 90 * 288))
+
+# Schema mapping: canonical column -> accepted source column names
+COLUMN_ALIASES = {
+    "host": ["host", "Host", "hostname"],
+    "metric": ["metric", "Metric", "key_", "item"],
+    "timestamp": ["timestamp", "Timestamp", "clock", "ts", "time"],
+    "value": ["value", "cpu_usage_percent", "CPU", "CPU Usage", "cpu_pct"],
+}
+
+
+# --------------------------------------------------
+# 1) Schema normalization
+# --------------------------------------------------
+def normalize_columns(df: pd.DataFrame, host: str = DEFAULT_HOST, metric: str = DEFAULT_METRIC) -> pd.DataFrame:
+    """
+    Map source columns onto host / metric / timestamp / value.
+    Missing host/metric columns are filled with the given defaults.
+    Epoch-second timestamps (Zabbix 'clock') are converted to datetimes.
+    """
+    renames = {}
+    for canonical, aliases in COLUMN_ALIASES.items():
+        found = next((c for c in aliases if c in df.columns), None)
+        if found is not None:
+            renames[found] = canonical
+    df = df.rename(columns=renames)
+
+    missing = {"timestamp", "value"} - set(df.columns)
+    if missing:
+        raise ValueError(f"Cannot map columns {list(df.columns)} onto {sorted(missing)}")
+
+    if "host" not in df.columns:
+        df["host"] = host
+    if "metric" not in df.columns:
+        df["metric"] = metric
+
+    ts = df["timestamp"]
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        numeric = pd.to_numeric(ts, errors="coerce")
+        ts = pd.to_datetime(numeric, unit="s") if numeric.notna().all() else pd.to_datetime(ts)
+    df["timestamp"] = ts
+    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+    return df[["host", "metric", "timestamp", "value"]]
+
+
+# --------------------------------------------------
+# 2) Ring buffer + rolling window
+# --------------------------------------------------
+class RingBuffer:
+    """
+    Fixed-capacity (timestamp, value) buffer; the oldest samples are
+    overwritten once it is full.
+    """
+
+    def __init__(self, capacity: int = WINDOW_POINTS):
+        self.capacity = capacity
+        self.ts = np.empty(capacity, dtype="datetime64[ns]")
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.head = 0   # next write position
+        self.size = 0
+
+    def extend(self, ts, values):
+        ts = np.asarray(ts, dtype="datetime64[ns]")[-self.capacity:]
+        values = np.asarray(values, dtype=np.float64)[-self.capacity:]
+        n = len(ts)
+        idx = (self.head + np.arange(n)) % self.capacity
+        self.ts[idx] = ts
+        self.values[idx] = values
+        self.head = (self.head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def arrays(self):
+        """
+        Returns (ts, values) in insertion order, oldest first.
+        """
+        if self.size < self.capacity:
+            return self.ts[:self.size], self.values[:self.size]
+        order = np.r_[self.head:self.capacity, 0:self.head]
+        return self.ts[order], self.values[order]
+
+
+class RollingWindow:
+    """
+    One RingBuffer per host/metric, fed with normalized chunks, and the
+    rollups of each buffer's samples.
+    """
+
+    def __init__(self, capacity: int = WINDOW_POINTS):
+        self.capacity = capacity
+        self.buffers = {}
+        self.rollups = {}   # (host, metric) -> SeriesRollup
+
+    def ingest(self, chunk: pd.DataFrame) -> int:
+        """
+        Append a normalized chunk (host, metric, timestamp, value).
+        Returns the number of samples ingested.
+        """
+        chunk = chunk.dropna(subset=["timestamp", "value"]).sort_values("timestamp", kind="stable")
+        for (host, metric), group in chunk.groupby(["host", "metric"], sort=False):
+            buf = self.buffers.get((host, metric))
+            if buf is None:
+                buf = self.buffers[(host, metric)] = RingBuffer(self.capacity)
+            buf.extend(group["timestamp"].values, group["value"].values)
+            self._update_rollups(host, metric, buf, group["timestamp"].iloc[0])
+        return len(chunk)
+
+    def _update_rollups(self, host: str, metric: str, buf: RingBuffer, since):
+        # rebuild the buckets touched by samples from `since` on, then drop
+        # the ones older than what the ring still holds; samples go in time
+        # order (like frame()) so the means match resampling the window exactly
+        ts, values = buf.arrays()
+        if len(ts) > 1 and (ts[1:] < ts[:-1]).any():
+            order = np.argsort(ts, kind="stable")
+            ts, values = ts[order], values[order]
+        rollups = self.rollups.get((host, metric))
+        if rollups is None:
+            rollups = self.rollups[(host, metric)] = SeriesRollup()
+        rollups.update(ts, values, since)
+        rollups.trim(ts, values)
+
+    def series(self):
+        return sorted(self.buffers)
+
+    def frame(self, host: str, metric: str) -> pd.DataFrame:
+        """
+        The window for one series, shaped like load_data() output.
+        """
+        buf = self.buffers.get((host, metric))
+        if buf is None:
+            return pd.DataFrame({"timestamp": pd.Series(dtype="datetime64[ns]"),
+                                 "cpu_usage_percent": pd.Series(dtype=float)})
+        ts, values = buf.arrays()
+        order = np.argsort(ts, kind="stable")
+        return pd.DataFrame({"timestamp": ts[order], "cpu_usage_percent": values[order]})
+
+    def rollup(self, host: str, metric: str, resolutions=None) -> dict:
+        """
+        {resolution: series rollup frame} of the window for one series ({} if unknown).
+        """
+        rollups = self.rollups.get((host, metric))
+        return rollups.frames(resolutions) if rollups is not None else {}
+
+    def long_frame(self) -> pd.DataFrame:
+        """
+        All series in long format (host, metric, timestamp, value), for batch analysis.
+        """
+        frames = []
+        for host, metric in self.series():
+            df = self.frame(host, metric).rename(columns={"cpu_usage_percent": "value"})
+            df.insert(0, "metric", metric)
+            df.insert(0, "host", host)
+            frames.append(df)
+        if not frames:
+            return pd.DataFrame(columns=["host", "metric", "timestamp", "value"])
+        return pd.concat(frames, ignore_index=True)
+
+    def poll(self, source) -> int:
+        """
+        Drain every chunk a source currently has into the window.
+        """
+        total = 0
+        for chunk in source.read_chunks():
+            total += self.ingest(chunk)
+        return total
+
+
+# --------------------------------------------------
+# 3) Sources
+# --------------------------------------------------
+class CsvTailSource:
+    """
+    Tails a growing CSV file: each poll only parses bytes appended since the
+    previous one, in blocks of roughly `block_bytes`.
+    """
+
+    def __init__(self, path: str, block_bytes: int = 4 << 20, host: str = DEFAULT_HOST, metric: str = DEFAULT_METRIC):
+        self.path = path
+        self.block_bytes = block_bytes
+        self.host = host
+        self.metric = metric
+        self.offset = 0
+        self.header = None
+
+    def read_chunks(self):
+        with open(self.path, "rb") as f:
+            if self.header is None:
+                header = f.readline()
+                if not header.endswith(b"\n"):
+                    return
+                self.header = header
+                self.offset = f.tell()
+            f.seek(self.offset)
+            while True:
+                block = f.read(self.block_bytes)
+                # Only consume complete lines; a partially written last line waits for the next poll
+                end = block.rfind(b"\n") + 1
+                if end == 0:
+                    return
+                self.offset += end
+                f.seek(self.offset)
+                chunk = pd.read_csv(io.BytesIO(self.header + block[:end]))
+                yield normalize_columns(chunk, self.host, self.metric)
+
+
+class ZabbixJsonSource:
+    """
+    Reads a Zabbix `history.get` JSON export ({"result": [{itemid, clock, value, ns}, ...]}).
+    `items` maps itemid -> (host, metric); unknown items use the defaults.
+    """
+
+    def __init__(self, path: str, items: dict = None, chunksize: int = 50_000,
+                 host: str = DEFAULT_HOST, metric: str = DEFAULT_METRIC):
+        self.path = path
+        self.items = items or {}
+        self.chunksize = chunksize
+        self.host = host
+        self.metric = metric
+        self.done = False
+
+    def _rows(self):
+        with open(self.path) as f:
+            return json.load(f).get("result", [])
+
+    def read_chunks(self):
+        if self.done:
+            return
+        self.done = True
+        yield from history_to_chunks(self._rows(), self.items, self.chunksize, self.host, self.metric)
+
+
+class HttpHistorySource:
+    """
+    Polls a Zabbix-compatible JSON-RPC endpoint (or a local stand-in server)
+    with `history.get`, asking only for samples newer than the last one seen.
+    """
+
+    def __init__(self, url: str, itemids: list, items: dict = None, history_type: int = 0,
+                 auth: str = None, chunksize: int = 50_000, timeout: float = 10.0):
+        self.url = url
+        self.itemids = itemids
+        self.items = items or {}
+        self.history_type = history_type
+        self.auth = auth
+        self.chunksize = chunksize
+        self.timeout = timeout
+        self.time_from = None
+
+    def _request(self) -> list:
+        params = {
+            "output": "extend",
+            "history": self.history_type,
+            "itemids": self.itemids,
+            "sortfield": "clock",
+            "sortorder": "ASC",
+        }
+        if self.time_from is not None:
+            params["time_from"] = self.time_from
+        body = {"jsonrpc": "2.0", "method": "history.get", "params": params, "id": 1}
+        if self.auth:
+            body["auth"] = self.auth
+        req = urllib.request.Request(
+            self.url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json-rpc"}
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return json.load(resp).get("result", [])
+
+    def read_chunks(self):
+        rows = self._request()
+        if not rows:
+            return
+        self.time_from = max(int(r["clock"]) for r in rows) + 1
+        yield from history_to_chunks(rows, self.items, self.chunksize)
+
+
+def history_to_chunks(rows: list, items: dict, chunksize: int,
+                      host: str = DEFAULT_HOST, metric: str = DEFAULT_METRIC):
+    """
+    Turn history.get result rows into normalized chunks.
+    """
+    for start in range(0, len(rows), chunksize):
+        df = pd.DataFrame(rows[start:start + chunksize])
+        ids = df["itemid"].astype(str)
+        df["host"] = ids.map(lambda i: items.get(i, (host, metric))[0])
+        df["metric"] = ids.map(lambda i: items.get(i, (host, metric))[1])
+        yield normalize_columns(df[["host", "metric", "clock", "value"]])
+
+
+def open_source(path_or_url: str, **kwargs):
+    """
+    Pick a source from the location: http(s) URL, .json export or CSV file.
+    """
+    scheme = urllib.parse.urlparse(path_or_url).scheme
+    if scheme in ("http", "https"):
+        return HttpHistorySource(path_or_url, **kwargs)
+    if path_or_url.endswith(".json"):
+        return ZabbixJsonSource(path_or_url, **kwargs)
+    return CsvTailSource(path_or_url, **kwargs)
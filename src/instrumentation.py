@@ -0,0 +1,264 @@
+# src/instrumentation.py
+# Lightweight timing histograms, a Prometheus text endpoint and sampled logging.
+#
+#   with timed("resample"): ...          # context manager
+#   @timed("db_write")                    # or decorator
+#   def insert_prediction(...): ...
+#
+# Observations go to process-local histograms (REGISTRY). They are exposed in
+# the Prometheus text format on METRICS_PORT (if set), and the dashboard shows
+# them in its diagnostics panel. Pool workers hand theirs back with drain() and
+# the parent merge()s them. No third-party client library is needed.
+
+import os
+import math
+import random
+import logging
+import threading
+from contextlib import ContextDecorator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+# Port for the /metrics endpoint; unset or 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+# Fraction of prompts/responses logged, and how many characters of each
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.05))
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", 400))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, math.inf)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, math.inf)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, math.inf)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with labels (Prometheus semantics).
+    Per label set: bucket counts, sum, count and max.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            entry = self._series.get(key)
+            if entry is None:
+                entry = self._series[key] = [[0] * len(self.buckets), 0.0, 0, -math.inf]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+            entry[3] = max(entry[3], value)
+
+    def quantile(self, q: float, key: tuple) -> float:
+        """
+        Linear interpolation inside the bucket holding the q-th observation
+        (like PromQL's histogram_quantile); the open top bucket returns max.
+        """
+        counts, _, count, top = self._series[key]
+        rank, seen, lower = q * count, 0, 0.0
+        for bound, n in zip(self.buckets, counts):
+            if n and seen + n >= rank:
+                upper = top if math.isinf(bound) else min(bound, top)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+            lower = bound
+        return top
+
+    def rows(self):
+        with self._lock:
+            keys = sorted(self._series)
+            return [
+                {
+                    "metric": self.name,
+                    **dict(zip(self.labelnames, key)),
+                    "count": self._series[key][2],
+                    "mean": self._series[key][1] / self._series[key][2],
+                    "p50": self.quantile(0.5, key),
+                    "p95": self.quantile(0.95, key),
+                    "max": self._series[key][3],
+                }
+                for key in keys
+            ]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count, _) in sorted(self._series.items()):
+                labels = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    le = "+Inf" if math.isinf(bound) else f"{bound:g}"
+                    bucket_labels = ",".join(labels + [f'le="{le}"'])
+                    lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+                suffix = f"{{{','.join(labels)}}}" if labels else ""
+                lines.append(f"{self.name}_sum{suffix} {total:.6g}")
+                lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS, labelnames=()) -> Histogram:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(name, help_text, buckets, labelnames)
+        return self.histograms[name]
+
+    def rows(self) -> list:
+        """One dict per histogram/label set: count, mean, p50, p95, max."""
+        return [row for h in self.histograms.values() for row in h.rows()]
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        return "\n".join(line for h in self.histograms.values() for line in h.render()) + "\n"
+
+    def drain(self) -> dict:
+        """Take (and reset) all observations, e.g. to send them from a worker to its parent."""
+        state = {}
+        for name, h in self.histograms.items():
+            with h._lock:
+                state[name], h._series = h._series, {}
+        return state
+
+    def merge(self, state: dict):
+        for name, series in state.items():
+            h = self.histograms.get(name)
+            if h is None:
+                continue
+            with h._lock:
+                for key, (counts, total, count, top) in series.items():
+                    entry = h._series.setdefault(key, [[0] * len(h.buckets), 0.0, 0, -math.inf])
+                    entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                    entry[1] += total
+                    entry[2] += count
+                    entry[3] = max(entry[3], top)
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "predictor_stage_seconds", "Wall time of pipeline stages", LATENCY_BUCKETS, ("stage",))
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "predictor_llm_first_token_seconds", "Time from request to first streamed token (client side)")
+LLM_PROMPT_EVAL_SECONDS = REGISTRY.histogram(
+    "predictor_llm_prompt_eval_seconds", "Ollama prompt_eval_duration")
+LLM_EVAL_SECONDS = REGISTRY.histogram(
+    "predictor_llm_eval_seconds", "Ollama eval_duration (generation)")
+LLM_LOAD_SECONDS = REGISTRY.histogram(
+    "predictor_llm_load_seconds", "Ollama load_duration (model load, 0 when already loaded)")
+LLM_PROMPT_TOKENS = REGISTRY.histogram(
+    "predictor_llm_prompt_tokens", "Ollama prompt_eval_count (uncached prompt tokens)", TOKEN_BUCKETS)
+LLM_EVAL_TOKENS = REGISTRY.histogram(
+    "predictor_llm_eval_tokens", "Ollama eval_count (generated tokens)", TOKEN_BUCKETS)
+LLM_EVAL_RATE = REGISTRY.histogram(
+    "predictor_llm_eval_tokens_per_second", "Generation speed, eval_count / eval_duration", RATE_BUCKETS)
+
+
+class timed(ContextDecorator):
+    """
+    Observe the wall time of a block (or decorated function) in
+    predictor_stage_seconds{stage=...}; with a `timings` dict the seconds are
+    also added to timings[stage].
+    """
+
+    def __init__(self, stage: str, timings: dict = None):
+        self.stage = stage
+        self.timings = timings
+
+    def _recreate_cm(self):
+        # a fresh instance per decorated call, so concurrent calls don't share a start time
+        return timed(self.stage, self.timings)
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, stage=self.stage)
+        if self.timings is not None:
+            self.timings[self.stage] = self.timings.get(self.stage, 0.0) + elapsed
+        return False
+
+
+def record_ollama_stats(info: dict):
+    """
+    Histograms from the statistics on Ollama's final ("done") stream message.
+    Durations are reported in nanoseconds.
+    """
+    if not info or not info.get("done"):
+        return
+    for field, histogram in (("prompt_eval_duration", LLM_PROMPT_EVAL_SECONDS),
+                             ("eval_duration", LLM_EVAL_SECONDS),
+                             ("load_duration", LLM_LOAD_SECONDS)):
+        if info.get(field) is not None:
+            histogram.observe(info[field] / 1e9)
+    if info.get("prompt_eval_count") is not None:
+        LLM_PROMPT_TOKENS.observe(info["prompt_eval_count"])
+    if info.get("eval_count") is not None:
+        LLM_EVAL_TOKENS.observe(info["eval_count"])
+        if info.get("eval_duration"):
+            LLM_EVAL_RATE.observe(info["eval_count"] / (info["eval_duration"] / 1e9))
+
+
+def log_sampled(logger: logging.Logger, message: str, text: str, rate: float = None,
+                max_chars: int = None, level: int = logging.INFO) -> bool:
+    """
+    Log `message` with `text` for a random `rate` share of calls, truncated
+    to `max_chars`. Returns whether it was logged.
+    """
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    max_chars = LOG_MAX_CHARS if max_chars is None else max_chars
+    if not logger.isEnabledFor(level) or random.random() >= rate:
+        return False
+    text = str(text)
+    if len(text) > max_chars:
+        text = f"{text[:max_chars]}... [{len(text) - max_chars} more chars]"
+    logger.log(level, f"{message}:\n{text}")
+    return True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = None, host: str = "0.0.0.0"):
+    """
+    Serve GET /metrics from a daemon thread (once per process).
+    Returns the server, or None when no port is configured.
+    """
+    global _server
+    port = METRICS_PORT if port is None else port
+    with _server_lock:
+        if _server is None and port:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-server").start()
+    return _server
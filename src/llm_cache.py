@@ -0,0 +1,150 @@
+# src/llm_cache.py
+# On-disk (SQLite) cache of LLM responses with TTL and LRU eviction.
+#
+# The key is the model name, temperature, prompt template and a canonical form
+# of the payload: keys sorted, volatile fields dropped and floats rounded, so
+# tiny jitter between reruns still hits the cache.
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+# Cache file lives next to predictions.db
+cache_path = os.path.join(os.path.dirname(__file__), 'db', 'llm_cache.db')
+
+# Payload fields that change on every call without changing the answer
+VOLATILE_KEYS = {"generated_at"}
+
+
+def canonicalize(value, precision: int = 1, drop=VOLATILE_KEYS):
+    """
+    JSON-ready copy of a payload: floats rounded to `precision` decimals,
+    numpy scalars unwrapped and `drop` keys (VOLATILE_KEYS) removed.
+    """
+    if isinstance(value, dict):
+        return {str(k): canonicalize(v, precision, drop) for k, v in value.items() if k not in drop}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(v, precision, drop) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return round(value, precision)
+    return value
+
+
+def cache_key(model: str, temperature: float, template: str, inputs: dict, precision: int = 1) -> str:
+    material = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "template": template,
+            "inputs": canonicalize(inputs, precision),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed response cache. Entries expire after `ttl_seconds`; once
+    more than `max_entries` are stored the least recently used are evicted.
+    """
+
+    def __init__(self, path: str = None, ttl_seconds: float = None, max_entries: int = None, precision: int = None):
+        self.path = path or os.getenv("LLM_CACHE_PATH", cache_path)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("LLM_CACHE_TTL", 3600))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1000))
+        self.precision = precision if precision is not None else int(os.getenv("LLM_CACHE_PRECISION", 1))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                last_access REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.commit()
+
+    def key(self, model: str, temperature: float, template: str, inputs: dict) -> str:
+        return cache_key(model, temperature, template, inputs, self.precision)
+
+    def get(self, key: str):
+        """
+        Returns the cached response or None (and counts the hit/miss).
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, model, response, now, now),
+                )
+                self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+                overflow = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    self._conn.execute(
+                        "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)",
+                        (overflow,),
+                    )
+                    self.evictions += overflow
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": size,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> ResponseCache:
+    """
+    The process-wide cache, shared by ai.call_ai() and the dashboard's hit/miss counters.
+    """
+    return ResponseCache()
@@ -0,0 +1,321 @@
+# src/metric_store.py
+# Columnar metric history: Parquet files partitioned by host and month.
+#
+#   <root>/host=host-01/month=2025-06/part-<uuid>-0.parquet
+#
+# Values are stored as float32 (read back as float64), timestamps as
+# (delta-encoded) int64 epoch seconds and the metric name dictionary-encoded; host/month come back from the partition
+# path as categoricals. Reads push host/metric/time filters down to the
+# dataset scan so only the matching partitions and row groups are decoded.
+#
+# 5-min/hourly/daily rollups (rollups.py) live alongside the history in the
+# same layout under <root>/_rollups/<resolution>/ (the raw scan skips
+# "_"-prefixed directories) and are updated by every write().
+
+import os
+import urllib.parse
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from rollups import RESOLUTIONS, empty_rollup, merge, rollup, series_frame, tail_start
+
+# Default store location (next to the predictions db)
+metric_store_path = os.getenv("METRIC_STORE", os.path.join(os.path.dirname(__file__), 'db', 'metrics'))
+
+# Rollup datasets live here, inside the store root
+ROLLUP_DIR = "_rollups"
+
+PARTITIONING = ds.partitioning(pa.schema([("host", pa.string()), ("month", pa.string())]), flavor="hive")
+
+# Sorted epoch seconds delta-encode to almost nothing; byte-stream-split + zstd
+# suits float values. ~3.5x smaller and faster to write than the defaults.
+WRITE_OPTIONS = dict(
+    use_dictionary=["metric"],
+    column_encoding={"ts": "DELTA_BINARY_PACKED", "value": "BYTE_STREAM_SPLIT"},
+    compression="zstd",
+)
+# Rollup buckets are few and their floats not noisy samples: plain zstd
+ROLLUP_WRITE_OPTIONS = dict(
+    use_dictionary=["metric"],
+    column_encoding={"ts": "DELTA_BINARY_PACKED"},
+    compression="zstd",
+)
+
+
+class MetricStore:
+    """
+    Append-only, partitioned Parquet history for many hosts/metrics.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or metric_store_path
+        os.makedirs(self.root, exist_ok=True)
+
+    # ------------------
+    # Write
+    # ------------------
+    @property
+    def rollups(self) -> "RollupStore":
+        return RollupStore(self)
+
+    def write(self, long_df: pd.DataFrame, rollups: bool = True) -> int:
+        """
+        Append a long-format frame (host, metric, timestamp, value) and, with
+        `rollups`, update the rollup buckets it touches.
+        Returns the number of rows written.
+        """
+        if long_df.empty:
+            return 0
+        ts = pd.to_datetime(long_df["timestamp"])
+        if ts.dt.tz is not None:
+            ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+        ts = ts.values.astype("datetime64[s]")
+
+        table = pa.table({
+            "host": _encode(long_df["host"]).cast(pa.string()),
+            "month": _encode(ts.astype("datetime64[M]")).cast(pa.string()),
+            "metric": _encode(long_df["metric"]),
+            "ts": pa.array(ts.astype(np.int64)),
+            "value": pa.array(long_df["value"].to_numpy(dtype=np.float32)),
+        })
+        ds.write_dataset(
+            table,
+            self.root,
+            format="parquet",
+            partitioning=PARTITIONING,
+            file_options=ds.ParquetFileFormat().make_write_options(**WRITE_OPTIONS),
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        if rollups:
+            self.rollups.update(long_df)
+        return table.num_rows
+
+    # ------------------
+    # Read
+    # ------------------
+    def dataset(self, hosts=None):
+        return _partitioned_dataset(self.root, hosts)
+
+    def read(self, hosts=None, metrics=None, start=None, end=None) -> pd.DataFrame:
+        """
+        Long-format frame (host, metric, timestamp, value) for the requested
+        hosts/metrics and [start, end] time range; None means "all".
+        `value` is float64 so every reader analyses (and hashes) the same numbers.
+        """
+        columns = ["host", "metric", "timestamp", "value"]
+        dataset = self.dataset(hosts) if os.listdir(self.root) else None
+        if dataset is None:
+            return pd.DataFrame(columns=columns)
+
+        table = dataset.to_table(
+            columns=["host", "metric", "ts", "value"],
+            filter=self._filter(hosts, metrics, start, end),
+        )
+        df = table.to_pandas()
+        df["timestamp"] = pd.to_datetime(df.pop("ts"), unit="s").astype("datetime64[ns]")
+        df["value"] = df["value"].astype(np.float64)
+        return df[columns].sort_values(["host", "metric", "timestamp"], kind="stable").reset_index(drop=True)
+
+    def load_series(self, host: str, metric: str = None, start=None, end=None) -> pd.DataFrame:
+        """
+        One series shaped like load_data() output (timestamp, cpu_usage_percent).
+        """
+        df = self.read([host], [metric] if metric else None, start, end)
+        return (
+            df[["timestamp", "value"]]
+            .rename(columns={"value": "cpu_usage_percent"})
+            .reset_index(drop=True)
+        )
+
+    def series(self):
+        """
+        Distinct (host, metric) pairs in the store.
+        """
+        if not os.listdir(self.root):
+            return []
+        df = self.dataset().to_table(columns=["host", "metric"]).to_pandas()
+        return sorted(map(tuple, df.drop_duplicates().astype(str).values))
+
+    def time_range(self, host: str, metric: str = None):
+        """
+        (oldest, newest) sample timestamps of one series, or (None, None)
+        if it has no data. Only the timestamp column is scanned.
+        """
+        if not os.listdir(self.root):
+            return None, None
+        ts = self.dataset([host]).to_table(
+            columns=["ts"], filter=self._filter([host], [metric] if metric else None, None, None),
+        ).column("ts")
+        bounds = pc.min_max(ts)
+        if not len(ts) or bounds["min"].as_py() is None:
+            return None, None
+        return (pd.to_datetime(bounds["min"].as_py(), unit="s"),
+                pd.to_datetime(bounds["max"].as_py(), unit="s"))
+
+    @staticmethod
+    def _filter(hosts, metrics, start, end):
+        conditions = []
+        if hosts is not None:
+            conditions.append(pc.field("host").isin(list(hosts)))
+        if metrics is not None:
+            conditions.append(pc.field("metric").isin(list(metrics)))
+        if start is not None:
+            start = pd.Timestamp(start)
+            conditions.append(pc.field("month") >= start.strftime("%Y-%m"))
+            conditions.append(pc.field("ts") >= int(start.timestamp()))
+        if end is not None:
+            end = pd.Timestamp(end)
+            conditions.append(pc.field("month") <= end.strftime("%Y-%m"))
+            conditions.append(pc.field("ts") <= int(end.timestamp()))
+        if not conditions:
+            return None
+        expr = conditions[0]
+        for cond in conditions[1:]:
+            expr = expr & cond
+        return expr
+
+
+class RollupStore:
+    """
+    Rollups of a MetricStore's history, one Parquet dataset per resolution.
+    An update rewrites the host/month partitions it touches as a whole, so
+    each host should have a single writer at a time (as data_generator.py's
+    per-host-chunk workers do).
+    """
+
+    def __init__(self, store: MetricStore):
+        self.store = store
+        self.root = os.path.join(store.root, ROLLUP_DIR)
+
+    def _path(self, resolution: str) -> str:
+        return os.path.join(self.root, resolution)
+
+    # ------------------
+    # Write
+    # ------------------
+    def update(self, long_df: pd.DataFrame) -> int:
+        """
+        Recompute the buckets touched by newly written raw samples (long_df)
+        from the raw history. Returns the number of rollup rows written.
+        """
+        if long_df.empty:
+            return 0
+        ts = pd.to_datetime(long_df["timestamp"])
+        if ts.dt.tz is not None:
+            ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+        raw = self.store.read(hosts=pd.unique(long_df["host"].astype(str)),
+                              metrics=pd.unique(long_df["metric"].astype(str)), start=tail_start(ts.min()))
+        return sum(self._write(resolution, rollup(raw, resolution)) for resolution in RESOLUTIONS)
+
+    def rebuild(self, hosts=None) -> int:
+        """
+        Recompute all rollups from the full raw history, one host at a time
+        (e.g. for history written before rollups existed).
+        """
+        hosts = hosts or sorted({host for host, _ in self.store.series()})
+        written = 0
+        for host in hosts:
+            raw = self.store.read(hosts=[host])
+            written += sum(self._write(resolution, rollup(raw, resolution)) for resolution in RESOLUTIONS)
+        return written
+
+    def _write(self, resolution: str, fresh: pd.DataFrame) -> int:
+        if fresh.empty:
+            return 0
+        # whole months of the touched hosts, so every partition written below is complete
+        first_month = fresh["timestamp"].min().to_period("M").start_time
+        existing = self.read(resolution, hosts=pd.unique(fresh["host"]), start=first_month)
+        rows = merge(existing, fresh)
+        month = rows["timestamp"].to_numpy(dtype="datetime64[M]").astype(str)
+
+        table = pa.table({
+            "host": pa.array(rows["host"].to_numpy(), pa.string()),
+            "month": pa.array(month, pa.string()),
+            "metric": _encode(rows["metric"]),
+            "ts": pa.array(rows["timestamp"].to_numpy(dtype="datetime64[s]").astype(np.int64)),
+            # min/max are raw (float32) samples; mean/p95 keep float64 so reads match resampling exactly
+            "mean": pa.array(rows["mean"].to_numpy(dtype=np.float64)),
+            "min": pa.array(rows["min"].to_numpy(dtype=np.float32)),
+            "max": pa.array(rows["max"].to_numpy(dtype=np.float32)),
+            "p95": pa.array(rows["p95"].to_numpy(dtype=np.float64)),
+            "count": pa.array(rows["count"].to_numpy(dtype=np.int32)),
+        })
+        ds.write_dataset(
+            table,
+            self._path(resolution),
+            format="parquet",
+            partitioning=PARTITIONING,
+            file_options=ds.ParquetFileFormat().make_write_options(**ROLLUP_WRITE_OPTIONS),
+            basename_template="part-{i}.parquet",
+            existing_data_behavior="delete_matching",
+        )
+        return table.num_rows
+
+    # ------------------
+    # Read
+    # ------------------
+    def read(self, resolution: str, hosts=None, metrics=None, start=None, end=None) -> pd.DataFrame:
+        """
+        Long rollup frame (host, metric, timestamp, mean, min, max, p95, count)
+        of buckets starting in [start, end]; None means "all".
+        """
+        path = self._path(resolution)
+        dataset = _partitioned_dataset(path, hosts) if os.path.isdir(path) else None
+        if dataset is None:
+            return empty_rollup()
+        table = dataset.to_table(
+            columns=["host", "metric", "ts", "mean", "min", "max", "p95", "count"],
+            filter=MetricStore._filter(hosts, metrics, start, end),
+        )
+        # decode, order and convert in Arrow: much cheaper than on the pandas side
+        table = (
+            table.set_column(0, "host", pc.cast(table["host"], pa.string()))
+            .set_column(1, "metric", pc.cast(table["metric"], pa.string()))
+            .sort_by([("host", "ascending"), ("metric", "ascending"), ("ts", "ascending")])
+        )
+        table = table.set_column(2, "timestamp", pc.cast(pc.cast(table["ts"], pa.timestamp("s")), pa.timestamp("ns")))
+        return table.to_pandas().astype({"min": np.float64, "max": np.float64, "count": np.int64})
+
+    def load(self, host: str, metric: str, start=None, end=None, resolutions=None) -> dict:
+        """
+        {resolution: series rollup frame} for one series, as the analyses take them.
+        """
+        return {
+            resolution: series_frame(self.read(resolution, [host], [metric], start, end))
+            for resolution in (resolutions or RESOLUTIONS)
+        }
+
+
+def _partitioned_dataset(root: str, hosts=None):
+    """
+    The host/month-partitioned dataset under `root`; with `hosts` only their
+    partition directories are listed instead of the whole tree (None if they
+    have no files).
+    """
+    partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+    if hosts is None:
+        return ds.dataset(root, format="parquet", partitioning=partitioning)
+    files = [
+        os.path.join(directory, name)
+        for host in hosts
+        # partition values are URI-encoded in directory names
+        for directory, _, names in os.walk(os.path.join(root, f"host={urllib.parse.quote(str(host), safe='')}"))
+        for name in names if name.endswith(".parquet")
+    ]
+    if not files:
+        return None
+    return ds.dataset(files, format="parquet", partitioning=partitioning, partition_base_dir=root)
+
+
+def _encode(values) -> pa.DictionaryArray:
+    # factorize first so only the distinct values become Python strings
+    codes, uniques = pd.factorize(values)
+    return pa.DictionaryArray.from_arrays(
+        pa.array(codes.astype(np.int32)), pa.array(np.asarray(uniques).astype(str))
+    )
@@ -0,0 +1,223 @@
+# src/model_store.py
+# On-disk store of fitted model state, keyed by host/metric.
+
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+# Default location for persisted models (next to the predictions db)
+model_dir = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(__file__), 'db', 'models'))
+
+# Training rows (1 day of 5-min points) hashed to recognize a detector's data
+FINGERPRINT_POINTS = 288
+
+
+def _series_key(host: str, metric: str) -> str:
+    """
+    Filesystem-safe key for a host/metric pair.
+    """
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", f"{host}__{metric}")
+
+
+# --------------------------------------------------
+# 1) Prophet warm-start store
+# --------------------------------------------------
+class ProphetStore:
+    """
+    Persists each series' fitted Prophet parameters so the next fit can
+    warm-start from them via Prophet's `init` argument, and trims history
+    to a rolling window.
+    """
+
+    def __init__(self, root: str = None, window_days: int = None):
+        self.root = os.path.join(root or model_dir, "prophet")
+        self.window_days = window_days if window_days is not None else int(os.getenv("FORECAST_WINDOW_DAYS", 90))
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, host: str, metric: str) -> str:
+        return os.path.join(self.root, f"{_series_key(host, metric)}.json")
+
+    def trim(self, hourly):
+        """
+        Keep only the last `window_days` of an hourly (ds, y) frame.
+        """
+        if not self.window_days:
+            return hourly
+        start = hourly["ds"].max() - np.timedelta64(self.window_days, "D")
+        return hourly[hourly["ds"] > start]
+
+    def load_init(self, host: str, metric: str):
+        """
+        Returns the stored init dict (k, m, sigma_obs, delta, beta) or None.
+        """
+        path = self._path(host, metric)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable Prophet state {path}: {e}")
+            return None
+        return {
+            name: np.asarray(value) if isinstance(value, list) else value
+            for name, value in state["params"].items()
+        }
+
+    def save(self, host: str, metric: str, model, last_ds=None):
+        state = {
+            "host": host,
+            "metric": metric,
+            "fitted_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "last_ds": str(last_ds) if last_ds is not None else None,
+            "window_days": self.window_days,
+            "params": warm_start_params(model),
+        }
+        tmp = self._path(host, metric) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self._path(host, metric))
+
+
+def warm_start_params(model) -> dict:
+    """
+    Extract Prophet's fitted parameters in the shape `fit(init=...)` expects
+    (see Prophet docs, "Updating fitted models").
+    """
+    res = {}
+    for name in ["k", "m", "sigma_obs"]:
+        if model.mcmc_samples == 0:
+            res[name] = float(model.params[name][0][0])
+        else:
+            res[name] = float(np.mean(model.params[name]))
+    for name in ["delta", "beta"]:
+        if model.mcmc_samples == 0:
+            res[name] = model.params[name][0].tolist()
+        else:
+            res[name] = np.mean(model.params[name], axis=0).tolist()
+    return res
+
+
+# --------------------------------------------------
+# 2) IsolationForest registry
+# --------------------------------------------------
+class DetectorRegistry:
+    """
+    Saves fitted anomaly detectors per host/metric with joblib, together with
+    the training window, a hash of the training data and its summary stats.
+    A stored detector is reused until it is older than `max_age_hours`, the
+    series no longer holds the data it was trained on (e.g. another source
+    under the same host/metric) or the recent data has drifted away from it.
+    """
+
+    def __init__(self, root: str = None, max_age_hours: float = None,
+                 drift_sigma: float = 1.0, max_anomaly_rate: float = 0.05):
+        self.root = os.path.join(root or model_dir, "isoforest")
+        self.max_age_hours = max_age_hours if max_age_hours is not None else float(os.getenv("DETECTOR_MAX_AGE_HOURS", 24))
+        self.drift_sigma = drift_sigma
+        self.max_anomaly_rate = max_anomaly_rate
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, host: str, metric: str) -> str:
+        return os.path.join(self.root, f"{_series_key(host, metric)}.joblib")
+
+    def load(self, host: str, metric: str):
+        """
+        Returns the stored entry dict (model + training metadata) or None.
+        """
+        path = self._path(host, metric)
+        if not os.path.exists(path):
+            return None
+        try:
+            return joblib.load(path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable detector {path}: {e}")
+            return None
+
+    def save(self, host: str, metric: str, model, train: pd.DataFrame, contamination: float):
+        entry = {
+            "model": model,
+            "trained_at": datetime.now(timezone.utc),
+            "train_start": train.index.min(),
+            "train_end": train.index.max(),
+            "data_hash": data_hash(_fingerprint(train)),
+            "contamination": contamination,
+            "train_mean": float(train["y"].mean()),
+            "train_std": float(train["y"].std()),
+            "n_train": len(train),
+        }
+        tmp = self._path(host, metric) + ".tmp"
+        joblib.dump(entry, tmp)
+        os.replace(tmp, self._path(host, metric))
+        return entry
+
+    def load_current(self, host: str, metric: str, recent: pd.DataFrame, contamination: float,
+                     history: pd.DataFrame = None):
+        """
+        Returns a stored model that is still valid for `recent` (a frame with a
+        'y' column), or None when it is missing, stale or drifted. Drift is
+        only checked on rows of `recent` newer than the training window. Given
+        the series' `history` (same shape, reaching back to the end of
+        training), the model is also dropped when that data differs from what
+        it was trained on.
+        """
+        entry = self.load(host, metric)
+        if entry is None:
+            return None
+        reason = self.retrain_reason(entry, recent, contamination, history)
+        if reason:
+            logger.info(f"Retraining detector for {host}/{metric}: {reason}")
+            return None
+        return entry["model"]
+
+    def retrain_reason(self, entry: dict, recent: pd.DataFrame, contamination: float,
+                       history: pd.DataFrame = None):
+        age_hours = (datetime.now(timezone.utc) - entry["trained_at"]).total_seconds() / 3600
+        if age_hours > self.max_age_hours:
+            return f"model is {age_hours:.1f}h old"
+        if entry["contamination"] != contamination:
+            return "contamination changed"
+        if history is not None:
+            seen = history.loc[:entry["train_end"]].dropna()
+            if data_hash(_fingerprint(seen)) != entry["data_hash"]:
+                return "training data differs from this series"
+
+        # only samples the detector has not been trained on can show drift
+        recent = recent.loc[recent.index > entry["train_end"]].dropna()
+        if recent.empty:
+            return None
+        shift = abs(recent["y"].mean() - entry["train_mean"]) / (entry["train_std"] or 1.0)
+        if shift > self.drift_sigma:
+            return f"mean drifted {shift:.2f} sigma"
+        rate = float((entry["model"].predict(recent[["y"]]) == -1).mean())
+        if rate > self.max_anomaly_rate:
+            return f"recent anomaly rate {rate:.1%}"
+        return None
+
+
+def _fingerprint(train: pd.DataFrame) -> pd.DataFrame:
+    """
+    The last FINGERPRINT_POINTS training rows whose values can no longer
+    change (the newest 5-min bucket may still have been filling), hashed to
+    tell whether a later history still holds the data a detector was trained
+    on. Only the tail is used so a shorter or later history window matches;
+    values are rounded so resampled and rolled-up means hash alike.
+    """
+    return train[["y"]].iloc[-FINGERPRINT_POINTS - 1:-1].round(6)
+
+
+def data_hash(df: pd.DataFrame) -> str:
+    """
+    Content hash of a frame (values + index).
+    """
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes()).hexdigest()
@@ -0,0 +1,130 @@
+# src/pipeline.py
+# The prediction pipeline for one host/metric, without any UI:
+#   load -> forecast + anomaly fit -> payloads -> rules / LLM -> thresholds -> prediction record
+# Shared by the dashboard's Analyze button and the scheduler daemon. Every
+# stage's wall time is added to a `timings` dict (seconds by stage name) and
+# observed in the instrumentation histograms.
+
+import os
+import time
+from typing import Optional
+
+import pandas as pd
+
+from analysis import AnalysisResult, build_anomaly_payload, build_trend_payload, run_analysis
+from instrumentation import REGISTRY, timed
+from model_store import DetectorRegistry, ProphetStore
+from rules import triage
+from thresholds import suggested_thresholds, threshold_report
+from utils import ai_to_prediction_record, load_data
+
+# Days of history loaded per evaluation, back from the newest sample (0 = everything in the store)
+HISTORY_DAYS = int(os.getenv("PIPELINE_HISTORY_DAYS", 30))
+
+
+def analyze_with_ai(result: AnalysisResult, show=None, use_ai: bool = True, timings: Optional[dict] = None):
+    """
+    Rule engine first; only ambiguous or severe cases go to the LLM, and those
+    prompts run concurrently. Returns (trends, anomalies).
+    `show(kind, data)` is called with the rule results right away and with the
+    partial LLM answers as they stream in ("trends" / "anomalies").
+    """
+    show = show or (lambda kind, data: None)
+    with timed("payload", timings):
+        trend_payload, anomaly_payload = build_trend_payload(result), build_anomaly_payload(result)
+    insights, escalate = triage(trend_payload, anomaly_payload)
+    for kind in ("trends", "anomalies"):
+        if not escalate[kind]:
+            show(kind, insights[kind])
+    if not use_ai or not any(escalate.values()):
+        return insights["trends"], insights["anomalies"]
+
+    # Imported lazily so rule-only runs never touch the LLM client
+    from ai import analyze_concurrently
+    from utils import parse_json_response
+
+    with timed("llm", timings):
+        raw_trend, raw_anomaly = analyze_concurrently(
+            trend_payload if escalate["trends"] else None,
+            anomaly_payload if escalate["anomalies"] else None,
+            on_trend=lambda partial: show("trends", partial),
+            on_anomaly=lambda partial: show("anomalies", partial),
+        )
+    # a failed or unparseable answer ("" -> {}) keeps the rule result
+    trends = (parse_json_response(raw_trend) if raw_trend is not None else None) or insights["trends"]
+    anomalies = (parse_json_response(raw_anomaly) if raw_anomaly is not None else None) or insights["anomalies"]
+    show("trends", trends)
+    show("anomalies", anomalies)
+    return trends, anomalies
+
+
+def series_thresholds(df: pd.DataFrame, host: str, metric: str) -> Optional[dict]:
+    """
+    Adaptive day/night suggested_threshold for one series (see thresholds.py).
+    """
+    series_long = df.rename(columns={"cpu_usage_percent": "value"}).assign(host=host, metric=metric)
+    return suggested_thresholds(threshold_report(series_long)).get((host, metric))
+
+
+def evaluate(df: pd.DataFrame, host: str, metric: str, threshold: float, engine: str = None,
+             prophet_store=None, detector_registry=None, use_ai: bool = True,
+             timings: Optional[dict] = None, rollups: Optional[dict] = None) -> dict:
+    """
+    Full analysis of one series; returns the prediction record (not saved).
+    """
+    result = run_analysis(df, host, metric, threshold, prophet_store=prophet_store,
+                          detector_registry=detector_registry, engine=engine, timings=timings,
+                          rollups=rollups)
+    trends, anomalies = analyze_with_ai(result, use_ai=use_ai, timings=timings)
+    with timed("thresholds", timings):
+        thresholds = series_thresholds(df, host, metric)
+    with timed("record", timings):
+        return ai_to_prediction_record(host, metric, {"trends": trends, "anomalies": anomalies,
+                                                      "thresholds": thresholds})
+
+
+def history_start(source: str, host: str, metric: str, days: int):
+    """
+    Start of the `days`-long history window ending at the series' newest
+    sample (not at wall-clock time, so historical exports still load).
+    None loads everything: days is 0, the series is empty or `source` is
+    not a metric store (CSV sources are read whole).
+    """
+    if not days or not (isinstance(source, str) and os.path.isdir(source)):
+        return None
+    from metric_store import MetricStore  # pyarrow is only needed for Parquet stores
+
+    _, newest = MetricStore(source).time_range(host, metric)
+    return newest - pd.Timedelta(days=days) if newest is not None else None
+
+
+def evaluate_series(host: str, metric: str, threshold: float, source: str = None, frame: pd.DataFrame = None,
+                    engine: str = None, use_ai: bool = False, model_dir: str = None,
+                    window_days: int = None, history_days: int = None, rollups: dict = None) -> dict:
+    """
+    Worker entry point (runs in a pool process). The series is read from the
+    metric store at `source` unless `frame` (and its `rollups`) is given. Returns
+    {host, metric, record, timings, metrics, started_at, error}; only the
+    record, the timings and this process's drained histograms (`metrics`,
+    see instrumentation.Registry.merge) travel back to the parent.
+    """
+    started_at = time.time()
+    timings = {}
+    try:
+        if frame is None:
+            days = HISTORY_DAYS if history_days is None else history_days
+            with timed("load", timings):
+                frame = load_data(source, host, metric, start=history_start(source, host, metric, days))
+        if frame.empty:
+            raise ValueError("no data in the history window")
+        record = evaluate(
+            frame, host, metric, threshold, engine=engine,
+            prophet_store=ProphetStore(model_dir, window_days=window_days),
+            detector_registry=DetectorRegistry(model_dir),
+            use_ai=use_ai, timings=timings, rollups=rollups,
+        )
+        error = None
+    except Exception as e:
+        record, error = None, f"{type(e).__name__}: {e}"
+    return {"host": host, "metric": metric, "record": record, "timings": timings,
+            "metrics": REGISTRY.drain(), "started_at": started_at, "error": error}
@@ -1,55 +1,247 @@
 # src/predictive.py  (keep it next to your Streamlit app)
 
-from sklearn.ensemble import IsolationForest
-from prophet import Prophet
+import os
+
+import numpy as np
+import pandas as pd
+
+from breach import BUSINESS_TZ, summarize_forecast
+from instrumentation import timed
+from rollups import mean_series
+from seasonal_forecast import seasonal_forecast
+
+# Detector training window (days) and size of the drift-check window (1 day of 5-min points)
+ANOMALY_TRAIN_DAYS = int(os.getenv("ANOMALY_TRAIN_DAYS", 30))
+RECENT_POINTS = 288
+
+# Forecast engine used when a run does not pick one (see FORECASTERS)
+FORECAST_ENGINE = os.getenv("FORECAST_ENGINE", "prophet")
 
 # --------------------------------------------------
 # 1) Anomaly Detection
 # --------------------------------------------------
-def detect_anomalies_iso(df, contamination=0.005):
+def detect_anomalies_iso(df, contamination=0.005, train_days=None, train_end=None,
+                         host=None, metric=None, registry=None, rollups=None):
     """
     Return df with 'anomaly' column  (-1 = outlier, 1 = normal)
-    Down-samples to 5-min averages for speed.
+    Down-samples to 5-min averages for speed; given the series' `rollups`
+    ({resolution: frame}, see rollups.py) their 5-min means are used as is.
+    The detector is trained on the `train_days` (default ANOMALY_TRAIN_DAYS)
+    ending at `train_end` (default: newest sample). With a DetectorRegistry
+    (and host/metric) a stored detector is reused and only scores the data.
     """
-    cpu_5 = df.set_index("timestamp")["cpu_usage_percent"].resample("5min").mean()
+    cpu_5 = mean_series(rollups, "5min")
+    if cpu_5 is None:
+        with timed("resample"):
+            cpu_5 = df.set_index("timestamp")["cpu_usage_percent"].resample("5min").mean()
     cpu_5 = cpu_5.to_frame(name="y")
-    train = cpu_5.loc[: "2025-05-31 23:59:59"]
+
+    iso = None
+    if registry is not None and host is not None:
+        iso = registry.load_current(host, metric, cpu_5.iloc[-RECENT_POINTS:], contamination, history=cpu_5)
+    if iso is None:
+        # sklearn (~1.5s to import) and prophet are only loaded when a model is actually fitted
+        from sklearn.ensemble import IsolationForest
+
+        train = training_window(cpu_5, train_days, train_end)
+        with timed("anomaly_fit"):
+            iso = IsolationForest(
+                n_estimators=200,
+                contamination=contamination,
+                random_state=42
+            ).fit(train[["y"]])
+        if registry is not None and host is not None:
+            registry.save(host, metric, iso, train, contamination)
+
+    with timed("anomaly_predict"):
+        cpu_5["anomaly_score"] = iso.decision_function(cpu_5[["y"]])
+        cpu_5["anomaly"] = iso.predict(cpu_5[["y"]])
+    cpu_5 = cpu_5.reset_index().rename(columns={"index": "timestamp"})
+    return cpu_5
+
+
+def score_points(values, host, metric, registry):
+    """
+    Score fresh 5-min points with the stored detector (no training).
+    Returns (anomaly_score, anomaly) arrays, or None if no detector is stored.
+    """
+    entry = registry.load(host, metric)
+    if entry is None:
+        return None
+    X = pd.DataFrame({"y": np.asarray(values, dtype=float)})
+    return entry["model"].decision_function(X), entry["model"].predict(X)
+
+
+def training_window(cpu_5, train_days=None, train_end=None):
+    """
+    Slice of the 5-min frame used to train the detector.
+    """
+    train_days = train_days if train_days is not None else ANOMALY_TRAIN_DAYS
+    end = pd.Timestamp(train_end) if train_end is not None else cpu_5.index.max()
+    train = cpu_5.loc[end - pd.Timedelta(days=train_days):end].dropna()
+    # Too little history in the window: train on everything we have
+    return train if len(train) >= RECENT_POINTS else cpu_5.dropna()
+
+
+# --------------------------------------------------
+# 1b) Vectorized multi-series Anomaly Detection
+# --------------------------------------------------
+def detect_anomalies_multi(long_df, contamination=0.005, train_days=None, max_train=50_000):
+    """
+    Score many host/metric series in one pass.
+    long_df has host / metric / timestamp / value columns.
+    Returns a long frame: host, metric, timestamp, y, anomaly_score, anomaly.
+
+    All series are resampled together with a single groupby, standardized
+    against their own training window and scored by ONE shared forest, so
+    there is no per-series model fit or Python loop.
+    """
+    five = (
+        long_df.groupby(["host", "metric", pd.Grouper(key="timestamp", freq="5min")], observed=True)["value"]
+               .mean()
+               .unstack(["host", "metric"])
+    )
+    Y = five.to_numpy(dtype=float).T                     # series × time
+
+    # per-series standardization over the training window
+    train_days = train_days if train_days is not None else ANOMALY_TRAIN_DAYS
+    in_train = five.index >= five.index.max() - pd.Timedelta(days=train_days)
+    mu = np.nanmean(Y[:, in_train], axis=1, keepdims=True)
+    sd = np.nanstd(Y[:, in_train], axis=1, keepdims=True)
+    sd[~(sd > 0)] = 1.0
+    Z = ((Y - mu) / sd).astype(np.float32)
+
+    train = Z[:, in_train].ravel()
+    train = train[np.isfinite(train)]
+    if len(train) > max_train:
+        train = np.random.default_rng(42).choice(train, max_train, replace=False)
+    from sklearn.ensemble import IsolationForest
 
     iso = IsolationForest(
         n_estimators=200,
         contamination=contamination,
         random_state=42
-    ).fit(train[["y"]])
+    ).fit(train.reshape(-1, 1))
 
-    cpu_5["anomaly_score"] = iso.decision_function(cpu_5[["y"]])
-    cpu_5["anomaly"] = iso.predict(cpu_5[["y"]])
-    cpu_5 = cpu_5.reset_index().rename(columns={"index": "timestamp"})
-    return cpu_5
+    valid = np.isfinite(Z)
+    scores = np.full(Z.shape, np.nan)
+    scores[valid] = _bulk_decision_function(iso, Z[valid])
+
+    n_series, n_time = Y.shape
+    out = pd.DataFrame({
+        "host": np.repeat(five.columns.get_level_values("host"), n_time),
+        "metric": np.repeat(five.columns.get_level_values("metric"), n_time),
+        "timestamp": np.tile(five.index.values, n_series),
+        "y": Y.ravel(),
+        "anomaly_score": scores.ravel(),
+    })
+    out = out[valid.ravel()].reset_index(drop=True)
+    out["anomaly"] = np.where(out["anomaly_score"] < 0, -1, 1)
+    return out
+
+
+def _bulk_decision_function(iso, z):
+    """
+    decision_function for a single-feature forest without walking every tree
+    for every point: the score is constant between consecutive split
+    thresholds, so score one representative per occupied interval and
+    broadcast it back with searchsorted. The trees compare float32(X), so
+    the intervals are looked up (and representatives picked) in float32 too.
+    """
+    z = np.asarray(z, dtype=np.float32)
+    thresholds = np.unique(np.concatenate([
+        est.tree_.threshold[est.tree_.feature >= 0] for est in iso.estimators_
+    ]))
+    interval = np.searchsorted(thresholds, z.astype(np.float64), side="left")
+    occupied, first = np.unique(interval, return_index=True)
+    rep_scores = iso.decision_function(z[first].reshape(-1, 1))
+    return rep_scores[np.searchsorted(occupied, interval)]
 
 
 # --------------------------------------------------
 # 2) Trend Forecast
 # --------------------------------------------------
-def forecast_trend(df, periods=24*30, threshold=70.0):
+def forecast_trend(df, periods=24*30, threshold=70.0, host=None, metric=None, store=None, engine=None,
+                   night_threshold=None, rollups=None):
     """
-    Returns (forecast_df, first_breach_ts or None).
-    forecast_df has Prophet's yhat / yhat_upper / yhat_lower.
+    Returns (forecast_df, first_breach_ts or None); see forecast_summary.
     """
-    hourly = (
-        df.set_index("timestamp")["cpu_usage_percent"]
-          .resample("h").mean()
-          .reset_index()
-          .rename(columns={"timestamp": "ds", "cpu_usage_percent": "y"})
-    )
+    forecast, summary = forecast_summary(df, periods, threshold, host=host, metric=metric, store=store,
+                                         engine=engine, night_threshold=night_threshold, rollups=rollups)
+    return forecast, summary["first_breach_ts"]
 
-    m = Prophet(daily_seasonality=True, weekly_seasonality=True, changepoint_range=0.9)
-    m.fit(hourly)
-    future    = m.make_future_dataframe(periods=periods, freq="h")
-    forecast  = m.predict(future)
+
+def forecast_summary(df, periods=24*30, threshold=70.0, host=None, metric=None, store=None, engine=None,
+                     night_threshold=None, rollups=None, tz=BUSINESS_TZ):
+    """
+    Returns (forecast_df, summary) with the breach.summarize_forecast() dict
+    (first breach, value at breach, peak, 24h median, ...) past the last sample.
+    forecast_df has ds / yhat / yhat_upper / yhat_lower / trend.
+    `engine` picks an entry of FORECASTERS (default FORECAST_ENGINE).
+    With `night_threshold`, `threshold` only applies in business hours
+    (local to `tz`, default BUSINESS_TZ).
+    With a ProphetStore (and host/metric), history is trimmed to the store's
+    rolling window and the Prophet fit warm-starts from the previous parameters.
+    Given the series' `rollups`, their hourly means are used instead of resampling.
+    """
+    forecaster = FORECASTERS[engine or FORECAST_ENGINE]
+    hourly = mean_series(rollups, "1h")
+    if hourly is None:
+        with timed("resample"):
+            hourly = df.set_index("timestamp")["cpu_usage_percent"].resample("h").mean()
+    hourly = hourly.rename_axis("ds").rename("y").reset_index()
+    if store is not None and host is not None:
+        hourly = store.trim(hourly)
+
+    forecast = forecaster(hourly, periods, host=host, metric=metric, store=store)
 
     # median-cross rule
-    future_mask = forecast["ds"] > hourly["ds"].max()
-    cross = forecast[future_mask & (forecast["yhat"] >= threshold)]
-    first_hit = cross["ds"].min() if not cross.empty else None
+    return forecast, summarize_forecast(forecast, hourly["ds"].max(), threshold, night_threshold, tz=tz)
 
-    return forecast, first_hit
+
+# Forecaster interface: fn(hourly, periods, host=None, metric=None, store=None)
+# -> forecast frame over history + `periods` future hours with ds / yhat /
+# yhat_lower / yhat_upper / trend.
+def prophet_forecaster(hourly, periods, host=None, metric=None, store=None):
+    init = None
+    if store is not None and host is not None:
+        init = store.load_init(host, metric)
+
+    with timed("forecast_fit"):
+        m = _fit_prophet(hourly, init)
+    if store is not None and host is not None:
+        store.save(host, metric, m, last_ds=hourly["ds"].max())
+
+    with timed("forecast_predict"):
+        future = m.make_future_dataframe(periods=periods, freq="h")
+        return m.predict(future)
+
+
+def seasonal_forecaster(hourly, periods, host=None, metric=None, store=None):
+    # Closed-form fit, nothing to warm-start; fit and predict are one solve
+    with timed("forecast_fit"):
+        return seasonal_forecast(hourly, periods)
+
+
+FORECASTERS = {
+    "prophet": prophet_forecaster,
+    "seasonal": seasonal_forecaster,
+}
+
+
+def _fit_prophet(hourly, init=None):
+    """
+    Fit Prophet, warm-starting from `init` when given.
+    Falls back to a cold fit if the stored parameters no longer match
+    the model shape (e.g. seasonality settings changed).
+    """
+    from prophet import Prophet
+
+    m = Prophet(daily_seasonality=True, weekly_seasonality=True, changepoint_range=0.9)
+    if init is None:
+        return m.fit(hourly)
+    try:
+        return m.fit(hourly, init=init)
+    except Exception:
+        m = Prophet(daily_seasonality=True, weekly_seasonality=True, changepoint_range=0.9)
+        return m.fit(hourly)
@@ -0,0 +1,95 @@
+# src/prompt_budget.py
+# Compact prompt rendering and a prompt-size budget.
+#
+# Payload dicts are interpolated as minified JSON with rounded floats instead
+# of Python repr. Templates keep their static instructions first and the data
+# last, so consecutive calls share a byte-identical prefix that Ollama can
+# reuse from its KV cache while the model stays loaded (see AI_KEEP_ALIVE).
+# Prompt-eval time on CPU scales with input tokens, so every rendered prompt
+# is counted and rejected if it exceeds the budget.
+
+import os
+import re
+import json
+import math
+from functools import lru_cache
+
+from llm_cache import canonicalize
+
+# Rough tokenizer: word pieces of up to CHARS_PER_TOKEN chars, one token per symbol
+CHARS_PER_TOKEN = 4
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+class PromptTooLarge(ValueError):
+    pass
+
+
+def compact_json(value, precision: int = 2) -> str:
+    """
+    Minified JSON for a payload, floats rounded to `precision` decimals.
+    """
+    return json.dumps(canonicalize(value, precision, drop=()), separators=(",", ":"),
+                      ensure_ascii=False, default=str)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate LLM token count (within ~15% of llama-family tokenizers on
+    these prompts); good enough for budgeting without loading a tokenizer.
+    """
+    return sum(math.ceil(len(piece) / CHARS_PER_TOKEN) for piece in TOKEN_PATTERN.findall(text))
+
+
+class PromptBudget:
+    """
+    Renders prompt templates with compact payloads and enforces `max_tokens`.
+    Keeps per-process counters for the dashboard/benchmarks.
+    """
+
+    def __init__(self, max_tokens: int = None, precision: int = None):
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.getenv("AI_PROMPT_BUDGET", 2048))
+        self.precision = precision if precision is not None else int(os.getenv("AI_PROMPT_PRECISION", 2))
+        self.calls = 0
+        self.total_tokens = 0
+        self.last_tokens = 0
+        self.max_seen = 0
+        self.rejected = 0
+
+    def render(self, prompt, inputs: dict) -> str:
+        """
+        Format `prompt` with dict/list inputs serialized as compact JSON.
+        Raises PromptTooLarge when the result is over budget.
+        """
+        values = {
+            name: compact_json(value, self.precision) if isinstance(value, (dict, list, tuple)) else value
+            for name, value in inputs.items()
+        }
+        text = prompt.format(**values)
+        tokens = count_tokens(text)
+        if self.max_tokens and tokens > self.max_tokens:
+            self.rejected += 1
+            raise PromptTooLarge(f"Prompt is ~{tokens} tokens, budget is {self.max_tokens}")
+        self.calls += 1
+        self.total_tokens += tokens
+        self.last_tokens = tokens
+        self.max_seen = max(self.max_seen, tokens)
+        return text
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "last_tokens": self.last_tokens,
+            "avg_tokens": round(self.total_tokens / self.calls, 1) if self.calls else 0.0,
+            "max_tokens_seen": self.max_seen,
+            "budget": self.max_tokens,
+            "rejected": self.rejected,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_prompt_budget() -> PromptBudget:
+    """
+    The process-wide budget, shared by ai.py and the dashboard's prompt-size caption.
+    """
+    return PromptBudget()
@@ -0,0 +1,294 @@
+# src/rollups.py
+# Multi-resolution rollups of metric history.
+#
+# Every host/metric keeps 5-minute, hourly and daily buckets with mean, min,
+# max, p95 and sample count. Analyses read the resolution they need (the
+# anomaly detector 5-minute means, the forecasters hourly means) instead of
+# resampling the raw history on every run.
+#
+# Updates are incremental. New samples only touch buckets from the start of
+# their (coarsest, daily) bucket on; those are recomputed from the raw samples
+# and merged over the existing rows, everything older is left alone. Because
+# touched buckets are rebuilt from raw data, p95 is exact rather than a sketch.
+#
+# Rollups are kept next to the raw history: in memory by ingest.RollingWindow,
+# and on disk by metric_store.RollupStore (<store>/_rollups/<resolution>/).
+#
+#   python src/rollups.py --store data/metrics     # (re)build for existing history
+
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Resolution name -> pandas frequency
+RESOLUTIONS = {"5min": "5min", "1h": "h", "1d": "D"}
+# Bucket widths in ns (all fixed-width, so floor(ts) = ts - ts % width)
+WIDTHS = {resolution: pd.tseries.frequencies.to_offset(freq).nanos for resolution, freq in RESOLUTIONS.items()}
+# Updates recompute everything from the start of this resolution's bucket
+COARSEST = "1d"
+AGGREGATES = ["mean", "min", "max", "p95", "count"]
+ROLLUP_COLUMNS = ["host", "metric", "timestamp", *AGGREGATES]
+
+
+def empty_rollup() -> pd.DataFrame:
+    return pd.DataFrame({
+        "host": pd.Series(dtype=str), "metric": pd.Series(dtype=str),
+        "timestamp": pd.Series(dtype="datetime64[ns]"),
+        **{name: pd.Series(dtype=np.int64 if name == "count" else np.float64) for name in AGGREGATES},
+    })
+
+
+def tail_start(ts) -> pd.Timestamp:
+    """
+    First bucket an update starting at `ts` touches: raw samples from here
+    on must be passed to rollup() so every touched bucket is complete.
+    """
+    return pd.Timestamp(ts).floor(RESOLUTIONS[COARSEST])
+
+
+def _floor_ns(ts, resolution: str) -> int:
+    # bucket start of `ts` as epoch ns (UTC for tz-aware timestamps, like the ring buffers)
+    ns = pd.Timestamp(ts).value
+    return ns - ns % WIDTHS[resolution]
+
+
+def _sortable(values: np.ndarray) -> np.ndarray:
+    # float32 bit patterns remapped so unsigned integer order equals float order
+    bits = np.asarray(values, dtype=np.float32).view(np.uint32)
+    return np.where(bits >> 31, ~bits, bits | np.uint32(0x80000000))
+
+
+def _codes(labels: pd.Series):
+    # integer codes ranked by label (not category) order, and the sorted labels
+    codes, uniques = pd.factorize(labels)
+    uniques = pd.Series(np.asarray(uniques, dtype=object)).astype(str)
+    order = np.argsort(uniques.to_numpy(dtype=object), kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[codes], uniques.array.take(order)
+
+
+def rollup(long_df: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """
+    Aggregate a long-format frame (host, metric, timestamp, value) into
+    `resolution` buckets: one row per host/metric/bucket with mean, min, max,
+    p95 (linear interpolation, like pandas' quantile) and count. NaN values
+    are ignored; the input does not need to be sorted.
+    """
+    df = long_df.dropna(subset=["timestamp", "value"])
+    if df.empty:
+        return empty_rollup()
+    # dense group ids in (host, metric, bucket) order from per-column integer codes
+    hosts, host_names = _codes(df["host"])
+    metrics, metric_names = _codes(df["metric"])
+    buckets, bucket_starts = pd.factorize(pd.DatetimeIndex(df["timestamp"]).floor(RESOLUTIONS[resolution]), sort=True)
+    key = (hosts * len(metric_names) + metrics) * len(bucket_starts) + buckets
+    group = np.unique(key, return_inverse=True)[1]
+    first, aggregates = _aggregate(group, df["value"].to_numpy(dtype=np.float64))
+    out = pd.DataFrame({
+        "host": host_names.take(hosts[first]),
+        "metric": metric_names.take(metrics[first]),
+        "timestamp": bucket_starts[buckets[first]].astype("datetime64[ns]"),
+    })
+    for name, column in aggregates.items():
+        out[name] = column
+    return out
+
+
+def _aggregate(group: np.ndarray, values: np.ndarray):
+    """
+    Aggregates of `values` per dense group id (0..n-1): the input position of
+    one row of each group, and {aggregate: array} in group order. Pass rows in
+    time order for means that match resample().mean() exactly.
+    """
+    # pandas' grouped mean (compensated summation in input order), so means
+    # are bit-identical to resampling the time-ordered samples; one-sample
+    # buckets (5-min buckets of 5-min data) are just their value
+    counts = np.bincount(group)
+    mean = np.empty(len(counts))
+    single = counts[group] == 1
+    mean[group[single]] = values[single]
+    if not single.all():
+        multi = pd.Series(values[~single]).groupby(group[~single]).mean()
+        mean[multi.index.to_numpy()] = multi.to_numpy()
+    # one radix sort orders rows by group, then value: min/max/p95 become positional lookups
+    order = np.argsort((group.astype(np.uint64) << np.uint64(32)) | _sortable(values), kind="stable")
+    group, values = group[order], values[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(group)) + 1]
+    ends = starts + counts - 1
+    rank = (counts - 1) * 0.95
+    below = starts + np.floor(rank).astype(np.int64)
+    above = np.minimum(below + 1, ends)
+    return order[starts], {
+        "mean": mean,
+        "min": values[starts],
+        "max": values[ends],
+        "p95": values[below] + (values[above] - values[below]) * (rank - np.floor(rank)),
+        "count": counts,
+    }
+
+
+class SeriesRollup:
+    """
+    Rollups of one in-memory series kept as numpy columns with spare
+    capacity, so a chunk only rewrites the buckets it touches (no DataFrame
+    round trip, no copy of the older buckets).
+    """
+
+    def __init__(self):
+        self.columns = {}   # resolution -> {"timestamp": int64 ns bucket starts, aggregate: array}
+        self.bounds = {}    # resolution -> (lo, hi): the live rows of its columns
+
+    def update(self, ts: np.ndarray, values: np.ndarray, since):
+        """
+        Rebuild the buckets from tail_start(since) on out of the series'
+        samples (`ts` datetime64[ns], `values`), keeping older ones. Pass the
+        samples in time order for means that match resample().mean() exactly.
+        """
+        start = _floor_ns(since, COARSEST)
+        ts = np.asarray(ts, dtype="datetime64[ns]").view(np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        tail = (ts >= start) & ~np.isnan(values)
+        ts, values = ts[tail], values[tail]
+        for resolution, width in WIDTHS.items():
+            bucket_starts, group = np.unique(ts - ts % width, return_inverse=True)
+            fresh = {"timestamp": bucket_starts}
+            if len(bucket_starts):
+                fresh.update(_aggregate(group.ravel(), values)[1])
+            self._replace_tail(resolution, start, fresh)
+
+    def _replace_tail(self, resolution: str, start: int, fresh: dict):
+        n = len(fresh["timestamp"])
+        columns = self.columns.get(resolution)
+        lo, hi = self.bounds.get(resolution, (0, 0))
+        if columns is None:
+            columns = {"timestamp": np.empty(0, np.int64), "count": np.empty(0, np.int64),
+                       **{name: np.empty(0) for name in ("mean", "min", "max", "p95")}}
+        at = lo + np.searchsorted(columns["timestamp"][lo:hi], start)
+        if at + n > len(columns["timestamp"]):
+            # compact the kept rows to the front, with room to grow
+            kept = at - lo
+            capacity = max(2 * (kept + n), 64)
+            columns = {name: np.concatenate([column[lo:at], np.empty(capacity - kept, column.dtype)])
+                       for name, column in columns.items()}
+            lo, at = 0, kept
+        for name, column in columns.items():
+            if n:
+                column[at:at + n] = fresh[name]
+        self.columns[resolution] = columns
+        self.bounds[resolution] = (lo, at + n)
+
+    def trim(self, ts: np.ndarray, values: np.ndarray):
+        """
+        Drop buckets older than the series' remaining samples (`ts`, `values`,
+        in time order) and recompute the one its oldest sample falls in, which
+        has lost samples.
+        """
+        ts = np.asarray(ts, dtype="datetime64[ns]").view(np.int64)
+        if not len(ts):
+            return
+        oldest = ts.min()
+        for resolution, columns in self.columns.items():
+            lo, hi = self.bounds[resolution]
+            floor = oldest - oldest % WIDTHS[resolution]
+            lo += np.searchsorted(columns["timestamp"][lo:hi], floor)
+            self.bounds[resolution] = (lo, hi)
+            if lo < hi and columns["timestamp"][lo] == floor:
+                inside = (ts < floor + WIDTHS[resolution]) & ~np.isnan(values)
+                if inside.sum() != columns["count"][lo]:
+                    _, aggregates = _aggregate(np.zeros(inside.sum(), dtype=np.int64), values[inside])
+                    for name, column in aggregates.items():
+                        columns[name][lo] = column[0]
+
+    def frames(self, resolutions=None) -> dict:
+        """
+        {resolution: series rollup frame} (see series_frame()).
+        """
+        frames = {}
+        for resolution in resolutions or RESOLUTIONS:
+            if resolution in self.columns:
+                lo, hi = self.bounds[resolution]
+                columns = self.columns[resolution]
+                frames[resolution] = pd.DataFrame({
+                    "timestamp": columns["timestamp"][lo:hi].view("datetime64[ns]"),
+                    **{name: columns[name][lo:hi] for name in AGGREGATES},
+                })
+        return frames
+
+
+def merge(existing: pd.DataFrame, fresh: pd.DataFrame) -> pd.DataFrame:
+    """
+    `existing` rollup rows with each series' buckets from its first `fresh`
+    bucket on replaced by `fresh` (which must be complete from there on).
+    """
+    if existing is None or existing.empty:
+        return fresh
+    if fresh.empty:
+        return existing
+    hosts = existing["host"].to_numpy()
+    metrics = existing["metric"].to_numpy()
+    ts = existing["timestamp"].to_numpy()
+    stale = np.zeros(len(existing), dtype=bool)
+    firsts = fresh.groupby(["host", "metric"], sort=False)["timestamp"].min()
+    for (host, metric), first in firsts.items():
+        stale |= (hosts == host) & (metrics == metric) & (ts >= first.to_datetime64())
+    out = pd.concat([existing[~stale], fresh], ignore_index=True)
+    if len(firsts) == 1 and (hosts[~stale] == host).all() and (metrics[~stale] == metric).all():
+        # a single series (the in-memory window's case) is already in order
+        return out
+    return out.sort_values(["host", "metric", "timestamp"], kind="stable").reset_index(drop=True)
+
+
+def series_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    One series' rows of a long rollup frame without the host/metric columns:
+    (timestamp, mean, min, max, p95, count), the shape analyses take.
+    """
+    return frame[["timestamp", *AGGREGATES]].reset_index(drop=True)
+
+
+def split_series(frames: dict) -> dict:
+    """
+    {resolution: long rollup frame} -> {(host, metric): {resolution: series frame}}.
+    """
+    series = {}
+    for resolution, frame in frames.items():
+        for key, group in frame.groupby(["host", "metric"], sort=False, observed=True):
+            series.setdefault(key, {})[resolution] = series_frame(group)
+    return series
+
+
+def mean_series(rollups: dict, resolution: str):
+    """
+    Bucket means of one series at `resolution`, indexed by bucket start with
+    empty buckets as NaN (what resampling the raw samples returns), or None
+    when `rollups` ({resolution: series frame}) has no rows for it.
+    """
+    frame = (rollups or {}).get(resolution)
+    if frame is None or frame.empty:
+        return None
+    index = pd.DatetimeIndex(frame["timestamp"], name="timestamp")
+    series = pd.Series(frame["mean"].to_numpy(dtype=np.float64), index=index)
+    if (index[-1] - index[0]).value // WIDTHS[resolution] != len(index) - 1:
+        # gaps: reinsert the empty buckets
+        series = series.asfreq(RESOLUTIONS[resolution])
+    return series
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the rollups of a Parquet metric store from its raw history.")
+    parser.add_argument("--store", default=None, help="Metric store directory (default METRIC_STORE)")
+    parser.add_argument("--hosts", nargs="+", default=None, help="Only these hosts")
+    args = parser.parse_args(argv)
+
+    from metric_store import MetricStore
+
+    rows = MetricStore(args.store).rollups.rebuild(args.hosts)
+    print(f"Wrote {rows:,} rollup rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
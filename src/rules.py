@@ -0,0 +1,149 @@
+# src/rules.py
+# Deterministic trend/anomaly triage.
+#
+# Produces the same JSON objects the trend/anomaly prompts ask the LLM for
+# (and that ai_to_prediction_record consumes), straight from the payloads.
+# The LLM is only needed when a case sits near a severity boundary or is at
+# or above LLM_MIN_SEVERITY.
+
+import os
+
+SEVERITIES = ["none", "low", "moderate", "high", "critical"]
+
+# Cases at or above this severity still go to the LLM for a written explanation
+LLM_MIN_SEVERITY = os.getenv("RULES_LLM_MIN_SEVERITY", "high")
+
+# Trend bands: breach lead time (days) -> severity
+BREACH_BANDS = [(1, "critical"), (7, "high"), (14, "moderate")]
+# Without a breach, a forecast peak within this share of the threshold is "low"
+NEAR_THRESHOLD = 0.9
+# Relative distance to a band edge that counts as ambiguous
+AMBIGUITY_MARGIN = 0.1
+# Distance (share of the threshold) from the none/low peak edge that counts as ambiguous
+NEAR_MARGIN = 0.02
+
+# Anomaly score band edges (see analysis._anom_severity) and their ambiguity margin
+SCORE_EDGES = [0.0, -0.05, -0.15, -0.30]
+SCORE_MARGIN = 0.01
+
+# Detector severity scale -> prompt severity scale
+ANOMALY_SEVERITY = {"none": "none", "mild": "low", "moderate": "moderate", "high": "high", "critical": "critical"}
+
+
+# --------------------------------------------------
+# 1) Trend rules
+# --------------------------------------------------
+def evaluate_trend(payload: dict):
+    """
+    Returns (trends_dict, ambiguous) for a trend payload.
+    """
+    threshold = payload["threshold_percent"]
+    days = payload["days_until_breach"]
+    peak = payload["peak_cpu_next_30d"]
+    ambiguous = False
+
+    if days is None:
+        severity = "low" if peak >= NEAR_THRESHOLD * threshold else "none"
+        # a peak right at the none/low edge is worth a second opinion
+        ambiguous = abs(peak - NEAR_THRESHOLD * threshold) <= NEAR_MARGIN * threshold
+        summary = f"No forecast breach of {threshold}% within the horizon; peak {peak:.1f}%."
+        action = "No action needed; keep monitoring." if severity == "none" else "Review capacity headroom at the next planning cycle."
+    else:
+        severity = "low"
+        for limit, band in BREACH_BANDS:
+            if days <= limit:
+                severity = band
+                break
+        ambiguous = any(abs(days - limit) <= AMBIGUITY_MARGIN * limit for limit, _ in BREACH_BANDS)
+        summary = f"Median forecast crosses {threshold}% in {days} days ({payload['first_median_breach_expected']})."
+        action = {
+            "critical": "Add capacity or shed load now; breach is imminent.",
+            "high": "Plan capacity increase this week.",
+            "moderate": "Schedule a capacity review within two weeks.",
+            "low": "Track the trend; no immediate action.",
+        }[severity]
+
+    justification = (
+        f"Peak {peak:.1f}% vs threshold {threshold}%, 24h median {payload['median_cpu_next_24h']}%, "
+        f"growth {payload['growth_rate_pct_per_day']}%/day."
+    )
+    trends = {
+        "summary": summary,
+        "severity": severity,
+        "breach_time": payload["first_median_breach_expected"] or "n/a",
+        "cpu_at_breach": payload["predicted_cpu_at_breach"] if payload["predicted_cpu_at_breach"] is not None else "n/a",
+        "lead_time_days": days if days is not None else "n/a",
+        "action": action,
+        "justification": justification,
+        "confidence": 60 if ambiguous else 95,
+        "source": "rules",
+    }
+    return trends, ambiguous
+
+
+# --------------------------------------------------
+# 2) Anomaly rules
+# --------------------------------------------------
+def evaluate_anomaly(payload: dict):
+    """
+    Returns (anomalies_dict, ambiguous) for an anomaly payload.
+    """
+    count = payload["total_anomalies_last_24h"]
+    score = payload["worst_anomaly_score_last_24h"]
+
+    if count == 0:
+        severity = "none"
+        ambiguous = False
+        summary = "No anomalies in the last 24h."
+        action = "No action needed."
+    else:
+        severity = ANOMALY_SEVERITY[payload["worst_severity_last_24h"]]
+        ambiguous = any(abs(score - edge) <= SCORE_MARGIN for edge in SCORE_EDGES)
+        summary = (
+            f"{count} anomalies in the last 24h; worst {payload['worst_cpu_pct_last_24h']}% "
+            f"at {payload['worst_anomaly_time_last_24h']}."
+        )
+        action = {
+            "none": "No action needed.",
+            "low": "No action needed; isolated mild outliers.",
+            "moderate": "Check recent deploys or jobs around the anomaly time.",
+            "high": "Investigate the host now; correlate with logs and recent changes.",
+            "critical": "Page on-call and investigate immediately.",
+        }[severity]
+
+    anomalies = {
+        "summary": summary,
+        "severity": severity,
+        "action": action,
+        "total_anomalies_last_24": count,
+        "worst_cpu_pct_last_24h": payload["worst_cpu_pct_last_24h"],
+        "most_recent_anomaly_time": payload["most_recent_anomaly_time"],
+        "justification": f"Worst isolation-forest score {score} ({payload['worst_severity_last_24h']}), "
+                         f"{payload['total_anomalies_last_7d']} anomalies in 7 days.",
+        "confidence": 60 if ambiguous else 95,
+        "source": "rules",
+    }
+    return anomalies, ambiguous
+
+
+# --------------------------------------------------
+# 3) Triage
+# --------------------------------------------------
+def needs_llm(severity: str, ambiguous: bool, min_severity: str = None) -> bool:
+    min_severity = min_severity or LLM_MIN_SEVERITY
+    return ambiguous or SEVERITIES.index(severity) >= SEVERITIES.index(min_severity)
+
+
+def triage(trend_payload: dict, anomaly_payload: dict, min_severity: str = None):
+    """
+    Rule-based insights plus which of them should be escalated to the LLM.
+    Returns (insights, escalate) where insights is {"trends", "anomalies"}
+    and escalate is {"trends": bool, "anomalies": bool}.
+    """
+    trends, trend_ambiguous = evaluate_trend(trend_payload)
+    anomalies, anomaly_ambiguous = evaluate_anomaly(anomaly_payload)
+    escalate = {
+        "trends": needs_llm(trends["severity"], trend_ambiguous, min_severity),
+        "anomalies": needs_llm(anomalies["severity"], anomaly_ambiguous, min_severity),
+    }
+    return {"trends": trends, "anomalies": anomalies}, escalate
@@ -0,0 +1,315 @@
+# src/scheduler.py
+# Headless scheduler daemon: keeps every host/metric's prediction current.
+#   python src/scheduler.py --input data/metrics --interval 900 --workers 4
+#
+# Each series is re-evaluated on its own cadence (--interval, or --cadence
+# overrides per host / host/metric), with random jitter so runs spread out
+# instead of firing together. Due series are handed to a process pool through
+# a bounded queue: when --queue-size evaluations are waiting or running,
+# nothing more is submitted and overdue series wait in the schedule
+# (backpressure), so a slow LLM or an overloaded box never builds an unbounded
+# backlog. Records are saved from this process only (one SQLite writer), and
+# per-stage timings are aggregated and written to --metrics-path. Worker
+# histograms are merged here and served on --metrics-port (Prometheus format).
+
+import argparse
+import heapq
+import json
+import os
+import queue
+import random
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import db
+from instrumentation import REGISTRY, start_metrics_server
+from ingest import RollingWindow, open_source
+from metric_store import MetricStore
+from pipeline import evaluate_series
+from predictive import FORECASTERS
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_THRESHOLD = 63
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Seconds between evaluations of one series, and the +/- fraction of it used as jitter
+SCHEDULE_INTERVAL = float(os.getenv("SCHEDULE_INTERVAL", 900))
+SCHEDULE_JITTER = float(os.getenv("SCHEDULE_JITTER", 0.1))
+# Seconds between re-reading the series list (new hosts) and between metrics snapshots
+DISCOVER_EVERY = 300
+METRICS_EVERY = 60
+METRICS_PATH = os.getenv("SCHEDULER_METRICS_PATH", os.path.join(os.path.dirname(db.db_path), "scheduler_metrics.json"))
+
+
+@dataclass(order=True)
+class Job:
+    due: float
+    host: str = field(compare=False)
+    metric: str = field(compare=False)
+    cadence: float = field(compare=False)
+    submitted: float = field(default=0.0, compare=False)
+    held: bool = field(default=False, compare=False)   # already counted as held back by a full queue
+
+
+class StageMetrics:
+    """
+    Per-stage timing aggregates (count, total, max, last seconds) plus
+    scheduler counters; snapshot() is what goes to the metrics file.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {"completed": 0, "failed": 0, "held_back": 0, "skipped_runs": 0}
+        self.started = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        entry = self.stages.setdefault(stage, {"count": 0, "total_s": 0.0, "max_s": 0.0, "last_s": 0.0})
+        entry["count"] += 1
+        entry["total_s"] += seconds
+        entry["max_s"] = max(entry["max_s"], seconds)
+        entry["last_s"] = seconds
+
+    def snapshot(self, **gauges) -> dict:
+        return {
+            "updated_at": time.time(),
+            "uptime_s": round(time.time() - self.started, 1),
+            **gauges,
+            **self.counters,
+            "stages": {
+                stage: {**{k: round(v, 4) for k, v in entry.items() if k != "count"},
+                        "count": entry["count"],
+                        "mean_s": round(entry["total_s"] / entry["count"], 4)}
+                for stage, entry in sorted(self.stages.items())
+            },
+        }
+
+
+class Scheduler:
+    """
+    Cadence scheduler over the series of a metric store (workers read their
+    own slice with filter pushdown) or of any ingest source (polled here and
+    shipped to the workers as frames).
+    """
+
+    def __init__(self, source: str, workers: int = DEFAULT_WORKERS, queue_size: int = None,
+                 interval: float = SCHEDULE_INTERVAL, jitter: float = SCHEDULE_JITTER, cadences: dict = None,
+                 threshold: float = DEFAULT_THRESHOLD, engine: str = None, use_ai: bool = False,
+                 model_dir: str = None, window_days: int = None, history_days: int = None,
+                 metrics_path: str = METRICS_PATH, seed: int = None):
+        self.source = source
+        self.workers = workers
+        self.queue_size = queue_size or 2 * workers
+        self.interval = interval
+        self.jitter = jitter
+        self.cadences = cadences or {}
+        self.job_args = dict(threshold=threshold, engine=engine, use_ai=use_ai, model_dir=model_dir,
+                             window_days=window_days, history_days=history_days)
+        self.metrics_path = metrics_path
+        self.metrics = StageMetrics()
+        self.rng = random.Random(seed)
+        self.stop_event = threading.Event()
+
+        self.store = MetricStore(source) if os.path.isdir(source) else None
+        self.window, self.stream = (None, None) if self.store else (RollingWindow(), open_source(source))
+        self.schedule = []      # heap of Job
+        self.known = set()
+        self.in_flight = {}     # (host, metric) -> Job
+        self.done = queue.Queue()
+
+    # -- schedule -------------------------------------------------------
+    def cadence(self, host: str, metric: str) -> float:
+        return self.cadences.get(f"{host}/{metric}", self.cadences.get(host, self.interval))
+
+    def discover(self, now: float, spread: bool = True) -> int:
+        """
+        Add series that appeared since the last call. Their first runs are
+        spread over one cadence, or all due now without `spread`.
+        """
+        if self.store is None:
+            self.window.poll(self.stream)
+        series = self.store.series() if self.store is not None else self.window.series()
+        new = [key for key in series if key not in self.known]
+        for host, metric in new:
+            cadence = self.cadence(host, metric)
+            first = now + self.rng.uniform(0, cadence) if spread else now
+            heapq.heappush(self.schedule, Job(first, host, metric, cadence))
+            self.known.add((host, metric))
+        if new:
+            logger.info(f"Scheduling {len(new)} new series ({len(self.known)} total)")
+        return len(new)
+
+    def _reschedule(self, job: Job, now: float):
+        # fixed rate from the planned time; runs missed while overloaded are skipped, not queued up
+        due = job.due + job.cadence
+        if due < now:
+            self.metrics.counters["skipped_runs"] += max(int((now - job.due) // job.cadence) - 1, 0)
+            due = now
+        job.due = due + job.cadence * self.rng.uniform(-self.jitter, self.jitter)
+        heapq.heappush(self.schedule, job)
+
+    # -- execution ------------------------------------------------------
+    def _submit(self, pool, job: Job, now: float):
+        job.submitted = time.time()
+        job.held = False
+        self.metrics.observe("lag", max(now - job.due, 0.0))
+        frame, rollups = None, None
+        if self.store is None:
+            frame, rollups = self.window.frame(job.host, job.metric), self.window.rollup(job.host, job.metric)
+        future = pool.submit(evaluate_series, job.host, job.metric, source=self.source, frame=frame,
+                             rollups=rollups, **self.job_args)
+        future.add_done_callback(lambda f, job=job: self.done.put((job, f)))
+        self.in_flight[(job.host, job.metric)] = job
+
+    def _dispatch(self, pool, now: float):
+        while self.schedule and self.schedule[0].due <= now:
+            if len(self.in_flight) >= self.queue_size:
+                # backpressure: due jobs stay in the schedule until a slot frees up
+                for job in self.schedule:
+                    if job.due <= now and not job.held:
+                        job.held = True
+                        self.metrics.counters["held_back"] += 1
+                return
+            self._submit(pool, heapq.heappop(self.schedule), now)
+
+    def _complete(self, job: Job, future, now: float):
+        del self.in_flight[(job.host, job.metric)]
+        try:
+            result = future.result()
+        except Exception as e:   # the worker process itself died
+            result = {"error": f"{type(e).__name__}: {e}", "timings": {}, "metrics": {}, "started_at": job.submitted}
+        REGISTRY.merge(result["metrics"])
+        self.metrics.observe("queue_wait", max(result["started_at"] - job.submitted, 0.0))
+        for stage, seconds in result["timings"].items():
+            self.metrics.observe(stage, seconds)
+        if result["error"]:
+            self.metrics.counters["failed"] += 1
+            logger.error(f"{job.host}/{job.metric} failed: {result['error']}")
+        else:
+            started = time.perf_counter()
+            db.insert_prediction(result["record"])   # observed as stage="db_write"
+            self.metrics.observe("insert", time.perf_counter() - started)
+            self.metrics.observe("total", time.time() - job.submitted)
+            self.metrics.counters["completed"] += 1
+        self._reschedule(job, now)
+
+    def write_metrics(self):
+        snapshot = self.metrics.snapshot(series=len(self.known), in_flight=len(self.in_flight),
+                                         queue_size=self.queue_size, workers=self.workers)
+        if self.metrics_path:
+            tmp = f"{self.metrics_path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp, self.metrics_path)
+        return snapshot
+
+    def run(self, once: bool = False):
+        """
+        Loop until stop() (or, with once, until every series ran once).
+        """
+        clock = time.monotonic
+        next_discover = next_metrics = clock()
+        if once:
+            next_discover = float("inf")
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            while not self.stop_event.is_set():
+                now = clock()
+                if now >= next_discover:
+                    self.discover(now)
+                    next_discover = now + DISCOVER_EVERY
+                if now >= next_metrics:
+                    snapshot = self.write_metrics()
+                    logger.info(f"{snapshot['completed']} done, {snapshot['failed']} failed, "
+                                f"{snapshot['in_flight']} in flight, {len(self.schedule)} scheduled")
+                    next_metrics = now + METRICS_EVERY
+                self._dispatch(pool, now)
+                if once and not self.in_flight and not any(job.due <= now for job in self.schedule):
+                    break
+
+                # sleep until a result arrives or the next series is due (while there is room)
+                wake = min(next_metrics, next_discover)
+                if self.schedule and len(self.in_flight) < self.queue_size:
+                    wake = min(wake, self.schedule[0].due)
+                try:
+                    job, future = self.done.get(timeout=min(max(wake - clock(), 0.0), 1.0))
+                except queue.Empty:
+                    continue
+                self._complete(job, future, clock())
+                while True:
+                    try:
+                        job, future = self.done.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._complete(job, future, clock())
+
+            # drain what is already running
+            while self.in_flight:
+                job, future = self.done.get()
+                self._complete(job, future, clock())
+        self.write_metrics()
+
+    def stop(self, *_):
+        logger.info("Stopping: waiting for running evaluations")
+        self.stop_event.set()
+
+
+def parse_cadences(values) -> dict:
+    """["web-01=300", "db-01/CPU Usage=60"] -> {"web-01": 300.0, "db-01/CPU Usage": 60.0}"""
+    out = {}
+    for value in values or []:
+        key, _, seconds = value.rpartition("=")
+        if not key:
+            raise argparse.ArgumentTypeError(f"Expected HOST[/METRIC]=SECONDS, got {value!r}")
+        out[key] = float(seconds)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Continuously re-evaluate every host/metric on a schedule.")
+    parser.add_argument("--input", required=True,
+                        help="Parquet metric store directory, or any ingest source (CSV, Zabbix JSON, http URL)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Process pool size")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="Max evaluations waiting or running (default 2 x workers)")
+    parser.add_argument("--interval", type=float, default=SCHEDULE_INTERVAL, help="Seconds between runs per series")
+    parser.add_argument("--jitter", type=float, default=SCHEDULE_JITTER, help="+/- fraction of the interval")
+    parser.add_argument("--cadence", action="append", metavar="HOST[/METRIC]=SECONDS",
+                        help="Per-host or per-series interval override (repeatable)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Critical value for breach forecast")
+    parser.add_argument("--engine", choices=sorted(FORECASTERS), default=None,
+                        help="Forecast engine (default: FORECAST_ENGINE env, prophet)")
+    parser.add_argument("--ai", action="store_true", help="Send ambiguous or severe results to the LLM before saving")
+    parser.add_argument("--model-dir", default=None, help="Where warm-start and detector model state is kept")
+    parser.add_argument("--window-days", type=int, default=None, help="Rolling forecast history window (0 = all)")
+    parser.add_argument("--history-days", type=int, default=None,
+                        help="Days loaded from the metric store per run, back from the newest sample "
+                             "(default PIPELINE_HISTORY_DAYS, 30)")
+    parser.add_argument("--metrics-path", default=METRICS_PATH, help="JSON file with scheduler/stage metrics")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus /metrics on this port (default METRICS_PORT env, 0 = off)")
+    parser.add_argument("--once", action="store_true", help="Evaluate every series once, then exit")
+    args = parser.parse_args(argv)
+
+    scheduler = Scheduler(
+        args.input, workers=args.workers, queue_size=args.queue_size, interval=args.interval, jitter=args.jitter,
+        cadences=parse_cadences(args.cadence), threshold=args.threshold, engine=args.engine, use_ai=args.ai,
+        model_dir=args.model_dir, window_days=args.window_days, history_days=args.history_days,
+        metrics_path=args.metrics_path,
+    )
+    if args.once:
+        scheduler.discover(time.monotonic(), spread=False)
+    start_metrics_server(args.metrics_port)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, scheduler.stop)
+    scheduler.run(once=args.once)
+    snapshot = scheduler.write_metrics()
+    logger.info(f"Scheduler stopped: {snapshot['completed']} saved, {snapshot['failed']} failed")
+    return 1 if snapshot["failed"] and not snapshot["completed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# src/thresholds.py
+# Adaptive day/night alert thresholds, computed for the whole fleet at once.
+#
+# For each host/metric and period (business hours vs. off-hours) the
+# threshold is q95 + 1 sigma of the last window, capped at HARD_LIMIT. The
+# backtest walks back over `windows` consecutive windows: each one is scored
+# with the thresholds fitted on the window before it, and alert counts are
+# compared with the static HARD_LIMIT. Everything is a few groupbys over the
+# long frame, so one call covers thousands of series.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from breach import BUSINESS_HOURS, BUSINESS_TZ, day_mask
+
+# Static alert level (and cap for adaptive thresholds), %
+HARD_LIMIT = 90.0
+QUANTILE = 0.95
+SIGMAS = 1.0
+# Window each threshold is fitted on, and how many windows the backtest covers
+WINDOW_HOURS = 24
+ALERT_WINDOWS = int(os.getenv("THRESHOLD_WINDOWS", 7))
+
+
+def threshold_report(long_df: pd.DataFrame, windows: int = None, window_hours: int = WINDOW_HOURS,
+                     end=None, tz: str = BUSINESS_TZ, business_hours=BUSINESS_HOURS) -> pd.DataFrame:
+    """
+    One row per host/metric with the current day/night thresholds and the
+    backtested alert counts:
+      day_threshold, night_threshold,
+      static_day, static_night, adaptive_day, adaptive_night,
+      off_hours_reduction_pct (negative = adaptive fires more often)
+    """
+    windows = windows or ALERT_WINDOWS
+    df = long_df[["host", "metric", "timestamp", "value"]].dropna()
+    end = pd.Timestamp(end) if end is not None else df["timestamp"].max()
+    age = (end - df["timestamp"]) / pd.Timedelta(hours=window_hours)
+    keep = (age >= 0) & (age < windows + 1)
+    df = df[keep].assign(
+        window=np.floor(age[keep]).astype(np.int64),
+        day=day_mask(df.loc[keep, "timestamp"], business_hours, tz),
+    )
+    keys = ["host", "metric", "window", "day"]
+
+    values = df.groupby(keys, observed=True)["value"]
+    fitted = ((values.quantile(QUANTILE) + SIGMAS * values.std(ddof=0))
+              .clip(upper=HARD_LIMIT).rename("threshold").reset_index())
+
+    # score window w with the thresholds fitted on the older window w + 1
+    scoring = fitted.assign(window=fitted["window"] - 1)
+    scored = df[df["window"] < windows].merge(scoring, on=keys, how="left")
+    scored["threshold"] = scored["threshold"].fillna(HARD_LIMIT)
+    scored["static"] = scored["value"] >= HARD_LIMIT
+    scored["adaptive"] = scored["value"] >= scored["threshold"]
+    periods = [True, False]   # day, night
+    counts = (scored.groupby(["host", "metric", "day"], observed=True)[["static", "adaptive"]].sum()
+              .unstack("day", fill_value=0)
+              .reindex(columns=pd.MultiIndex.from_product([["static", "adaptive"], periods]), fill_value=0))
+    counts.columns = [f"{kind}_{'day' if flag else 'night'}" for kind, flag in counts.columns]
+
+    current = (fitted[fitted["window"] == 0].set_index(["host", "metric", "day"])["threshold"]
+               .unstack("day").reindex(columns=periods))
+    current.columns = ["day_threshold", "night_threshold"]
+
+    report = current.join(counts, how="outer")
+    report[current.columns] = report[current.columns].fillna(HARD_LIMIT).round(1)
+    report[counts.columns] = report[counts.columns].fillna(0).astype(int)
+    static_night = report["static_night"].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        reduction = (static_night - report["adaptive_night"].to_numpy()) / static_night * 100
+    report["off_hours_reduction_pct"] = np.where(static_night > 0, reduction, 0.0).round(1)
+    return report.reset_index()
+
+
+def suggested_thresholds(report: pd.DataFrame, windows: int = None, window_hours: int = WINDOW_HOURS) -> dict:
+    """
+    {(host, metric): suggested_threshold dict} for prediction records.
+    """
+    windows = windows or ALERT_WINDOWS
+    out = {}
+    for row in report.itertuples(index=False):
+        out[(row.host, row.metric)] = {
+            "day": row.day_threshold,
+            "night": row.night_threshold,
+            "alerts": {
+                "static": {"day": row.static_day, "night": row.static_night},
+                "adaptive": {"day": row.adaptive_day, "night": row.adaptive_night},
+                "off_hours_reduction_pct": row.off_hours_reduction_pct,
+                "windows": windows,
+                "window_hours": window_hours,
+            },
+        }
+    return out
@@ -1,10 +1,13 @@
 # src/utils.py
-import re
+import os
 import json
 import logging
 import pandas as pd
 import streamlit as st
 
+from ingest import normalize_columns
+from instrumentation import log_sampled, timed
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -19,31 +22,126 @@ def get_logger(module_name):
     """
     return logging.getLogger(module_name)
 
-# load_data function to read CSV files into DataFrames
-def load_data(path: str) -> pd.DataFrame:
-    return pd.read_csv(path, parse_dates=["timestamp"])
+# load_data function to read CSV files or a Parquet metric store into DataFrames
+# Columns are normalized through the ingest schema mapping (e.g. Timestamp,CPU)
+def load_data(path: str, host: str = None, metric: str = None, start=None, end=None) -> pd.DataFrame:
+    if isinstance(path, str) and os.path.isdir(path):
+        from metric_store import MetricStore  # pyarrow is only needed for Parquet stores
+
+        store = MetricStore(path)
+        if host is None:
+            host, metric = store.series()[0]
+        return store.load_series(host, metric, start, end)
+    df = normalize_columns(pd.read_csv(path))
+    return (
+        df[["timestamp", "value"]]
+        .rename(columns={"value": "cpu_usage_percent"})
+        .sort_values("timestamp")
+        .reset_index(drop=True)
+    )
+
+# JsonObjectStream class to find the first top-level JSON object in streamed text
+class JsonObjectStream:
+    """
+    Incremental JSON object scanner. Feed it LLM tokens as they arrive;
+    `done` flips to True as soon as the top-level object's closing brace is
+    seen, and `partial()` returns the fields completed so far.
+    With opener="[" it scans for a top-level array instead (batch prompts).
+    """
+
+    def __init__(self, opener: str = "{"):
+        self.opener = opener
+        self.closer = "}" if opener == "{" else "]"
+        self.chars = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.done = False
+        self._last_field_end = None  # position of the last depth-1 comma
+
+    def feed(self, chunk: str) -> bool:
+        for ch in chunk:
+            if not self.started:
+                if ch == self.opener:
+                    self.started = True
+                    self.depth = 1
+                    self.chars.append(ch)
+                continue
+            self.chars.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+                    break
+            elif ch == "," and self.depth == 1:
+                self._last_field_end = len(self.chars) - 1
+        return self.done
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chars)
+
+    def result(self):
+        """
+        The complete object/array (raises json.JSONDecodeError if it is not valid JSON).
+        """
+        return json.loads(self.text)
+
+    def partial(self):
+        """
+        Fields (or array items) completed so far (best effort; empty if nothing parses yet).
+        """
+        empty = {} if self.opener == "{" else []
+        if self.done:
+            try:
+                return self.result()
+            except json.JSONDecodeError:
+                return empty
+        if self._last_field_end is None:
+            return empty
+        try:
+            return json.loads("".join(self.chars[:self._last_field_end]) + self.closer)
+        except json.JSONDecodeError:
+            return empty
+
+
+# missing_keys function to validate a parsed AI object against the expected schema
+def missing_keys(data: dict, expected_keys) -> list:
+    return [key for key in expected_keys if key not in data]
 
 # parse_json_response function to extract and validate JSON from AI responses
+@timed("json_parse")
 def parse_json_response(raw: str):
+    # log a sample of responses (truncated) for debugging
+    log_sampled(logger, "AI response", raw)
+
+    if not raw:
+        st.error("⚠️ AI response is empty or invalid JSON.")
+        return {}
+
+    # Extract the first balanced {...} object (ignores chatter before/after it)
+    parser = JsonObjectStream()
+    if not parser.feed(raw):
+        st.error("⚠️ Could not find JSON block starting with { and ending with }.")
+        st.code(raw, language="text")
+        return {}
     try:
-        # log response for debugging
-        logger.info(f"AI response: {raw}")
-
-        # Extract JSON block using regex: head is ```json, tail is ```
-        match = re.search(r"({.*})", raw, re.DOTALL)
-        if match:
-            raw = match.group(1).strip()
-        else:
-            st.error("⚠️ Could not find JSON block starting with { and ending with }.")
-            st.code(raw, language="text")
-            return {}
-        if not raw:
-            st.error("⚠️ AI response is empty or invalid JSON.")
-            return {}
-        return json.loads(raw)
+        return parser.result()
     except json.JSONDecodeError:
         st.error("⚠️ Unable to parse AI response as JSON:")
-        st.code(raw, language="text")
+        st.code(parser.text, language="text")
         return {}
 
 # Function to convert AI results to a prediction record
@@ -69,6 +167,8 @@ def ai_to_prediction_record(host: str, metric: str, data: dict) -> dict:
     # Extracting trends and anomalies from the data
     trends = data.get("trends", {})
     anomalies = data.get("anomalies", {})
+    # Computed day/night thresholds (see thresholds.suggested_thresholds)
+    thresholds = data.get("thresholds")
 
     # Default values if keys are missing
     suggested_threshold_default = {
@@ -94,7 +194,7 @@ def ai_to_prediction_record(host: str, metric: str, data: dict) -> dict:
     message = f"{trends.get('summary', '')} {anomalies.get('summary', '')}".strip()
     explanation = f"{trends.get('justification', '')} {anomalies.get('justification', '')}".strip()
     recommendation = f"{trends.get('action', '')} {anomalies.get('action', '')}".strip()
-    suggested_threshold = json.dumps(trends.get("threshold_percent", suggested_threshold_default))
+    suggested_threshold = json.dumps(thresholds or suggested_threshold_default)
     metadata = json.dumps({"trends": trends,"anomalies": anomalies})
 
     return {
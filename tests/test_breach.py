@@ -0,0 +1,78 @@
+# tests/test_breach.py
+# The vectorized breach search against the per-series pandas filters it replaced.
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from breach import BUSINESS_HOURS, breach_summary, stack_forecasts, summarize_forecast
+
+THRESHOLDS = [60.0, 75.0, 90.0]
+
+
+def forecasts(n, seed=0):
+    # hourly forecasts of different lengths: history + 240 future hours
+    rng = np.random.default_rng(seed)
+    frames, cutoffs = [], []
+    for i in range(n):
+        history = int(rng.integers(48, 200))
+        ds = pd.date_range("2025-01-01", periods=history + 240, freq="h") + pd.Timedelta(hours=int(i))
+        trend = np.linspace(rng.uniform(20, 50), rng.uniform(40, 95), len(ds))
+        yhat = trend + 10 * np.sin(2 * np.pi * ds.hour / 24) + rng.normal(0, 2, len(ds))
+        frames.append(pd.DataFrame({"ds": ds, "yhat": yhat, "trend": trend}))
+        cutoffs.append(ds[history - 1])
+    return frames, cutoffs
+
+
+def pandas_summary(forecast, cutoff, threshold, night_threshold=None):
+    """The per-series DataFrame filters used before breach.py."""
+    future = forecast[forecast["ds"] > cutoff]
+    limit = threshold
+    if night_threshold is not None:
+        day = (future["ds"].dt.hour >= BUSINESS_HOURS[0]) & (future["ds"].dt.hour < BUSINESS_HOURS[1])
+        limit = np.where(day, threshold, night_threshold)
+    cross = future[future["yhat"] >= limit]
+    first_hit = cross["ds"].min() if not cross.empty else None
+    span_days = (forecast["ds"].iloc[-1] - forecast["ds"].iloc[0]) / pd.Timedelta(days=1)
+    return {
+        "first_breach_ts": first_hit,
+        "value_at_breach": float(forecast.loc[forecast["ds"] == first_hit, "yhat"].iloc[0]) if first_hit else np.nan,
+        "peak": future["yhat"].max(),
+        "median_24h": future.head(24)["yhat"].median(),
+        "end_value": forecast["yhat"].iloc[-1],
+        "growth_per_day": (forecast["trend"].iloc[-1] - forecast["trend"].iloc[0]) / span_days,
+    }
+
+
+def test_breach_summary_matches_pandas():
+    frames, cutoffs = forecasts(12)
+    ds, yhat, trend = stack_forecasts(frames)
+    summary = breach_summary(ds, yhat, trend, np.array(cutoffs, dtype="datetime64[ns]"), THRESHOLDS)
+
+    for i, (frame, cutoff) in enumerate(zip(frames, cutoffs)):
+        for k, threshold in enumerate(THRESHOLDS):
+            expected = pandas_summary(frame, cutoff, threshold)
+            first = summary["first_breach_ts"][i, k]
+            if expected["first_breach_ts"] is None:
+                assert np.isnat(first) and summary["first_breach_idx"][i, k] == -1
+            else:
+                assert pd.Timestamp(first) == expected["first_breach_ts"]
+                assert summary["value_at_breach"][i, k] == expected["value_at_breach"]
+        for name in ("peak", "median_24h", "end_value", "growth_per_day"):
+            assert summary[name][i] == pytest.approx(pandas_summary(frame, cutoff, THRESHOLDS[0])[name], rel=1e-12)
+
+
+@pytest.mark.parametrize("night_threshold", [None, 55.0])
+def test_summarize_forecast_matches_pandas(night_threshold):
+    frames, cutoffs = forecasts(5, seed=1)
+    for frame, cutoff in zip(frames, cutoffs):
+        actual = summarize_forecast(frame, cutoff, 75.0, night_threshold)
+        expected = pandas_summary(frame, cutoff, 75.0, night_threshold)
+        assert actual["first_breach_ts"] == expected["first_breach_ts"]
+        for name in ("peak", "median_24h", "end_value"):
+            assert actual[name] == pytest.approx(expected[name], rel=1e-12)
@@ -0,0 +1,60 @@
+# tests/test_db.py
+# Keyset pagination of the prediction history.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import db
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    db.close_connections()
+    monkeypatch.setattr(db, "db_path", str(tmp_path / "predictions.db"))
+    yield
+    db.close_connections()
+
+
+def record(created_at, host="host-01", status="normal"):
+    return {"host": host, "metric": "CPU Usage", "status": status, "message": "", "created_at": created_at}
+
+
+def test_pages_cover_tied_timestamps_once(fresh_db):
+    # five rows share one created_at, so paging must fall back to id order
+    times = ["2025-01-01 10:00:00"] * 5 + ["2025-01-01 11:00:00", "2025-01-01 09:00:00"] * 2
+    db.insert_predictions_bulk([record(t) for t in times])
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = db.fetch_predictions_page(limit=2, before=cursor)
+        assert len(page) <= 2
+        seen.extend(zip(page["Created At"], page["ID"]))
+        if cursor is None:
+            break
+
+    assert len(seen) == len(times)
+    assert seen == sorted(seen, reverse=True)
+    assert len({row_id for _, row_id in seen}) == len(times)
+
+
+def test_filtered_pages(fresh_db):
+    db.insert_predictions_bulk(
+        [record("2025-01-01 10:00:00", host=f"host-0{i % 2}", status="alert" if i % 3 else "normal")
+         for i in range(12)]
+    )
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = db.fetch_predictions_page(host="host-01", status="alert", limit=3, before=cursor)
+        seen.extend(page["ID"])
+        if cursor is None:
+            break
+
+    expected = db.fetch_predictions()
+    expected = expected[(expected["Host"] == "host-01") & (expected["Status"] == "alert")]
+    assert sorted(seen, reverse=True) == seen
+    assert sorted(seen) == sorted(expected["ID"])
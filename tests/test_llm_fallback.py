@@ -0,0 +1,74 @@
+# tests/test_llm_fallback.py
+# A failed or unparseable LLM answer must not overwrite the rule engine's
+# result for a case that was escalated because it looked severe.
+
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import batch
+import pipeline
+from utils import ai_to_prediction_record
+
+# Breach within a day and a "high" anomaly: both escalated by rules.triage
+TREND_PAYLOAD = {
+    "generated_at": "2025-01-01T00:00:00+00:00",
+    "threshold_percent": 80.0,
+    "first_median_breach_expected": "2025-01-01T12:00:00+00:00",
+    "days_until_breach": 0.5,
+    "predicted_cpu_at_breach": 81.2,
+    "peak_cpu_next_30d": 95.0,
+    "median_cpu_next_24h": 78.0,
+    "median_cpu_end_of_horizon": 92.0,
+    "growth_rate_pct_per_day": 1.5,
+}
+ANOMALY_PAYLOAD = {
+    "total_anomalies_last_24h": 4,
+    "total_anomalies_last_7d": 9,
+    "most_recent_anomaly_time": "2024-12-31T23:00:00+00:00",
+    "most_recent_cpu_pct": 97.0,
+    "most_recent_anomaly_score": -0.22,
+    "most_recent_severity": "high",
+    "worst_anomaly_time_last_24h": "2024-12-31T23:00:00+00:00",
+    "worst_cpu_pct_last_24h": 97.0,
+    "worst_anomaly_score_last_24h": -0.22,
+    "worst_severity_last_24h": "high",
+}
+
+
+@pytest.fixture
+def failed_llm(monkeypatch):
+    """Every LLM call fails: the ai helpers return "" per escalated prompt."""
+    fake = types.ModuleType("ai")
+    fake.analyze_concurrently = lambda trend, anomaly, **_: (
+        "" if trend is not None else None, "" if anomaly is not None else None)
+    fake.analyze_fleet = lambda items, concurrency=None: [
+        ("" if trend is not None else None, "" if anomaly is not None else None) for trend, anomaly in items]
+    monkeypatch.setitem(sys.modules, "ai", fake)
+
+
+def test_analyze_with_ai_keeps_rule_result(failed_llm, monkeypatch):
+    monkeypatch.setattr(pipeline, "build_trend_payload", lambda result: TREND_PAYLOAD)
+    monkeypatch.setattr(pipeline, "build_anomaly_payload", lambda result: ANOMALY_PAYLOAD)
+
+    trends, anomalies = pipeline.analyze_with_ai(result=None)
+
+    assert trends["source"] == anomalies["source"] == "rules"
+    record = ai_to_prediction_record("host-01", "CPU Usage", {"trends": trends, "anomalies": anomalies})
+    assert record["status"] == "alert"
+    assert record["message"]
+
+
+def test_results_to_records_keeps_rule_result(failed_llm):
+    results = [{"host": "host-01", "metric": "CPU Usage",
+                "trend_payload": TREND_PAYLOAD, "anomaly_payload": ANOMALY_PAYLOAD}]
+
+    [record] = batch.results_to_records(results, use_ai=True)
+
+    assert record["status"] == "alert"
+    assert record["anomaly_detected"] == 1
+    assert record["message"]
@@ -0,0 +1,31 @@
+# tests/test_predictive.py
+# Bulk interval scoring against IsolationForest.decision_function.
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from sklearn.ensemble import IsolationForest
+
+from predictive import _bulk_decision_function
+
+
+@pytest.fixture(scope="module")
+def forest():
+    train = np.random.default_rng(0).normal(0, 1, 5000).astype(np.float32)
+    return IsolationForest(n_estimators=50, contamination=0.005, random_state=42).fit(train.reshape(-1, 1))
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_bulk_scores_match_decision_function(forest, dtype):
+    z = np.random.default_rng(1).normal(0, 1.5, 20_000).astype(dtype)
+    # points right at split thresholds (as float32, what the trees compare) take the left branch
+    splits = np.concatenate([est.tree_.threshold[est.tree_.feature >= 0] for est in forest.estimators_])
+    z = np.concatenate([z, splits.astype(np.float32).astype(dtype)])
+
+    expected = forest.decision_function(z.reshape(-1, 1))
+    np.testing.assert_array_equal(_bulk_decision_function(forest, z), expected)
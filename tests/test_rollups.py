@@ -0,0 +1,59 @@
+# tests/test_rollups.py
+# Rollups (in memory and from rollup()) against resampling the raw samples.
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from ingest import RollingWindow
+from rollups import RESOLUTIONS, rollup
+
+
+def samples(n, seed=0):
+    # 1-min samples with noisy values, so summation order shows in the means
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range("2025-01-01 07:13", periods=n, freq="min")
+    return pd.DataFrame({"host": "host-01", "metric": "CPU Usage", "timestamp": ts,
+                         "value": rng.uniform(0, 100, n) * np.pi})
+
+
+def resampled(frame, resolution):
+    out = (frame.set_index("timestamp")["value"].resample(RESOLUTIONS[resolution])
+                .agg(["mean", "min", "max", "count"]))
+    out["p95"] = frame.set_index("timestamp")["value"].resample(RESOLUTIONS[resolution]).quantile(0.95)
+    return out[out["count"] > 0].reset_index()
+
+
+def assert_matches(actual, expected):
+    actual = actual.reset_index(drop=True)
+    np.testing.assert_array_equal(actual["timestamp"].to_numpy(), expected["timestamp"].to_numpy())
+    for name in ("mean", "min", "max", "count"):
+        # means are bit-identical, not just close
+        np.testing.assert_array_equal(actual[name].to_numpy(), expected[name].to_numpy(), err_msg=name)
+    np.testing.assert_allclose(actual["p95"].to_numpy(), expected["p95"].to_numpy(), rtol=1e-12)
+
+
+@pytest.mark.parametrize("resolution", list(RESOLUTIONS))
+def test_rollup_matches_resample(resolution):
+    df = samples(5000)
+    assert_matches(rollup(df, resolution), resampled(df, resolution))
+
+
+@pytest.mark.parametrize("resolution", list(RESOLUTIONS))
+def test_window_rollups_match_resample_across_wrap(resolution):
+    df = samples(7300)
+    window = RollingWindow(capacity=2000)
+    for chunk in np.array_split(df, 9):
+        window.ingest(chunk)
+
+    # the ring has wrapped several times and holds the newest 2000 samples
+    kept = df.iloc[-2000:]
+    frame = window.frame("host-01", "CPU Usage")
+    np.testing.assert_array_equal(frame["timestamp"].to_numpy(), kept["timestamp"].to_numpy())
+    actual = window.rollup("host-01", "CPU Usage", [resolution])[resolution]
+    assert_matches(actual, resampled(kept, resolution))
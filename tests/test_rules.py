@@ -0,0 +1,83 @@
+# tests/test_rules.py
+# Clear-cut none/low cases are settled by the rule engine without the LLM.
+
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import batch
+import pipeline
+from rules import triage
+
+ANOMALY_PAYLOAD = {
+    "total_anomalies_last_24h": 0,
+    "total_anomalies_last_7d": 0,
+    "most_recent_anomaly_time": "2024-12-31T23:00:00+00:00",
+    "most_recent_cpu_pct": 40.0,
+    "most_recent_anomaly_score": 0.1,
+    "most_recent_severity": "none",
+    "worst_anomaly_time_last_24h": "2024-12-31T23:00:00+00:00",
+    "worst_cpu_pct_last_24h": 40.0,
+    "worst_anomaly_score_last_24h": 0.1,
+    "worst_severity_last_24h": "none",
+}
+
+
+def trend_payload(peak):
+    # no breach within the horizon, forecast peak at `peak` % of an 80% threshold
+    return {
+        "generated_at": "2025-01-01T00:00:00+00:00",
+        "threshold_percent": 80.0,
+        "first_median_breach_expected": None,
+        "days_until_breach": None,
+        "predicted_cpu_at_breach": None,
+        "peak_cpu_next_30d": peak,
+        "median_cpu_next_24h": peak - 10,
+        "median_cpu_end_of_horizon": peak - 5,
+        "growth_rate_pct_per_day": 0.1,
+    }
+
+
+@pytest.fixture
+def no_llm(monkeypatch):
+    """Any LLM call fails the test."""
+    def called(*args, **kwargs):
+        raise AssertionError("the LLM was called")
+
+    fake = types.ModuleType("ai")
+    fake.analyze_concurrently = fake.analyze_fleet = fake.analyze_fleet_batched = called
+    monkeypatch.setitem(sys.modules, "ai", fake)
+
+
+@pytest.mark.parametrize("peak, severity", [(40.0, "none"), (62.0, "none"), (78.0, "low"), (79.9, "low")])
+def test_clear_cases_are_not_escalated(peak, severity):
+    insights, escalate = triage(trend_payload(peak), ANOMALY_PAYLOAD)
+
+    assert insights["trends"]["severity"] == severity
+    assert escalate == {"trends": False, "anomalies": False}
+
+
+def test_none_low_edge_is_escalated():
+    # 0.9 * 80 = 72 is the none/low edge
+    _, escalate = triage(trend_payload(72.5), ANOMALY_PAYLOAD)
+
+    assert escalate["trends"]
+
+
+@pytest.mark.parametrize("peak", [40.0, 78.0])
+def test_clear_cases_never_call_the_llm(no_llm, monkeypatch, peak):
+    monkeypatch.setattr(pipeline, "build_trend_payload", lambda result: trend_payload(peak))
+    monkeypatch.setattr(pipeline, "build_anomaly_payload", lambda result: ANOMALY_PAYLOAD)
+
+    trends, anomalies = pipeline.analyze_with_ai(result=None)
+    assert trends["source"] == anomalies["source"] == "rules"
+
+    results = [{"host": "host-01", "metric": "CPU Usage",
+                "trend_payload": trend_payload(peak), "anomaly_payload": ANOMALY_PAYLOAD}]
+    for batched in (False, True):
+        [record] = batch.results_to_records(results, use_ai=True, batched=batched)
+        assert record["status"] == "normal"
@@ -0,0 +1,53 @@
+# tests/test_thresholds.py
+# threshold_report's business-hours / off-hours split.
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from thresholds import threshold_report
+
+DAY, NIGHT = 70.0, 20.0
+
+
+# Spike position: 23:00 UTC on the third day, in the older of the two backtest windows
+SPIKE = 71
+
+
+def fleet(local_hours, timestamps):
+    # busy at 70% in business hours (09:00-18:00 local), idle at 20% otherwise, plus one 95% night spike
+    day = (local_hours >= 9) & (local_hours < 18)
+    assert not day[SPIKE]
+    values = np.where(day, DAY, NIGHT)
+    values[SPIKE] = 95.0
+    return pd.DataFrame({"host": "host-01", "metric": "CPU Usage", "timestamp": timestamps, "value": values})
+
+
+def check(report):
+    [row] = report.itertuples(index=False)
+    # current thresholds come from the newest window: constant values, so q95 + 1 sigma = the value
+    assert (row.day_threshold, row.night_threshold) == (DAY, NIGHT)
+    # the static 90% limit fires once, on the night spike
+    assert (row.static_day, row.static_night) == (0, 1)
+
+
+def test_day_night_split_local_time():
+    ts = pd.date_range("2025-01-01", periods=4 * 24, freq="h")
+    report = threshold_report(fleet(ts.hour, ts), windows=2)
+    check(report)
+
+
+def test_day_night_split_in_business_timezone():
+    # naive UTC timestamps; business hours are New York time (UTC-5 in January)
+    ts = pd.date_range("2025-01-01", periods=4 * 24, freq="h")
+    local = ts.tz_localize("UTC").tz_convert("America/New_York").hour
+    df = fleet(local, ts)
+    check(threshold_report(df, windows=2, tz="America/New_York"))
+    # tz-aware timestamps classify the same, with or without an explicit zone
+    aware = df.assign(timestamp=ts.tz_localize("UTC").tz_convert("America/New_York"))
+    check(threshold_report(aware, windows=2, tz="America/New_York"))
+    check(threshold_report(aware, windows=2))
@@ -0,0 +1,54 @@
+# tests/test_utils.py
+# JsonObjectStream on LLM output split into arbitrary chunks.
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from utils import JsonObjectStream, parse_json_response
+
+OBJECT = {"summary": "Peak {at} 9:00, [no] breach", "severity": "low",
+          "nested": {"values": [1, 2, {"x": "}"}]}, "quote": 'say "hi" \\ bye', "confidence": 80}
+TEXT = 'Sure, here is the JSON:\n' + json.dumps(OBJECT) + '\nLet me know {if} you need more!'
+
+
+def stream(text, size, opener="{"):
+    """Feed `text` in `size`-character chunks, stopping at the close like call_ai."""
+    parser = JsonObjectStream(opener)
+    for i in range(0, len(text), size):
+        if parser.feed(text[i:i + size]):
+            break
+    return parser
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16, len(TEXT)])
+def test_object_split_across_chunks(size):
+    parser = stream(TEXT, size)
+
+    assert parser.done
+    assert parser.text == json.dumps(OBJECT)
+    assert parser.result() == OBJECT
+
+
+def test_partial_has_completed_fields_only():
+    cut = TEXT.index('"quote"')   # summary, severity and nested are complete
+    parser = stream(TEXT[:cut + 5], 3)
+
+    assert not parser.done
+    assert parser.partial() == {key: OBJECT[key] for key in ("summary", "severity", "nested")}
+
+
+def test_array_opener_split_across_chunks():
+    items = [{"host": "host-01", "severity": "low"}, {"host": "host-02", "severity": "high"}]
+    parser = stream("Result: " + json.dumps(items) + " done.", 4, opener="[")
+
+    assert parser.done
+    assert parser.result() == items
+
+
+def test_parse_json_response_ignores_chatter():
+    assert parse_json_response(TEXT) == OBJECT